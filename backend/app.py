@@ -5,10 +5,35 @@ import time
 from datetime import datetime
 import os
 import asyncio
+import atexit
 from dotenv import load_dotenv
 from morph_client import MorphClient
 from freestyle_client import FreestyleClient, GitManager
 from posthog_hybrid_client import PostHogHybridClient
+from profile_store import ProfileStore
+from shared_profile_store import SharedProfileStore
+from tiered_profile_store import TieredProfileStore
+from profile_events import new_profile, profile_from_dict, serialize_profile, apply_events, current_view
+from event_watermark import event_watermark
+from interest_decay import interest_decay
+from event_batch import parse_event_batch, group_events_by_user, event_error
+from ingest_queue import IngestQueue
+from rate_limiter import IngestRateLimiter
+from event_dedup import EventDeduplicator
+from profile_persistence import ProfilePersistence
+from rule_table import compile_rules
+from optimization_rules import OPTIMIZATION_RULES
+from variant_tracker import VariantTracker, decaying_conditions, decision_expires_at
+from decision_stream import DecisionStream, sse_stream
+from optimize_cache import OptimizeCache
+from generation_jobs import GenerationJobs, SUCCEEDED, FAILED
+from variant_cache import VariantCache
+from profile_columns import ColumnMaterializer, DEFAULT_PERCENTILES
+from profile_export import ExportFilter, export_profiles, decode_cursor, parse_timestamp
+from user_ids import user_id_generator
+from user_agents import user_agent_classifier, UNKNOWN_DEVICE
+from tenants import (Tenant, TenantRegistry, TenantError, DEFAULT_TENANT,
+                     tenant_id_from_request, tenant_path, load_tenant_config)
 
 # Load environment variables
 load_dotenv()
@@ -33,116 +58,422 @@ except ValueError as e:
     print(f"⚠️  PostHog client initialization failed: {e}")
     print("   PostHog API endpoints will return mock data.")
 
-# Simple in-memory storage for demo (replace with real DB in production)
-user_data = {}
-
-# Mock AI optimization rules
-OPTIMIZATION_RULES = {
-    "returning_user_pricing": {
-        "trigger": lambda data: data.get("visit_count", 0) >= 3 and data.get("pricing_interest", 0) > 0.7,
-        "variant": "pricing_focused",
-        "reason": "User shows high interest in pricing across multiple visits"
-    },
-    "content_explorer": {
-        "trigger": lambda data: data.get("avg_session_time", 0) > 120 and data.get("page_depth", 0) > 5,
-        "variant": "content_heavy",
-        "reason": "User spends significant time exploring content"
-    },
-    "quick_browser": {
-        "trigger": lambda data: data.get("avg_session_time", 0) < 30 and data.get("bounce_rate", 0) > 0.8,
-        "variant": "simplified",
-        "reason": "User prefers quick, simplified experiences"
-    }
-}
+# Profiles are partitioned by site (tenant): each site gets its own profile store,
+# rules and ingest queue, so one large site cannot evict another's profiles or back
+# up its tracking. The site comes from the X-Site-Id header or ?site=, else "default".
+#
+# PROFILE_STORE picks each site's store: in-memory and striped so concurrent requests
+# don't contend on one lock (memory), an LRU that spills cold profiles to SQLite
+# (tiered), or an mmap'd file every worker process of a multi-process server shares
+# (shared). A site's max_profiles quota (TENANT_MAX_PROFILES unless set in TENANTS,
+# 0 = unbounded) is the size of its LRU; in memory mode profiles over quota are dropped.
+PROFILE_STORE = os.getenv('PROFILE_STORE', 'memory')
+PROFILE_STORE_STRIPES = int(os.getenv('PROFILE_STORE_STRIPES', '64'))
+TENANT_MAX_PROFILES = int(os.getenv('TENANT_MAX_PROFILES', '0'))
+
+def create_store(tenant_id, max_profiles):
+    """Build one site's profile store"""
+    if PROFILE_STORE == 'tiered':
+        return TieredProfileStore(
+            max_hot_profiles=max_profiles or int(os.getenv('PROFILE_STORE_MAX_HOT', '100000')),
+            spill_path=tenant_path(os.getenv('PROFILE_STORE_SPILL_PATH', './profiles-cold.db'), tenant_id),
+            num_stripes=PROFILE_STORE_STRIPES
+        )
+    if PROFILE_STORE == 'shared':
+        return SharedProfileStore(
+            tenant_path(os.getenv('PROFILE_STORE_PATH', './profiles.shm'), tenant_id),
+            capacity=max_profiles or int(os.getenv('PROFILE_STORE_CAPACITY', '1000000')),
+            num_stripes=PROFILE_STORE_STRIPES
+        )
+    if max_profiles:
+        return TieredProfileStore(max_profiles, spill_path=None, num_stripes=PROFILE_STORE_STRIPES)
+    return ProfileStore(num_stripes=PROFILE_STORE_STRIPES)
+
+# Number of recent page views retained per profile (totals stay exact beyond this)
+PAGE_HISTORY_SIZE = int(os.getenv('PAGE_HISTORY_SIZE', '100'))
+
+def create_profile():
+    """Profile factory used when a new user is first tracked"""
+    return new_profile(PAGE_HISTORY_SIZE)
+
+# PERSISTENCE_DIR enables the event log + snapshots; a site's profiles are restored
+# when its partition is created. Sites other than "default" log to PERSISTENCE_DIR/sites/<site>.
+PERSISTENCE_DIR = os.getenv('PERSISTENCE_DIR')
+if PERSISTENCE_DIR and PROFILE_STORE == 'shared':
+    # The shared store is already file-backed, and one log per worker could not be replayed consistently
+    print("⚠️  PERSISTENCE_DIR is ignored with PROFILE_STORE=shared")
+    PERSISTENCE_DIR = None
+if event_watermark.lateness_seconds and PROFILE_STORE == 'shared':
+    # Shared records have no room for a per-user event buffer
+    print("⚠️  EVENT_WATERMARK_SECONDS is ignored with PROFILE_STORE=shared")
+    event_watermark.lateness_seconds = 0.0
+
+def create_persistence(tenant_id, store):
+    """Open one site's event log, restore its profiles and start snapshotting"""
+    directory = PERSISTENCE_DIR if tenant_id == DEFAULT_TENANT else os.path.join(PERSISTENCE_DIR, 'sites', tenant_id)
+    persistence = ProfilePersistence(
+        store,
+        directory,
+        history_size=PAGE_HISTORY_SIZE,
+        fsync_policy=os.getenv('WAL_FSYNC_POLICY', 'interval'),
+        fsync_interval=float(os.getenv('WAL_FSYNC_INTERVAL', '1.0')),
+        segment_bytes=int(os.getenv('WAL_SEGMENT_BYTES', str(64 * 1024 * 1024))),
+        snapshot_interval=float(os.getenv('SNAPSHOT_INTERVAL', '300'))
+    )
+    recovery = persistence.recover()
+    print(f"✅ Restored {recovery['users']} profiles for site {tenant_id} "
+          f"({recovery['replayed_records']} log records replayed)")
+    persistence.start()
+    return persistence
+
+def event_mutator(tenant, user_id, events, now):
+    """Build a store callback that drops duplicate events, then logs and applies the rest; it returns how many it applied"""
+    def mutate(profile):
+        new_events = deduplicator.filter_new(events, now) if deduplicator else events
+        if not new_events:
+            return 0
+        if tenant.persistence:
+            tenant.persistence.log_events(user_id, new_events, now)
+        apply_events(profile, new_events, now)
+        return len(new_events)
+    return mutate
+
+def apply_event_groups(tenant, groups, errors=None):
+    """Apply tracking events grouped by user, one atomic update per user; returns the count applied per user"""
+    now = time.time()
+    return tenant.store.update_many(
+        {uid: event_mutator(tenant, uid, evs, now) for uid, evs in groups.items()},
+        factory=create_profile,
+        errors=errors
+    )
+
+def apply_queued_groups(tenant, groups):
+    """Apply a queue worker's batch; returns the users whose events failed, so the rest still apply"""
+    errors = {}
+    apply_event_groups(tenant, groups, errors)
+    return errors
+
+# INGEST_MODE=async answers /api/track with 202 and applies events on worker threads.
+# Each site has its own queue of INGEST_QUEUE_SIZE events and INGEST_WORKERS workers.
+INGEST_MODE = os.getenv('INGEST_MODE', 'sync')
+
+def create_ingest_queue(tenant):
+    """Start one site's tracking queue"""
+    return IngestQueue(
+        lambda groups: apply_queued_groups(tenant, groups),
+        max_size=int(os.getenv('INGEST_QUEUE_SIZE', '10000')),
+        overflow_policy=os.getenv('INGEST_OVERFLOW_POLICY', 'block'),
+        num_workers=int(os.getenv('INGEST_WORKERS', '2')),
+        block_timeout=float(os.getenv('INGEST_BLOCK_TIMEOUT', '1.0'))
+    )
+
+# Events carrying an "event_id" (or PostHog "uuid") are applied at most once: IDs are
+# remembered in a rotating Bloom filter for at least DEDUP_WINDOW_SECONDS while fewer than
+# DEDUP_CAPACITY IDs arrive per window (it rotates early beyond that), at a DEDUP_ERROR_RATE
+# false-positive rate. 0 disables it.
+deduplicator = None
+if int(os.getenv('DEDUP_CAPACITY', '1000000')):
+    deduplicator = EventDeduplicator(
+        capacity=int(os.getenv('DEDUP_CAPACITY', '1000000')),
+        error_rate=float(os.getenv('DEDUP_ERROR_RATE', '0.001')),
+        window_seconds=float(os.getenv('DEDUP_WINDOW_SECONDS', '3600'))
+    )
+
+# Events per user / per client IP allowed in each sliding window; 0 disables a
+# limit. The IP limit is off by default since behind a proxy every client
+# shares its address.
+rate_limiter = None
+if int(os.getenv('RATE_LIMIT_USER_EVENTS', '600')) or int(os.getenv('RATE_LIMIT_IP_EVENTS', '0')):
+    rate_limiter = IngestRateLimiter(
+        user_limit=int(os.getenv('RATE_LIMIT_USER_EVENTS', '600')),
+        ip_limit=int(os.getenv('RATE_LIMIT_IP_EVENTS', '0')),
+        window_seconds=float(os.getenv('RATE_LIMIT_WINDOW_SECONDS', '60')),
+        width=int(os.getenv('RATE_LIMIT_SKETCH_WIDTH', '8192'))
+    )
+
+def tenant_rules(config):
+    """A site's rules: the named subset of OPTIMIZATION_RULES in the given order, or all of them, compiled"""
+    return compile_rules(OPTIMIZATION_RULES, config.get('rules'))
+
+# /api/optimize answers are memoized per user and profile version (OPTIMIZE_CACHE_SIZE
+# users per site, 0 = off) for up to OPTIMIZE_CACHE_TTL_SECONDS
+OPTIMIZE_CACHE_SIZE = int(os.getenv('OPTIMIZE_CACHE_SIZE', '100000'))
+OPTIMIZE_CACHE_TTL_SECONDS = float(os.getenv('OPTIMIZE_CACHE_TTL_SECONDS', '30'))
+
+# Variant changes are pushed to /api/decisions/stream subscribers (at most
+# DECISION_STREAM_SUBSCRIBERS per site, 0 = off) as writes happen; changes caused by
+# interest decay alone are picked up every DECISION_REFRESH_SECONDS
+DECISION_STREAM_SUBSCRIBERS = int(os.getenv('DECISION_STREAM_SUBSCRIBERS', '10000'))
+DECISION_REFRESH_SECONDS = float(os.getenv('DECISION_REFRESH_SECONDS', '5'))
+
+# /api/analytics?mode=columns reads NumPy column snapshots of each site's profiles,
+# rebuilt in the background every ANALYTICS_SNAPSHOT_SECONDS (0 = off)
+ANALYTICS_SNAPSHOT_SECONDS = float(os.getenv('ANALYTICS_SNAPSHOT_SECONDS', '60'))
+
+# Variant generation (Morph, repo write, Freestyle deploy, routing) runs as background
+# jobs, at most one in flight per (site, user, variant)
+generation_jobs = GenerationJobs(
+    num_workers=int(os.getenv('GENERATION_WORKERS', '2')),
+    max_queued=int(os.getenv('GENERATION_QUEUE_SIZE', '1000')),
+    max_retained=int(os.getenv('GENERATION_JOBS_RETAINED', '10000'))
+)
+
+# Generated components are shared by users whose quantized Morph profiles match
+# (VARIANT_CACHE_SIZE cohorts in memory, 0 = off), optionally kept in VARIANT_CACHE_DIR
+variant_cache = None
+if int(os.getenv('VARIANT_CACHE_SIZE', '10000')):
+    variant_cache = VariantCache(int(os.getenv('VARIANT_CACHE_SIZE', '10000')), os.getenv('VARIANT_CACHE_DIR') or None)
+
+def create_tenant(tenant_id, config):
+    """Build one site's partition: store, rules, and optionally event log and queue"""
+    max_profiles = int(config.get('max_profiles', TENANT_MAX_PROFILES))
+    store = create_store(tenant_id, max_profiles)
+    tenant = Tenant(tenant_id, store, tenant_rules(config), max_profiles)
+    if PROFILE_STORE != 'shared':
+        # Attached before recovery so replayed profiles are counted too
+        tenant.variants = store.observer = VariantTracker(tenant.rules)
+        if DECISION_STREAM_SUBSCRIBERS:
+            tenant.decisions = tenant.variants.listener = DecisionStream(max_subscribers=DECISION_STREAM_SUBSCRIBERS)
+            if DECISION_REFRESH_SECONDS:
+                tenant.variants.watch(store, DECISION_REFRESH_SECONDS)
+    if ANALYTICS_SNAPSHOT_SECONDS:
+        tenant.columns = ColumnMaterializer(store, tenant.rules, ANALYTICS_SNAPSHOT_SECONDS)
+    if OPTIMIZE_CACHE_SIZE:
+        tenant.optimize_cache = OptimizeCache(OPTIMIZE_CACHE_SIZE, OPTIMIZE_CACHE_TTL_SECONDS)
+    if PERSISTENCE_DIR:
+        tenant.persistence = create_persistence(tenant_id, store)
+    if INGEST_MODE == 'async':
+        tenant.ingest_queue = create_ingest_queue(tenant)
+    return tenant
+
+# Sites beyond TENANT_MAX_COUNT that are not configured in TENANTS are refused
+tenants = TenantRegistry(create_tenant, load_tenant_config(), max_tenants=int(os.getenv('TENANT_MAX_COUNT', '32')))
+
+# Open the default site, configured sites and sites with persisted data up front,
+# so their recovery happens at startup rather than on their first request
+startup_tenants = [DEFAULT_TENANT, *tenants.config]
+if PERSISTENCE_DIR and os.path.isdir(os.path.join(PERSISTENCE_DIR, 'sites')):
+    startup_tenants.extend(sorted(os.listdir(os.path.join(PERSISTENCE_DIR, 'sites'))))
+for tenant_id in dict.fromkeys(startup_tenants):
+    try:
+        tenants.get(tenant_id)
+    except TenantError as e:
+        print(f"⚠️  Not opening persisted site {tenant_id}: {e}")
+# Drains every site's queue, then closes its event log and store
+atexit.register(tenants.close)
+# Registered last so it runs first: queued generation jobs finish while their sites are still open
+atexit.register(generation_jobs.close)
+
+def get_tenant(request):
+    """Resolve the site partition a request belongs to"""
+    return tenants.get(tenant_id_from_request(request))
+
+@app.errorhandler(TenantError)
+def handle_tenant_error(e):
+    return jsonify({"error": str(e)}), 400
+
+def tag_device(events, user_agent):
+    """Stamp events with the device parsed from the User-Agent, unless they name their own"""
+    device = user_agent_classifier.classify(user_agent)
+    if device is UNKNOWN_DEVICE:
+        return
+    for event in events:
+        if 'device_type' not in event:
+            event['device_type'], event['os'], event['browser'] = device
 
 def get_user_id(request):
     """Generate or retrieve user ID from cookies"""
     user_id = request.cookies.get('user_id')
     if not user_id:
-        user_id = f"user_{int(time.time())}"
+        user_id = user_id_generator.new_id()
     return user_id
 
 @app.route('/api/track', methods=['POST'])
 def track_behavior():
     """Track user behavior and update profile"""
+    tenant = get_tenant(request)
     user_id = get_user_id(request)
     data = request.json
     
-    if user_id not in user_data:
-        user_data[user_id] = {
-            "visit_count": 0,
-            "total_session_time": 0,
-            "page_views": [],
-            "pricing_interest": 0,
-            "content_interest": 0,
-            "created_at": datetime.now().isoformat()
-        }
+    error = event_error(data)
+    if error:
+        return jsonify({"error": error}), 400
     
-    profile = user_data[user_id]
+    if rate_limiter and not rate_limiter.admit(f"{tenant.tenant_id}/{user_id}", request.remote_addr):
+        return jsonify({"error": "Too many events, slow down"}), 429
     
-    # Update visit count
-    if data.get('event') == 'session_start':
-        profile['visit_count'] += 1
+    tag_device([data], request.headers.get('User-Agent'))
+    
+    if tenant.ingest_queue:
+        if not tenant.ingest_queue.put(user_id, [data]):
+            return jsonify({"error": "Tracking queue is full, retry later"}), 503
+        response = make_response(jsonify({"status": "queued", "user_id": user_id}), 202)
+    else:
+        applied = tenant.store.update(user_id, event_mutator(tenant, user_id, [data], time.time()), factory=create_profile)
+        response = make_response(jsonify({"status": "success" if applied else "duplicate", "user_id": user_id}))
     
-    # Track page views
-    if data.get('event') == 'page_view':
-        profile['page_views'].append({
-            'page': data.get('page'),
-            'timestamp': datetime.now().isoformat(),
-            'time_spent': data.get('time_spent', 0)
-        })
-        
-        # Update interests based on page
-        if 'pricing' in data.get('page', '').lower():
-            profile['pricing_interest'] = min(1.0, profile['pricing_interest'] + 0.2)
-        if 'about' in data.get('page', '').lower() or 'blog' in data.get('page', '').lower():
-            profile['content_interest'] = min(1.0, profile['content_interest'] + 0.1)
-    
-    # Update session time
-    if data.get('session_time'):
-        profile['total_session_time'] += data.get('session_time')
-    
-    # Calculate derived metrics
-    profile['avg_session_time'] = profile['total_session_time'] / max(1, profile['visit_count'])
-    profile['page_depth'] = len(profile['page_views'])
-    profile['bounce_rate'] = 1.0 if profile['page_depth'] <= 1 else 0.0
-    
-    response = make_response(jsonify({"status": "success", "user_id": user_id}))
     response.set_cookie('user_id', user_id, max_age=30*24*60*60)  # 30 days
     
     return response
 
+@app.route('/api/track/batch', methods=['POST'])
+def track_behavior_batch():
+    """Track a batch of events (JSON array or NDJSON) for one or more users"""
+    tenant = get_tenant(request)
+    user_id = get_user_id(request)
+    
+    try:
+        events = parse_event_batch(request.get_data(), request.content_type)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid event batch: {str(e)}"}), 400
+    
+    groups, rejected = group_events_by_user(events, user_id)
+    
+    # Over-limit events are dropped from the end of each user's batch
+    rate_limited = 0
+    if rate_limiter:
+        for uid in list(groups):
+            allowed = rate_limiter.admit(f"{tenant.tenant_id}/{uid}", request.remote_addr, len(groups[uid]))
+            rate_limited += len(groups[uid]) - allowed
+            if allowed:
+                groups[uid] = groups[uid][:allowed]
+            else:
+                del groups[uid]
+        if rate_limited and not groups:
+            return jsonify({"error": "Too many events, slow down", "rate_limited": rate_limited}), 429
+    
+    for user_events in groups.values():
+        tag_device(user_events, request.headers.get('User-Agent'))
+    
+    if tenant.ingest_queue:
+        # All users or none, so a retry after 503 cannot apply anyone twice
+        if not tenant.ingest_queue.put_many(groups):
+            return jsonify({"error": "Tracking queue is full, retry later"}), 503
+        status, status_code = "queued", 202
+        # Duplicates are only known once the queue applies the events
+        duplicates = None
+    else:
+        applied = apply_event_groups(tenant, groups)
+        duplicates = sum(len(groups[uid]) - count for uid, count in applied.items())
+        status, status_code = "success", 200
+    
+    response = make_response(jsonify({
+        "status": status,
+        "user_id": user_id,
+        "accepted": len(events) - rejected - rate_limited,
+        "rejected": rejected,
+        "rate_limited": rate_limited,
+        "duplicates": duplicates,
+        "users": len(groups)
+    }), status_code)
+    if user_id in groups:
+        response.set_cookie('user_id', user_id, max_age=30*24*60*60)  # 30 days
+    
+    return response
+
+@app.route('/api/ingest/stats', methods=['GET'])
+def get_ingest_stats():
+    """Get a site's tracking queue depth and drop/reject counters, plus rate-limit, duplicate and late-event counters"""
+    tenant = get_tenant(request)
+    rate_limit = rate_limiter.stats() if rate_limiter else {"enabled": False}
+    dedup = deduplicator.stats() if deduplicator else {"enabled": False}
+    watermark = event_watermark.stats()
+    if not tenant.ingest_queue:
+        return jsonify({"site": tenant.tenant_id, "mode": "sync", "rate_limit": rate_limit, "dedup": dedup,
+                        "watermark": watermark})
+    
+    return jsonify({"site": tenant.tenant_id, "mode": "async", **tenant.ingest_queue.stats(),
+                    "rate_limit": rate_limit, "dedup": dedup, "watermark": watermark})
+
+@app.route('/api/store/stats', methods=['GET'])
+def get_store_stats():
+    """Get a site's profile store size, quota and, for LRU stores, hit/miss/evict counters"""
+    tenant = get_tenant(request)
+    stats = {
+        "site": tenant.tenant_id,
+        "type": PROFILE_STORE,
+        "profiles": len(tenant.store),
+        "max_profiles": tenant.max_profiles,
+        "sites": tenants.ids()
+    }
+    if hasattr(tenant.store, 'stats'):
+        stats.update(tenant.store.stats())
+    if tenant.variants:
+        stats["variants"] = tenant.variants.stats()
+    if tenant.optimize_cache:
+        stats["optimize_cache"] = tenant.optimize_cache.stats()
+    if tenant.decisions:
+        stats["decision_stream"] = tenant.decisions.stats()
+    
+    return jsonify(stats)
+
+@app.route('/api/persistence/stats', methods=['GET'])
+def get_persistence_stats():
+    """Get a site's event log and snapshot status"""
+    tenant = get_tenant(request)
+    if not tenant.persistence:
+        return jsonify({"site": tenant.tenant_id, "enabled": False})
+    
+    return jsonify({"site": tenant.tenant_id, "enabled": True, **tenant.persistence.stats()})
+
+@app.route('/api/persistence/snapshot', methods=['POST'])
+def create_persistence_snapshot():
+    """Write a site's profile snapshot now instead of waiting for the next interval"""
+    tenant = get_tenant(request)
+    if not tenant.persistence:
+        return jsonify({"error": "Persistence is not enabled. Set PERSISTENCE_DIR"}), 400
+    
+    return jsonify(tenant.persistence.snapshot())
+
 @app.route('/api/optimize', methods=['GET'])
 def get_optimization():
     """Get AI-powered optimization recommendation and trigger real-time code generation"""
+    tenant = get_tenant(request)
     user_id = get_user_id(request)
+    now = time.time()
+    
+    # Polls for a profile that has not changed since the last answer are served from cache
+    cache = tenant.optimize_cache
+    if cache:
+        version = tenant.store.read(user_id, lambda profile: profile.version)
+        if version is not None:
+            body = cache.get(user_id, version, now)
+            if body is not None:
+                return app.response_class(body, mimetype=app.json.mimetype)
+    
+    profile = tenant.store.get(user_id)
     
-    if user_id not in user_data:
+    if profile is None:
         return jsonify({
             "variant": "default",
             "reason": "New user - showing default experience",
             "confidence": 1.0
         })
     
-    profile = user_data[user_id]
+    # Rules see the profile as of now: buffered events applied, interest scores decayed
+    current_view(profile, now)
     
     # Check if this user needs real-time optimization
     optimization_needed = False
     optimization_type = None
     
-    for rule_name, rule in OPTIMIZATION_RULES.items():
-        if rule["trigger"](profile):
-            optimization_needed = True
-            optimization_type = rule["variant"]
-            break
+    rule = tenant.rules.decide(profile)
+    if rule is not None:
+        optimization_needed = True
+        optimization_type = rule.variant
     
+    # Only bodies that cannot go stale before the profile changes are cached
+    cacheable = True
     if optimization_needed:
-        # Trigger real-time Morph code generation
-        generate_result = trigger_real_time_generation(user_id, profile, optimization_type)
+        # Queue real-time Morph code generation; the response carries the job handle
+        generate_result = submit_generation(tenant, user_id, profile, optimization_type)
+        # A succeeded job keeps being returned for this variant; any other status will
+        # move on without bumping the profile version, and a failed job is retried by the next poll
+        cacheable = generate_result["status"] == SUCCEEDED
         
-        return jsonify({
+        response = jsonify({
             "variant": optimization_type,
-            "reason": rule["reason"],
+            "reason": rule.reason,
             "confidence": 0.85,
             "user_profile": {
                 "visit_count": profile["visit_count"],
@@ -150,36 +481,107 @@ def get_optimization():
                 "avg_session_time": profile["avg_session_time"]
             },
             "morph_generation": generate_result,
-            "deployment_status": "generating"
+            "deployment_status": {SUCCEEDED: "live", FAILED: "failed"}.get(generate_result["status"], "generating")
+        })
+    else:
+        response = jsonify({
+            "variant": "default",
+            "reason": "No specific optimization patterns detected",
+            "confidence": 0.6,
+            "user_profile": {
+                "visit_count": profile["visit_count"],
+                "pricing_interest": profile["pricing_interest"],
+                "avg_session_time": profile["avg_session_time"]
+            }
         })
     
-    return jsonify({
-        "variant": "default",
-        "reason": "No specific optimization patterns detected",
-        "confidence": 0.6,
-        "user_profile": {
-            "visit_count": profile["visit_count"],
-            "pricing_interest": profile["pricing_interest"],
-            "avg_session_time": profile["avg_session_time"]
-        }
-    })
+    if cache and cacheable:
+        # Cached until the profile changes, the TTL passes, or decay could flip the decision
+        expires_at = decision_expires_at(decaying_conditions(tenant.rules, interest_decay), profile, now)
+        cache.put(user_id, profile.version, response.get_data(), now, expires_at)
+    return response
+
+@app.route('/api/decisions/stream', methods=['GET'])
+def stream_decisions():
+    """
+    Push a user's decided variant over server-sent events instead of polling
+    /api/optimize: the current decision first, then one event per change.
+    The user is the ``user_id`` parameter, or the cookie. Clients fetch
+    /api/optimize once per change to get the generated variant.
+    """
+    tenant = get_tenant(request)
+    if not tenant.decisions:
+        return jsonify({"error": "Decision streams need an in-process profile store and DECISION_STREAM_SUBSCRIBERS > 0"}), 501
+    user_id = request.args.get('user_id') or request.cookies.get('user_id')
+    if not user_id:
+        return jsonify({"error": "user_id is required"}), 400
+    
+    subscription = tenant.decisions.subscribe(user_id)
+    if subscription is None:
+        return jsonify({"error": "Too many decision stream subscribers, poll /api/optimize instead"}), 503
+    # Subscribed before reading the current decision, so no change can fall in between
+    initial = tenant.variants.decision(user_id)
+    response = app.response_class(sse_stream(tenant.decisions, subscription, initial), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/generate-variant', methods=['POST'])
 def generate_variant():
-    """Trigger real-time Morph code generation for a user"""
+    """Queue real-time Morph code generation for a user; poll the returned job for the result"""
     data = request.json
     user_id = data.get('user_id')
     optimization_type = data.get('optimization_type')
     
-    if not user_id or user_id not in user_data:
+    tenant = get_tenant(request)
+    profile = tenant.store.get(user_id) if user_id else None
+    
+    if profile is None:
         return jsonify({"error": "Invalid user"}), 400
     
-    profile = user_data[user_id]
-    result = trigger_real_time_generation(user_id, profile, optimization_type)
+    current_view(profile)
+    result = submit_generation(tenant, user_id, profile, optimization_type, force=True)
     
-    return jsonify(result)
+    return jsonify(result), 503 if result["status"] == "rejected" else 202
 
-def trigger_real_time_generation(user_id: str, profile: dict, optimization_type: str):
+@app.route('/api/generation-jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    """Get a generation job's status and, once finished, its result"""
+    job = generation_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify(job.to_dict())
+
+@app.route('/api/generation-jobs', methods=['GET'])
+def get_generation_stats():
+    """Get generation job counters, queue depth and cohort variant cache counters"""
+    stats = generation_jobs.stats()
+    if variant_cache:
+        stats["variant_cache"] = variant_cache.stats()
+    
+    return jsonify(stats)
+
+def submit_generation(tenant, user_id: str, profile: dict, optimization_type: str, force: bool = False):
+    """Queue generation for a user's variant, or join the job already covering it; returns the job handle"""
+    job, created = generation_jobs.submit(
+        (tenant.tenant_id, user_id, optimization_type),
+        user_id,
+        optimization_type,
+        lambda: trigger_real_time_generation(user_id, profile, optimization_type, tenant.rules),
+        force=force
+    )
+    if job is None:
+        return {"status": "rejected", "error": "Generation queue is full"}
+    
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "status_url": f"/api/generation-jobs/{job.job_id}",
+        "deduplicated": not created
+    }
+
+def trigger_real_time_generation(user_id: str, profile: dict, optimization_type: str, rules):
     """Trigger real-time Morph code generation and Freestyle deployment"""
     
     try:
@@ -204,15 +606,24 @@ def trigger_real_time_generation(user_id: str, profile: dict, optimization_type:
                 "bounce_rate": profile["bounce_rate"]
             },
             "optimization_target": "engagement",
-            "device_type": "desktop"
+            "device_type": profile.get("device_type") if profile.get("device_type") in ("mobile", "tablet") else "desktop"
         }
         
-        # Step 3: Generate code with Morph
-        morph_result = morph_client.generate_component_variant(
-            morph_profile, 
-            base_component, 
-            "react"
-        )
+        # Step 3: Generate code with Morph, or reuse the variant generated for this user's cohort
+        if variant_cache:
+            morph_result = variant_cache.get_or_generate(
+                morph_profile,
+                rules,
+                base_component,
+                "react",
+                lambda cohort: morph_client.generate_component_variant(cohort, base_component, "react")
+            )
+        else:
+            morph_result = morph_client.generate_component_variant(
+                morph_profile, 
+                base_component, 
+                "react"
+            )
         
         if not morph_result.get("success"):
             return {"error": "Morph generation failed", "details": morph_result}
@@ -309,30 +720,40 @@ export default Homepage;
 
 @app.route('/api/analytics', methods=['GET'])
 def get_analytics():
-    """Get analytics dashboard data"""
-    total_users = len(user_data)
+    """Get analytics dashboard data for one site; other sites' profiles are never scanned"""
+    tenant = get_tenant(request)
+    if request.args.get('mode') == 'columns':
+        return get_column_analytics(tenant)
+    total_users = len(tenant.store)
     
     if total_users == 0:
         return jsonify({
+            "site": tenant.tenant_id,
             "total_users": 0,
             "optimizations_applied": 0,
             "improvement_metrics": {}
         })
     
-    optimizations = 0
     variant_distribution = {"default": 0, "pricing_focused": 0, "content_heavy": 0, "simplified": 0}
-    
-    for user_id, profile in user_data.items():
-        # Simulate optimization check
-        for rule in OPTIMIZATION_RULES.values():
-            if rule["trigger"](profile):
-                optimizations += 1
-                variant_distribution[rule["variant"]] += 1
-                break
+    verification = None
+    if tenant.variants:
+        # Maintained on every profile write; only users whose interest has decayed
+        # past a rule threshold since their last write are re-decided here
+        if request.args.get('verify') == '1':
+            verification = tenant.variants.verify(tenant.store)
         else:
-            variant_distribution["default"] += 1
+            tenant.variants.refresh(tenant.store)
+        total_users, counts = tenant.variants.distribution()
+    else:
+        # Shared store: other processes write too, so decide every user at once from columns
+        now = time.time()
+        decisions = tenant.rules.evaluate(current_view(profile, now) for _, profile in tenant.store.items())
+        total_users, counts = len(decisions), tenant.rules.variant_counts(decisions)
+    variant_distribution.update(counts)
+    optimizations = total_users - variant_distribution["default"]
     
     return jsonify({
+        "site": tenant.tenant_id,
         "total_users": total_users,
         "optimizations_applied": optimizations,
         "optimization_rate": optimizations / total_users if total_users > 0 else 0,
@@ -341,16 +762,93 @@ def get_analytics():
             "avg_engagement_lift": "23%",
             "conversion_improvement": "15%",
             "time_to_find_pricing": "-45%"
+        },
+        **({"verification": verification} if verification else {})
+    })
+
+def get_column_analytics(tenant):
+    """
+    Percentiles, histograms and cross-tabs over the site's latest column snapshot.
+
+    Query parameters: ``fields`` (comma-separated, default all numeric columns),
+    ``percentiles`` (default 50,90,95,99), ``bins`` (default 10) and any number
+    of ``crosstab=row:column`` pairs, e.g. ``crosstab=variant:device_type``.
+    """
+    if not tenant.columns:
+        return jsonify({"error": "Column analytics are disabled (ANALYTICS_SNAPSHOT_SECONDS=0)"}), 404
+    snapshot = tenant.columns.current()
+    try:
+        fields = [f for f in request.args.get('fields', '').split(',') if f] or list(snapshot.numeric)
+        percentiles = [float(q) for q in request.args.get('percentiles', '').split(',') if q] or DEFAULT_PERCENTILES
+        bins = int(request.args.get('bins', 10))
+        if bins < 1 or any(not 0 <= q <= 100 for q in percentiles):
+            raise ValueError("bins must be positive and percentiles within 0-100")
+        crosstabs = {}
+        for pair in request.args.getlist('crosstab'):
+            rows, _, columns = pair.partition(':')
+            crosstabs[pair] = snapshot.crosstab(rows, columns, bins)
+        stats = {
+            field: {
+                **({"percentiles": snapshot.percentiles(field, percentiles)} if field in snapshot.numeric else {}),
+                "histogram": snapshot.histogram(field, bins)
+            }
+            for field in fields
         }
+    except KeyError as e:
+        return jsonify({"error": f"Unknown column: {e.args[0]}", "columns": snapshot.fields}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "site": tenant.tenant_id,
+        "snapshot": {
+            "taken_at": snapshot.taken_at,
+            "age_seconds": round(time.time() - snapshot.taken_at, 3),
+            "build_seconds": round(snapshot.build_seconds, 3),
+            "profiles": snapshot.size
+        },
+        "fields": stats,
+        "crosstabs": crosstabs
     })
 
 @app.route('/api/user/<user_id>', methods=['GET'])
 def get_user_profile(user_id):
     """Get specific user profile for demo"""
-    if user_id not in user_data:
+    profile = get_tenant(request).store.get(user_id)
+    if profile is None:
         return jsonify({"error": "User not found"}), 404
     
-    return jsonify(user_data[user_id])
+    return jsonify(serialize_profile(profile))
+
+@app.route('/api/users/export', methods=['GET'])
+def export_users():
+    """
+    Stream the site's profiles as NDJSON, one ``{"user_id", "cursor", "profile"}``
+    object per line, without building the whole body in memory.
+
+    Query parameters (all optional): ``created_after`` / ``created_before``
+    (ISO 8601), ``variant``, ``min_visits``, ``limit``, and ``cursor`` to
+    resume after the line that carried it.
+    """
+    tenant = get_tenant(request)
+    try:
+        profile_filter = ExportFilter(
+            tenant.rules,
+            created_after=parse_timestamp(request.args.get('created_after')),
+            created_before=parse_timestamp(request.args.get('created_before')),
+            variant=request.args.get('variant') or None,
+            min_visits=int(request.args['min_visits']) if request.args.get('min_visits') else None
+        )
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if profile_filter.variant is not None and profile_filter.variant not in tenant.rules.variants:
+        return jsonify({"error": f"Unknown variant: {profile_filter.variant}",
+                        "variants": list(tenant.rules.variants)}), 400
+
+    lines = export_profiles(tenant.store, profile_filter, after, limit)
+    return app.response_class(lines, mimetype='application/x-ndjson')
 
 # Demo data seeding
 @app.route('/api/seed-demo-data', methods=['POST'])
@@ -389,7 +887,14 @@ def seed_demo_data():
         }
     }
     
-    user_data.update(demo_users)
+    tenant = get_tenant(request)
+    now = time.time()
+    for user_id, profile in demo_users.items():
+        def seed(_, user_id=user_id, profile=profile):
+            if tenant.persistence:
+                tenant.persistence.log_profile(user_id, profile, now)
+            return profile_from_dict(profile, PAGE_HISTORY_SIZE, now)
+        tenant.store.replace(user_id, seed)
     return jsonify({"status": "Demo data seeded", "users": list(demo_users.keys())})
 
 # PostHog API Endpoints
@@ -494,7 +999,7 @@ def get_posthog_stats():
 def get_enhanced_user_profile(user_id):
     """Get user profile enhanced with PostHog data"""
     # Get local user data
-    local_data = user_data.get(user_id, {})
+    local_data = serialize_profile(get_tenant(request).store.get(user_id, {}))
     
     # Get PostHog data if available
     posthog_data = {}
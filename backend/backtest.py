@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+Backtest candidate optimization rules by replaying recorded events
+
+Replays /api/track payloads (NDJSON, one event with a ``user_id`` per line),
+the server's own event log segments, or PostHog event exports through the
+same profile update logic the server uses, and reports for every candidate
+rule set how many users each variant would get and when they qualified.
+
+Replay is split across processes: input files are cut into byte ranges that
+workers parse in parallel, spilling events into partitions by user, then each
+partition's users are replayed and decided by one worker.
+
+Usage, from the backend directory:
+    python backtest.py events.ndjson --candidates candidates.json --workers 4
+
+A candidates file maps a name to rule overrides merged over the current
+OPTIMIZATION_RULES; a rule set to null is dropped, e.g.
+    {"strict_pricing": {"returning_user_pricing": {"when": [["visit_count", ">=", 5], ["pricing_interest", ">", 0.8]]}},
+     "no_quick_browser": {"quick_browser": null}}
+"""
+
+import argparse
+import glob
+import json
+import math
+import multiprocessing
+import os
+import pickle
+import shutil
+import statistics
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from event_watermark import event_time
+from optimization_rules import OPTIMIZATION_RULES
+from profile_events import new_profile, apply_events, current_values
+from rule_table import DecisionTable, compile_rules, DEFAULT_VARIANT
+from user_agents import DEVICE_TYPES, OS_FAMILIES, BROWSER_FAMILIES, OTHER
+from user_ids import shard_of
+
+BASELINE = 'current'
+# Column order of PostHog event rows when the export carries no "columns"
+POSTHOG_COLUMNS = ('event', 'timestamp', 'properties', 'distinct_id')
+# PostHog events more than this far apart start a new session when no $session_id is given
+SESSION_GAP_SECONDS = 30 * 60
+CHUNK_BYTES = 32 * 1024 * 1024
+
+# A replayable event: (user_id, arrival time, input order, /api/track-shaped event)
+Record = Tuple[str, float, int, Dict[str, Any]]
+# A parsed input event: (user_id, arrival time, event); None for a missing user or time
+# marks it as rejected, and the event is then whatever the input held
+ParsedEvent = Tuple[Optional[str], Optional[float], Any]
+
+
+def load_candidates(path: Optional[str]) -> Dict[str, DecisionTable]:
+    """The current rules plus every candidate from ``path``, compiled"""
+    candidates = {BASELINE: compile_rules(OPTIMIZATION_RULES)}
+    if not path:
+        return candidates
+    with open(path) as f:
+        overrides = json.load(f)
+    for name, rules in overrides.items():
+        definitions = {rule: dict(definition) for rule, definition in OPTIMIZATION_RULES.items()}
+        for rule, override in rules.items():
+            if override is None:
+                definitions.pop(rule, None)
+            else:
+                definitions[rule] = {**definitions.get(rule, {}), **override}
+        try:
+            candidates[name] = compile_rules(definitions)
+        except ValueError as e:
+            raise ValueError(f"Candidate {name!r}: {e}") from e
+    return candidates
+
+
+# Reading inputs
+
+def _known(values: Tuple[str, ...], value: Any, fallback: Optional[str] = None) -> Optional[str]:
+    """Match a PostHog property ("Mobile", "Mac OS X") to one of our values, case-insensitively"""
+    if value:
+        for known in values:
+            if known.lower() == str(value).lower():
+                return known
+    return fallback
+
+
+def posthog_event(row: Dict[str, Any]) -> Optional[Tuple[str, float, Dict[str, Any]]]:
+    """Translate one PostHog event into (distinct_id, time, /api/track-shaped event)"""
+    properties = row.get('properties') or {}
+    if isinstance(properties, str):
+        properties = json.loads(properties)
+    user_id = row.get('distinct_id')
+    ts = event_time({'timestamp': row.get('timestamp')}, math.inf)
+    if not user_id or ts == math.inf:
+        return None
+
+    name = row.get('event')
+    event: Dict[str, Any] = {'event': name, 'timestamp': ts}
+    if name == '$pageview':
+        event['event'] = 'page_view'
+        event['page'] = properties.get('$pathname') or urlparse(properties.get('$current_url') or '').path or '/'
+    device_type = _known(DEVICE_TYPES, properties.get('$device_type'))
+    if device_type:
+        event['device_type'] = device_type
+        event['os'] = _known(OS_FAMILIES, properties.get('$os'), OTHER)
+        event['browser'] = _known(BROWSER_FAMILIES, properties.get('$browser'), OTHER)
+    # Sessions are rebuilt per user during replay (see _sessionize)
+    event['_session'] = properties.get('$session_id')
+    return str(user_id), ts, event
+
+
+def parse_line(line: str, columns: Tuple[str, ...] = POSTHOG_COLUMNS) -> Iterator[ParsedEvent]:
+    """
+    Yield (user_id, arrival time, event) from one input line, which may be an
+    /api/track event, an event log record or a PostHog row (array or object).
+    Events without a user or a usable time are yielded with None for it, so
+    they are counted as rejected rather than silently skipped.
+    """
+    item = json.loads(line)
+    if isinstance(item, list):
+        item = dict(zip(columns, item))
+    if not isinstance(item, dict):
+        yield None, None, item
+    elif 'distinct_id' in item:
+        yield posthog_event(item) or (None, None, item)
+    elif isinstance(item.get('events'), list):
+        # Event log record: events exactly as received at "ts"
+        for event in item['events']:
+            if isinstance(event, dict):
+                yield item.get('user_id') or event.get('user_id'), item.get('ts'), event
+            else:
+                yield None, None, event
+    else:
+        ts = event_time(item, math.inf)
+        yield item.get('user_id'), ts if ts != math.inf else None, item
+
+
+def split_inputs(paths: List[str], chunk_bytes: int = CHUNK_BYTES) -> List[Tuple[str, int, int]]:
+    """Cut NDJSON inputs into (path, start, end) byte ranges; each range starts on a line boundary"""
+    chunks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        start = 0
+        with open(path, 'rb') as f:
+            while start < size:
+                f.seek(min(size, start + chunk_bytes))
+                f.readline()
+                end = min(size, f.tell())
+                chunks.append((path, start, end))
+                start = end
+    return chunks
+
+
+def _is_json_document(path: str) -> bool:
+    """A single JSON document, e.g. a PostHog query response with "columns" and "results" arrays"""
+    with open(path, 'rb') as f:
+        first_line = f.readline().strip()
+    if not first_line.startswith(b'{'):
+        return False
+    try:
+        item = json.loads(first_line)
+    except ValueError:
+        # Not one complete object per line, so a pretty-printed document
+        return True
+    return isinstance(item.get('results'), list)
+
+
+def _map_records(records: Iterator[ParsedEvent], first_seq: int,
+                 spill_dir: str, chunk_id: str, partitions: int) -> Dict[str, Any]:
+    parts: List[List[Record]] = [[] for _ in range(partitions)]
+    rejected = 0
+    latest = -math.inf
+    seq = first_seq
+    for user_id, ts, event in records:
+        # No user or no usable time: the event cannot be placed in a replay
+        if not user_id or isinstance(ts, bool) or not isinstance(ts, (int, float)):
+            rejected += 1
+            continue
+        parts[shard_of(str(user_id)) % partitions].append((str(user_id), float(ts), seq, event))
+        latest = max(latest, ts)
+        seq += 1
+    for partition, batch in enumerate(parts):
+        if batch:
+            with open(os.path.join(spill_dir, f"p{partition:04d}-{chunk_id}.pkl"), 'wb') as f:
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+    return {"events": seq - first_seq, "rejected": rejected, "latest": latest}
+
+
+def _map_chunk(task) -> Dict[str, Any]:
+    """Parse one byte range and spill its events by partition"""
+    chunk_index, (path, start, end), spill_dir, partitions = task
+
+    def records():
+        nonlocal rejected
+        with open(path, 'rb') as f:
+            f.seek(start)
+            for raw in f.read(end - start).splitlines():
+                if not raw.strip():
+                    continue
+                try:
+                    yield from parse_line(raw)
+                except (ValueError, KeyError, TypeError):
+                    rejected += 1
+
+    rejected = 0
+    # Input order is kept across chunks by giving every chunk its own range of sequence numbers
+    result = _map_records(records(), chunk_index << 32, spill_dir, f"c{chunk_index:06d}", partitions)
+    result["rejected"] += rejected
+    return result
+
+
+# Replaying
+
+def _sessionize(records: List[Record]) -> Iterator[Tuple[float, List[Dict[str, Any]]]]:
+    """
+    Yield (arrival time, events) per record. PostHog events have no
+    session_start or session_time, so they are derived here from each user's
+    $session_id (or from gaps of SESSION_GAP_SECONDS) and time between events.
+    """
+    session = previous_ts = None
+    for _, ts, _, event in records:
+        if '_session' not in event:
+            yield ts, [event]
+            continue
+        event = dict(event)
+        session_id = event.pop('_session')
+        events = []
+        new_session = (previous_ts is None or session_id != session if session_id
+                       else previous_ts is None or ts - previous_ts > SESSION_GAP_SECONDS)
+        if new_session:
+            events.append({'event': 'session_start', 'timestamp': ts})
+        elif ts > previous_ts:
+            event['session_time'] = min(ts - previous_ts, SESSION_GAP_SECONDS)
+        events.append(event)
+        session, previous_ts = session_id, ts
+        yield ts, events
+
+
+def replay_user(records: List[Record], candidates: Dict[str, DecisionTable], end: float) -> Dict[str, Any]:
+    """
+    Replay one user's events in arrival order and decide every candidate after
+    each one; returns when each variant was first reached and the decision at ``end``.
+    """
+    records.sort(key=lambda record: (record[1], record[2]))
+    first_seen = records[0][1]
+    profile = new_profile(now=first_seen)
+    fields = tuple(dict.fromkeys(field for table in candidates.values() for field in table.fields))
+    first_qualified = {name: {} for name in candidates}
+    last = dict.fromkeys(candidates, DEFAULT_VARIANT)
+    switches = dict.fromkeys(candidates, 0)
+
+    for ts, events in _sessionize(records):
+        apply_events(profile, events, ts)
+        view = current_values(profile, fields, ts)
+        for name, table in candidates.items():
+            rule = table.decide(view)
+            variant = rule.variant if rule else DEFAULT_VARIANT
+            if variant != last[name]:
+                switches[name] += 1
+                last[name] = variant
+            if rule and variant not in first_qualified[name]:
+                first_qualified[name][variant] = ts
+
+    # Interest keeps decaying after the user's last event
+    view = current_values(profile, fields, max(end, records[-1][1]))
+    final = {}
+    for name, table in candidates.items():
+        rule = table.decide(view)
+        final[name] = rule.variant if rule else DEFAULT_VARIANT
+    return {"first_seen": first_seen, "first_qualified": first_qualified, "final": final, "switches": switches}
+
+
+class CandidateReport:
+    """Per-candidate totals, mergeable across partitions"""
+
+    def __init__(self):
+        self.final = Counter()
+        self.qualified = Counter()
+        self.switches = 0
+        self.delays: Dict[str, List[float]] = {}
+        self.by_day: Dict[str, Counter] = {}
+
+    def add(self, user: Dict[str, Any], name: str) -> None:
+        self.final[user["final"][name]] += 1
+        self.switches += user["switches"][name]
+        for variant, ts in user["first_qualified"][name].items():
+            self.qualified[variant] += 1
+            self.delays.setdefault(variant, []).append(ts - user["first_seen"])
+            day = datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d')
+            self.by_day.setdefault(variant, Counter())[day] += 1
+
+    def merge(self, other: 'CandidateReport') -> None:
+        self.final.update(other.final)
+        self.qualified.update(other.qualified)
+        self.switches += other.switches
+        for variant, delays in other.delays.items():
+            self.delays.setdefault(variant, []).extend(delays)
+        for variant, days in other.by_day.items():
+            self.by_day.setdefault(variant, Counter()).update(days)
+
+    def to_dict(self, variants: Tuple[str, ...], users: int) -> Dict[str, Any]:
+        def hours(delays, fraction):
+            ordered = sorted(delays)
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] / 3600, 2)
+
+        return {
+            "final_distribution": {variant: self.final.get(variant, 0) for variant in variants},
+            "ever_qualified": {variant: self.qualified.get(variant, 0) for variant in variants if variant != DEFAULT_VARIANT},
+            "optimization_rate": (users - self.final.get(DEFAULT_VARIANT, 0)) / users if users else 0.0,
+            "variant_switches": self.switches,
+            "hours_to_qualify": {
+                variant: {"median": round(statistics.median(delays) / 3600, 2), "p90": hours(delays, 0.9)}
+                for variant, delays in sorted(self.delays.items())
+            },
+            "qualified_per_day": {variant: dict(sorted(days.items())) for variant, days in sorted(self.by_day.items())}
+        }
+
+
+def _reduce_partition(task) -> Tuple[int, Dict[str, CandidateReport]]:
+    """Replay every user in one partition"""
+    partition, spill_dir, candidates_path, end = task
+    candidates = load_candidates(candidates_path)
+    by_user: Dict[str, List[Record]] = {}
+    for path in sorted(glob.glob(os.path.join(spill_dir, f"p{partition:04d}-*.pkl"))):
+        with open(path, 'rb') as f:
+            for record in pickle.load(f):
+                by_user.setdefault(record[0], []).append(record)
+
+    users = len(by_user)
+    reports = {name: CandidateReport() for name in candidates}
+    while by_user:
+        _, records = by_user.popitem()
+        user = replay_user(records, candidates, end)
+        for name, report in reports.items():
+            report.add(user, name)
+    return users, reports
+
+
+def run_backtest(paths: List[str],
+                 candidates_path: Optional[str] = None,
+                 workers: int = 0,
+                 partitions: int = 0,
+                 end: Optional[float] = None,
+                 chunk_bytes: int = CHUNK_BYTES) -> Dict[str, Any]:
+    """Replay ``paths`` against the current rules and every candidate; returns the report"""
+    started = time.perf_counter()
+    candidates = load_candidates(candidates_path)
+    workers = workers or os.cpu_count() or 1
+    partitions = partitions or workers * 4
+    spill_dir = tempfile.mkdtemp(prefix='backtest-')
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            document_paths = [path for path in paths if _is_json_document(path)]
+            chunks = split_inputs([path for path in paths if path not in document_paths], chunk_bytes)
+            tasks = [(index, chunk, spill_dir, partitions) for index, chunk in enumerate(chunks)]
+            mapped = pool.map(_map_chunk, tasks)
+            for index, path in enumerate(document_paths, len(chunks)):
+                with open(path) as f:
+                    document = json.load(f)
+                columns = tuple(document.get('columns') or POSTHOG_COLUMNS)
+                rows = (posthog_event(dict(zip(columns, row))) or (None, None, row) for row in document['results'])
+                mapped.append(_map_records(rows, index << 32, spill_dir,
+                                           f"d{index:06d}", partitions))
+            parsed_seconds = time.perf_counter() - started
+
+            latest = max((result["latest"] for result in mapped), default=-math.inf)
+            end = latest if end is None else end
+            reduced = pool.map(_reduce_partition,
+                               [(partition, spill_dir, candidates_path, end) for partition in range(partitions)])
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    users = sum(count for count, _ in reduced)
+    reports = {name: CandidateReport() for name in candidates}
+    for _, partition_reports in reduced:
+        for name, report in partition_reports.items():
+            reports[name].merge(report)
+    events = sum(result["events"] for result in mapped)
+    elapsed = time.perf_counter() - started
+    return {
+        "events": events,
+        "rejected": sum(result["rejected"] for result in mapped),
+        "users": users,
+        "end": datetime.fromtimestamp(end, timezone.utc).isoformat() if end != -math.inf else None,
+        "workers": workers,
+        "parse_seconds": round(parsed_seconds, 2),
+        "total_seconds": round(elapsed, 2),
+        "events_per_second": round(events / elapsed) if elapsed else 0,
+        "candidates": {
+            name: {
+                "rules": [rule.name for rule in table],
+                **reports[name].to_dict(table.variants, users)
+            }
+            for name, table in candidates.items()
+        }
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Replayed {report['events']:,} events from {report['users']:,} users "
+          f"({report['rejected']:,} rejected) in {report['total_seconds']}s "
+          f"on {report['workers']} workers, {report['events_per_second']:,} events/s; decisions as of {report['end']}")
+    variants = sorted({variant for candidate in report["candidates"].values() for variant in candidate["final_distribution"]})
+    print(f"\n{'candidate':<24} " + " ".join(f"{variant:>16}" for variant in variants) + f" {'optimized':>10} {'switches':>9}")
+    for name, candidate in report["candidates"].items():
+        counts = " ".join(f"{candidate['final_distribution'].get(variant, 0):>16,}" for variant in variants)
+        print(f"{name:<24} {counts} {candidate['optimization_rate']:>10.1%} {candidate['variant_switches']:>9,}")
+    print(f"\n{'candidate':<24} {'variant':<18} {'ever qualified':>15} {'median h':>9} {'p90 h':>8}")
+    for name, candidate in report["candidates"].items():
+        for variant, qualified in candidate["ever_qualified"].items():
+            timing = candidate["hours_to_qualify"].get(variant, {})
+            print(f"{name:<24} {variant:<18} {qualified:>15,} {timing.get('median', '-'):>9} {timing.get('p90', '-'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="\n".join(__doc__.splitlines()[3:]))
+    parser.add_argument("inputs", nargs="+", help="NDJSON event files, event log segments or PostHog exports")
+    parser.add_argument("--candidates", help="JSON file of candidate rule overrides")
+    parser.add_argument("--workers", type=int, default=0, help="processes to use (default: one per CPU)")
+    parser.add_argument("--partitions", type=int, default=0, help="user partitions (default: 4 per worker)")
+    parser.add_argument("--end", help="ISO 8601 time to take final decisions at (default: the last event)")
+    parser.add_argument("--json", dest="json_path", help="also write the full report, with per-day counts, here")
+    args = parser.parse_args()
+
+    end = datetime.fromisoformat(args.end.replace('Z', '+00:00')).timestamp() if args.end else None
+    report = run_backtest(args.inputs, args.candidates, args.workers, args.partitions, end)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
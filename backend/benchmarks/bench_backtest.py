@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Backtest throughput benchmark: replaying a synthetic month of PostHog events
+against several candidate rule sets, on one worker vs one per CPU
+
+Run from the backend directory:
+    python -m benchmarks.bench_backtest
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timezone
+
+from backtest import run_backtest
+
+PAGES = ["/", "/pricing", "/pricing/enterprise", "/blog/launch", "/docs/install", "/about"]
+MONTH_SECONDS = 30 * 86400
+CANDIDATES = {
+    "strict_pricing": {"returning_user_pricing": {"when": [["visit_count", ">=", 5], ["pricing_interest", ">", 0.8]]}},
+    "loose_pricing": {"returning_user_pricing": {"when": [["visit_count", ">=", 2], ["pricing_interest", ">", 0.5]]}},
+    "long_sessions": {"content_explorer": {"when": [["avg_session_time", ">", 300], ["page_depth", ">", 8]]}},
+}
+
+
+def write_month(path: str, users: int, rng: random.Random) -> int:
+    """PostHog $pageview rows, [event, timestamp, properties, distinct_id], shuffled by time like an export"""
+    start = datetime(2024, 9, 1, tzinfo=timezone.utc).timestamp()
+    rows = []
+    for user in range(users):
+        ts = start + rng.uniform(0, MONTH_SECONDS * 0.8)
+        for session in range(rng.randint(1, 8)):
+            for _ in range(rng.randint(1, 10)):
+                properties = {"$pathname": rng.choice(PAGES), "$session_id": f"{user}-{session}",
+                              "$device_type": rng.choice(["Desktop", "Mobile"])}
+                rows.append((ts, ["$pageview", datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+                                  json.dumps(properties), f"user_{user}"]))
+                ts += rng.expovariate(1 / 60)
+            ts += rng.expovariate(1 / 86400)
+    rows.sort(key=lambda row: row[0])
+    with open(path, 'w') as f:
+        for _, row in rows:
+            f.write(json.dumps(row) + "\n")
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        events_path = os.path.join(directory, "events.ndjson")
+        candidates_path = os.path.join(directory, "candidates.json")
+        events = write_month(events_path, args.users, random.Random(8))
+        with open(candidates_path, 'w') as f:
+            json.dump(CANDIDATES, f)
+        print(f"{events:,} events from {args.users:,} users over 30 days, "
+              f"{os.path.getsize(events_path) / 1e6:.0f} MB, {len(CANDIDATES) + 1} rule sets")
+
+        print(f"{'workers':>8} {'parse s':>8} {'total s':>8} {'events/s':>10}")
+        for workers in dict.fromkeys((1, args.workers)):
+            # Small chunks so even this file is split across workers
+            report = run_backtest([events_path], candidates_path, workers=workers, chunk_bytes=4 * 1024 * 1024)
+            print(f"{workers:>8} {report['parse_seconds']:>8.1f} {report['total_seconds']:>8.1f} "
+                  f"{report['events_per_second']:>10,}")
+        rates = {name: candidate["optimization_rate"] for name, candidate in report["candidates"].items()}
+        print("optimization rate at month end: " + ", ".join(f"{name} {rate:.1%}" for name, rate in rates.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: /api/track (one event per request) vs /api/track/batch
+
+Run from the backend directory:
+    python -m benchmarks.bench_batch_ingest
+"""
+
+import argparse
+import json
+import time
+
+from app import app
+
+EVENTS = [
+    {"event": "session_start"},
+    {"event": "page_view", "page": "/pricing", "time_spent": 12},
+    {"event": "page_view", "page": "/blog/launch", "time_spent": 40},
+    {"event": "page_view", "page": "/", "time_spent": 5, "session_time": 57},
+]
+
+
+def make_events(count: int, users: int):
+    return [dict(EVENTS[i % len(EVENTS)], user_id=f"bench_{i % users}") for i in range(count)]
+
+
+def bench_single(client, events) -> float:
+    start = time.perf_counter()
+    for event in events:
+        client.set_cookie('user_id', event["user_id"])
+        client.post('/api/track', json=event)
+    return len(events) / (time.perf_counter() - start)
+
+
+def bench_batch(client, events, batch_size: int, ndjson: bool) -> float:
+    bodies = []
+    for i in range(0, len(events), batch_size):
+        chunk = events[i:i + batch_size]
+        if ndjson:
+            bodies.append("\n".join(json.dumps(e) for e in chunk))
+        else:
+            bodies.append(json.dumps(chunk))
+    content_type = 'application/x-ndjson' if ndjson else 'application/json'
+
+    start = time.perf_counter()
+    for body in bodies:
+        client.post('/api/track/batch', data=body, content_type=content_type)
+    return len(events) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=500)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    events = make_events(args.events, args.users)
+
+    print(f"{'mode':<22} {'events/sec':>12}")
+    print(f"{'/api/track':<22} {bench_single(client, events):>12,.0f}")
+    for batch_size in (1, 50, 500):
+        for ndjson in (False, True):
+            label = f"batch={batch_size} {'ndjson' if ndjson else 'json'}"
+            print(f"{label:<22} {bench_batch(client, events, batch_size, ndjson):>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
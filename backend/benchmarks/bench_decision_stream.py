@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Decision push benchmark: 10k concurrent subscribers waiting on pushed variant
+changes vs the request load of polling /api/optimize for them
+
+Run from the backend directory:
+    python -m benchmarks.bench_decision_stream
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from decision_stream import DecisionStream, KEEPALIVE_SECONDS
+from profile_events import new_profile
+from profile_store import ProfileStore
+from rule_table import compile_rules
+from variant_tracker import VariantTracker
+
+RULES = {
+    "returning_user_pricing": {"when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]], "variant": "pricing_focused"},
+    "quick_browser": {"when": [["avg_session_time", "<", 30], ["bounce_rate", ">", 0.8]], "variant": "simplified"},
+}
+STOP = {}
+
+
+def flip(profile, now):
+    """A write that toggles the user between default and pricing_focused"""
+    profile['visit_count'] = 5
+    profile['pricing_interest'] = 0.1 if profile.get('pricing_interest', 0) > 0.7 else 0.9
+    profile['pricing_interest_updated_at'] = now
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def write_cost(store, users: int, writes: int, rng: random.Random) -> float:
+    start = time.perf_counter()
+    for _ in range(writes):
+        now = time.time()
+        store.update(f"user_{rng.randrange(users)}", lambda profile: flip(profile, now), new_profile)
+    return (time.perf_counter() - start) / writes * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--writes", type=int, default=20_000)
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds between polls being replaced")
+    args = parser.parse_args()
+
+    table = compile_rules(RULES)
+    users = args.subscribers
+
+    plain = ProfileStore()
+    plain.observer = VariantTracker(table)
+    unstreamed_us = write_cost(plain, users, args.writes, random.Random(4))
+
+    store = ProfileStore()
+    tracker = store.observer = VariantTracker(table)
+    stream = tracker.listener = DecisionStream(max_subscribers=users)
+    for n in range(users):
+        store.put(f"user_{n}", new_profile())
+
+    # One blocked thread per subscriber, as one server thread per SSE connection
+    latencies = []
+    received = [0]
+    results_lock = threading.Lock()
+    subscriptions = []
+
+    def subscriber(user_id):
+        subscription = stream.subscribe(user_id)
+        ready.release()
+        subscriptions.append(subscription)
+        local = []
+        while True:
+            # Idle connections only wake for keepalives, as in sse_stream
+            event = subscription.get(KEEPALIVE_SECONDS)
+            if event is STOP:
+                break
+            if event is not None:
+                local.append(time.time() - event["decided_at"])
+        stream.unsubscribe(subscription)
+        with results_lock:
+            latencies.extend(local)
+            received[0] += len(local)
+
+    threading.stack_size(256 * 1024)
+    ready = threading.Semaphore(0)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=subscriber, args=(f"user_{n}",), daemon=True) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        ready.acquire()
+    print(f"{users:,} subscribers connected in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    pushed_us = write_cost(store, users, args.writes, random.Random(4))
+    elapsed = time.perf_counter() - start
+    time.sleep(1.0)
+    for subscription in subscriptions:
+        subscription.offer(STOP)
+    for thread in threads:
+        thread.join()
+
+    stats = stream.stats()
+    # Every write here flips a subscribed user, so each one also pays for waking that subscriber's thread
+    print(f"write path: {unstreamed_us:.1f} us/write without a stream, {pushed_us:.1f} us/write with "
+          f"{users:,} subscribers ({stats['published']:,} changes published)")
+    print(f"delivery: {received[0]:,} events received, latency p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms")
+    polls = users / args.poll_interval * elapsed
+    print(f"polling every {args.poll_interval:g}s over the same {elapsed:.1f}s: {polls:,.0f} /api/optimize requests "
+          f"for {stats['published']:,} changes ({users / args.poll_interval:,.0f} req/s)")
+
+
+if __name__ == "__main__":
+    main()
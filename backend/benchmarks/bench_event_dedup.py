@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Overhead benchmark: per-event cost, memory and false-positive rate of the
+rotating Bloom filter deduplicator vs an exact set of event IDs
+
+The exact set is several times cheaper per event, but it keeps every ID, so
+its memory grows with traffic; the Bloom filters stay at a fixed size for
+any number of IDs. Capping the bits set per ID trades filter memory for
+per-event cost, so the filter is measured at the default cap and at the
+memory-optimal number of bits.
+
+Run from the backend directory:
+    python -m benchmarks.bench_event_dedup
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+import uuid
+
+from event_dedup import EventDeduplicator
+
+
+class ExactDeduplicator:
+    """Baseline: remembers every ID forever"""
+
+    def __init__(self):
+        self.seen = set()
+
+    def filter_new(self, events, now=None):
+        kept = []
+        for event in events:
+            key = event.get('uuid')
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            kept.append(event)
+        return kept
+
+
+def make_events(count: int, retry_rate: float, rng: random.Random):
+    # Retries resend a recent event, as an SDK does after a timeout
+    events, recent = [], []
+    for _ in range(count):
+        if recent and rng.random() < retry_rate:
+            events.append(rng.choice(recent))
+        else:
+            event = {"event": "page_view", "page": "/pricing", "uuid": str(uuid.UUID(int=rng.getrandbits(128)))}
+            events.append(event)
+            recent.append(event)
+            if len(recent) > 1000:
+                recent.pop(0)
+    return events
+
+
+def run(make_dedup, events):
+    dedup = make_dedup()
+    start = time.perf_counter()
+    kept = 0
+    for i, event in enumerate(events):
+        kept += len(dedup.filter_new([event], i * 0.001))
+    per_event_us = (time.perf_counter() - start) / len(events) * 1e6
+
+    tracemalloc.start()
+    dedup = make_dedup()
+    for i, event in enumerate(events):
+        dedup.filter_new([event], i * 0.001)
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return per_event_us, memory, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=500_000)
+    parser.add_argument("--retry-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    args = parser.parse_args()
+
+    events = make_events(args.events, args.retry_rate, random.Random(1))
+    unique = len({event["uuid"] for event in events})
+
+    print(f"{unique:,} unique of {len(events):,} events")
+    print(f"{'deduplicator':<14} {'us/event':>9} {'peak MB':>8} {'kept':>9} {'false positives':>16}")
+    for name, make_dedup in (
+        ("exact set", ExactDeduplicator),
+        ("bloom", lambda: EventDeduplicator(capacity=args.events, error_rate=args.error_rate)),
+        ("bloom k=10", lambda: EventDeduplicator(capacity=args.events, error_rate=args.error_rate, max_hashes=10)),
+    ):
+        per_event_us, memory, kept = run(make_dedup, events)
+        false_positives = unique - kept
+        print(f"{name:<14} {per_event_us:>9.2f} {memory / 1e6:>8.1f} {kept:>9,} "
+              f"{false_positives:>7,} ({false_positives / unique:.4%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Out-of-order ingest benchmark: incremental watermark ordering vs rebuilding
+each profile from its sorted event history on every event
+
+Run from the backend directory:
+    python -m benchmarks.bench_event_watermark
+"""
+
+import argparse
+import random
+import time
+
+import event_watermark
+from profile_events import new_profile, apply_events
+
+PAGES = ["/", "/pricing", "/blog/launch", "/docs/install", "/about"]
+
+
+def make_stream(users: int, events_per_user: int, max_delay: float, rng: random.Random):
+    """Events are created one second apart per user and arrive after a random network delay"""
+    stream = []
+    for n in range(users):
+        for i in range(events_per_user):
+            created = 1_700_000_000 + i
+            event = {"event": "page_view", "page": rng.choice(PAGES), "timestamp": created}
+            stream.append((created + rng.uniform(0, max_delay), f"user_{n}", event))
+    stream.sort(key=lambda item: item[0])
+    return stream
+
+
+def run_watermark(stream, lateness: float):
+    event_watermark.event_watermark.lateness_seconds = lateness
+    event_watermark.event_watermark.late = 0
+    profiles = {}
+    start = time.perf_counter()
+    for arrived, user_id, event in stream:
+        profile = profiles.get(user_id)
+        if profile is None:
+            profile = profiles[user_id] = new_profile(now=arrived)
+        apply_events(profile, [event], arrived)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(stream) * 1e6, event_watermark.event_watermark.late, profiles
+
+
+def run_rebuild(stream):
+    """Baseline: keep every event and rebuild the profile in event-time order each time"""
+    event_watermark.event_watermark.lateness_seconds = 0.0
+    histories = {}
+    start = time.perf_counter()
+    for arrived, user_id, event in stream:
+        history = histories.setdefault(user_id, [])
+        history.append(event)
+        profile = new_profile(now=arrived)
+        apply_events(profile, sorted(history, key=lambda e: e["timestamp"]), arrived)
+    elapsed = time.perf_counter() - start
+    return elapsed / len(stream) * 1e6
+
+
+def in_order_ratio(profiles) -> float:
+    ordered = total = 0
+    for profile in profiles.values():
+        stamps = [view["timestamp"] for view in profile.page_views]
+        ordered += sum(1 for a, b in zip(stamps, stamps[1:]) if a <= b)
+        total += max(0, len(stamps) - 1)
+    return ordered / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--events-per-user", type=int, default=50)
+    parser.add_argument("--max-delay", type=float, default=5.0, help="maximum network delay in seconds")
+    args = parser.parse_args()
+
+    stream = make_stream(args.users, args.events_per_user, args.max_delay, random.Random(4))
+
+    print(f"{'builder':<22} {'us/event':>9} {'late events':>12} {'views in order':>15}")
+    for lateness in (0.0, args.max_delay / 2, args.max_delay):
+        per_event_us, late, profiles = run_watermark(stream, lateness)
+        print(f"{f'watermark {lateness:g}s':<22} {per_event_us:>9.1f} {late:>12,} {in_order_ratio(profiles):>15.2%}")
+    print(f"{'full rebuild':<22} {run_rebuild(stream):>9.1f} {0:>12} {1:>15.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Optimize latency benchmark: running variant generation inside the request vs
+queueing a deduplicated background job
+
+Run from the backend directory:
+    python -m benchmarks.bench_generation_jobs
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from generation_jobs import GenerationJobs
+
+
+class FakePipeline:
+    """Stands in for Morph generation plus the Freestyle deploy, with their latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.runs = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.runs += 1
+        time.sleep(self.latency)
+        return {"success": True, "status": "live"}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(mode: str, latency: float, users: int, polls: int, rng: random.Random):
+    pipeline = FakePipeline(latency)
+    jobs = GenerationJobs(num_workers=4, max_queued=polls) if mode == "background" else None
+    samples = []
+    for _ in range(polls):
+        user_id = f"user_{rng.randrange(users)}"
+        start = time.perf_counter()
+        if jobs:
+            jobs.submit(("default", user_id, "pricing_focused"), user_id, "pricing_focused", pipeline)
+        else:
+            pipeline()
+        samples.append((time.perf_counter() - start) * 1e6)
+    if jobs:
+        jobs.close(timeout=latency * polls)
+    return samples, pipeline.runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'pipeline':>9} {'mode':<11} {'p50 us':>10} {'p99 us':>12} {'pipeline runs':>14}")
+    for latency in (0.005, 0.05):
+        for mode in ("in request", "background"):
+            samples, runs = run(mode, latency, args.users, args.polls, random.Random(2))
+            print(f"{f'{latency * 1000:g} ms':>9} {mode:<11} {statistics.median(samples):>10.1f} "
+                  f"{percentile(samples, 0.99):>12.1f} {runs:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+CPU benchmark: lazily decayed interest reads vs an eager decay sweep,
+across store sizes and page-view history lengths
+
+Run from the backend directory:
+    python -m benchmarks.bench_interest_decay
+"""
+
+import argparse
+import random
+import time
+
+from interest_decay import InterestDecay
+from profile_events import new_profile, apply_event
+from profile_store import ProfileStore
+
+PAGES = ["/pricing", "/blog/post", "/docs/install", "/", "/careers"]
+
+
+def build_store(users: int, history: int, rng: random.Random, start: float) -> ProfileStore:
+    store = ProfileStore()
+    for n in range(users):
+        profile = new_profile(history_size=history)
+        for i in range(history):
+            apply_event(profile, {"event_type": "page_view", "page": rng.choice(PAGES), "time_spent": 5},
+                        now=start + i)
+        store.put(f"user_{n}", profile)
+    return store
+
+
+def lazy_reads(store: ProfileStore, decay: InterestDecay, user_ids, now: float) -> float:
+    """What /api/optimize does: decay one user's scores on read"""
+    total = 0.0
+    for user_id in user_ids:
+        total += store.read(user_id, lambda p: decay.value(p, 'pricing_interest', now))
+    return total
+
+
+def eager_sweep(store: ProfileStore, decay: InterestDecay, now: float) -> None:
+    """The alternative: a periodic job rewriting every stored score"""
+    def step(profile):
+        for field in decay.half_lives:
+            profile[field] = decay.value(profile, field, now)
+            profile[f"{field}_updated_at"] = now
+    for user_id in store.user_ids():
+        store.update(user_id, step)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--history", type=int, nargs="+", default=[1, 100])
+    parser.add_argument("--reads", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    decay = InterestDecay()
+    start = time.time() - 86_400
+    now = time.time()
+
+    print(f"{'users':>8} {'history':>8} {'lazy read us':>13} {'eager sweep ms':>15}")
+    for users in args.users:
+        for history in args.history:
+            store = build_store(users, history, rng, start)
+            user_ids = [f"user_{rng.randrange(users)}" for _ in range(args.reads)]
+
+            t0 = time.perf_counter()
+            lazy_reads(store, decay, user_ids, now)
+            lazy_us = (time.perf_counter() - t0) / args.reads * 1e6
+
+            t0 = time.perf_counter()
+            eager_sweep(store, decay, now)
+            sweep_ms = (time.perf_counter() - t0) * 1000
+
+            print(f"{users:>8} {history:>8} {lazy_us:>13.2f} {sweep_ms:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Polling benchmark: /api/optimize decisions recomputed on every poll vs
+memoized per profile version
+
+Run from the backend directory:
+    python -m benchmarks.bench_optimize_cache
+"""
+
+import argparse
+import json
+import random
+import time
+
+from interest_decay import interest_decay
+from optimize_cache import OptimizeCache
+from profile_events import new_profile, apply_events, current_view
+from profile_store import ProfileStore
+from rule_table import compile_rules
+from variant_tracker import decaying_conditions, decision_expires_at
+
+RULES = {
+    "returning_user_pricing": {"when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]], "variant": "pricing_focused"},
+    "content_explorer": {"when": [["avg_session_time", ">", 120], ["page_depth", ">", 5]], "variant": "content_heavy"},
+    "quick_browser": {"when": [["avg_session_time", "<", 30], ["bounce_rate", ">", 0.8]], "variant": "simplified"},
+}
+PAGES = ["/", "/pricing", "/blog/launch", "/docs/install"]
+
+
+def optimize(store, rules, user_id, now):
+    """The uncached work of one poll: copy, bring up to date, decide, serialize"""
+    profile = current_view(store.get(user_id), now)
+    rule = rules.decide(profile)
+    body = json.dumps({
+        "variant": rule.variant if rule else "default",
+        "reason": rule.reason if rule else "No specific optimization patterns detected",
+        "user_profile": {field: profile[field] for field in ("visit_count", "pricing_interest", "avg_session_time")}
+    }).encode()
+    return profile, body
+
+
+def run(store, rules, users, polls, writes_per_poll, cache, rng):
+    decaying = decaying_conditions(rules, interest_decay)
+    now = 1_700_000_000.0
+    # Each user polls about every two seconds
+    step = 2.0 / users
+    start = time.perf_counter()
+    for _ in range(polls):
+        now += step
+        if rng.random() < writes_per_poll:
+            event = {"event": "page_view", "page": rng.choice(PAGES)}
+            store.update(f"user_{rng.randrange(users)}", lambda p: apply_events(p, [event], now))
+        user_id = f"user_{rng.randrange(users)}"
+        if cache:
+            version = store.read(user_id, lambda profile: profile.version)
+            if cache.get(user_id, version, now) is not None:
+                continue
+        profile, body = optimize(store, rules, user_id, now)
+        if cache:
+            cache.put(user_id, profile.version, body, now, decision_expires_at(decaying, profile, now))
+    return (time.perf_counter() - start) / polls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--polls", type=int, default=200_000)
+    parser.add_argument("--history", type=int, default=50, help="page views per profile")
+    args = parser.parse_args()
+
+    rules = compile_rules(RULES)
+    store = ProfileStore()
+    rng = random.Random(5)
+    for n in range(args.users):
+        events = [{"event": "page_view", "page": rng.choice(PAGES)} for _ in range(args.history)]
+        store.update(f"user_{n}", lambda p: apply_events(p, events, 1_700_000_000.0),
+                     lambda: new_profile(now=1_700_000_000.0))
+
+    print(f"{'writes/poll':>11} {'uncached us':>12} {'cached us':>10} {'hit rate':>9}")
+    for writes_per_poll in (0.0, 0.1, 0.5):
+        uncached = run(store, rules, args.users, args.polls, writes_per_poll, None, random.Random(1))
+        cache = OptimizeCache(ttl_seconds=30.0)
+        cached = run(store, rules, args.users, args.polls, writes_per_poll, cache, random.Random(1))
+        print(f"{writes_per_poll:>11.1f} {uncached:>12.1f} {cached:>10.1f} {cache.stats()['hit_rate']:>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
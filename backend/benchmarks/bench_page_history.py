@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: legacy list-of-dicts page views vs PageViewHistory
+
+Run from the backend directory:
+    python -m benchmarks.bench_page_history
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+
+from page_history import PageViewHistory, page_interner
+
+PAGES = ["/", "/pricing", "/about", "/blog/launch-week", "/docs/getting-started", "/careers"]
+
+
+def fresh(text: str) -> str:
+    # Request payloads are parsed per event, so each page string is a new object
+    return "".join(list(text))
+
+
+def legacy_views(count: int):
+    views = []
+    for i in range(count):
+        views.append({
+            'page': fresh(PAGES[i % len(PAGES)]),
+            'timestamp': datetime.now().isoformat(),
+            'time_spent': i % 90
+        })
+    return views
+
+
+def compact_views(count: int, capacity: int):
+    history = PageViewHistory(capacity)
+    now = time.time()
+    for i in range(count):
+        history.append(fresh(PAGES[i % len(PAGES)]), now + i, i % 90)
+    return history
+
+
+def measure(build, users: int) -> float:
+    """Return bytes retained per user by ``users`` objects from ``build``"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [build() for _ in range(users)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (after - before) / users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--capacity", type=int, default=100, help="ring size for PageViewHistory")
+    args = parser.parse_args()
+
+    # Warm the interner so shared page strings are not charged to the first user
+    for page in PAGES:
+        page_interner.intern(page)
+
+    print(f"{'page views':>10} {'legacy B/user':>15} {'compact B/user':>16} {'ratio':>8}")
+    for views, users in ((10, 2000), (1_000, 20), (100_000, 1)):
+        legacy = measure(lambda: legacy_views(views), users)
+        compact = measure(lambda: compact_views(views, args.capacity), users)
+        print(f"{views:>10,} {legacy:>15,.0f} {compact:>16,.0f} {legacy / compact:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
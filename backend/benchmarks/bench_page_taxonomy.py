@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+CPU benchmark: per-URL substring scans vs the compiled PageTaxonomy matcher
+when summarizing 1,000-event PostHog responses
+
+Run from the backend directory:
+    python -m benchmarks.bench_page_taxonomy
+"""
+
+import argparse
+import random
+import time
+
+from page_taxonomy import PageTaxonomy
+
+PATHS = ["/", "/pricing", "/pricing/enterprise", "/about", "/blog/{}", "/docs/{}/install",
+         "/careers", "/customers/{}", "/changelog", "/product/price-calculator"]
+
+
+def make_response(rng: random.Random, distinct_urls: int, events: int = 1000):
+    urls = [f"https://www.example.com{rng.choice(PATHS).format(n)}?utm_source=ad{n % 7}" for n in range(distinct_urls)]
+    return [["$pageview", "2024-01-15T10:30:00Z", {"$current_url": rng.choice(urls)}] for _ in range(events)]
+
+
+def summarize_legacy(events):
+    pricing = content = 0
+    for event in events:
+        current_url = event[2].get('$current_url', '')
+        if 'pricing' in current_url.lower() or 'price' in current_url.lower():
+            pricing += 1
+        if 'about' in current_url.lower() or 'blog' in current_url.lower() or 'docs' in current_url.lower():
+            content += 1
+    return pricing, content
+
+
+def summarize_taxonomy(events, taxonomy: PageTaxonomy):
+    pricing = content = 0
+    for event in events:
+        categories = taxonomy.categories(event[2].get('$current_url', ''))
+        if 'pricing' in categories:
+            pricing += 1
+        if 'content' in categories:
+            content += 1
+    return pricing, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=200)
+    parser.add_argument("--distinct-urls", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    responses = [make_response(rng, args.distinct_urls) for _ in range(args.responses)]
+    taxonomy = PageTaxonomy()
+
+    start = time.perf_counter()
+    legacy = [summarize_legacy(r) for r in responses]
+    legacy_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [summarize_taxonomy(r, taxonomy) for r in responses]
+    compiled_s = time.perf_counter() - start
+
+    assert legacy == compiled, "taxonomy disagrees with the substring scan"
+    per_response = lambda seconds: seconds / len(responses) * 1e3
+    print(f"substring scans: {per_response(legacy_s):.3f} ms per 1,000-event response")
+    print(f"page taxonomy:   {per_response(compiled_s):.3f} ms per 1,000-event response "
+          f"({legacy_s / compiled_s:.1f}x, {taxonomy.cache_info()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Recovery-time and ingest benchmark for the event log + snapshot persistence
+
+Run from the backend directory:
+    python -m benchmarks.bench_persistence --users 1000000
+"""
+
+import argparse
+import gc
+import shutil
+import tempfile
+import time
+
+from profile_events import new_profile, apply_events
+from profile_persistence import ProfilePersistence, FSYNC_POLICIES
+from profile_store import ProfileStore
+
+EVENTS = [
+    {"event": "session_start"},
+    {"event": "page_view", "page": "/pricing", "time_spent": 12},
+    {"event": "page_view", "page": "/blog/launch", "time_spent": 40, "session_time": 52},
+]
+
+
+def logged_ingest(persistence: ProfilePersistence, store: ProfileStore, count: int, users: int) -> float:
+    """Apply ``count`` single-event updates through the log and return events/sec"""
+    start = time.perf_counter()
+    for i in range(count):
+        user_id = f"user_{i % users}"
+        events = [EVENTS[i % len(EVENTS)]]
+        now = time.time()
+
+        def mutate(profile, user_id=user_id, events=events, now=now):
+            persistence.log_events(user_id, events, now)
+            apply_events(profile, events, now)
+
+        store.update(user_id, mutate, factory=new_profile)
+    return count / (time.perf_counter() - start)
+
+
+def bench_fsync(count: int):
+    print(f"{'fsync policy':<14} {'events/sec':>12}")
+    for policy in FSYNC_POLICIES:
+        directory = tempfile.mkdtemp(prefix="wal-bench-")
+        try:
+            store = ProfileStore()
+            persistence = ProfilePersistence(store, directory, fsync_policy=policy, snapshot_interval=0)
+            persistence.recover()
+            persistence.start()
+            n = count // 20 if policy == 'always' else count
+            rate = logged_ingest(persistence, store, n, 1000)
+            persistence.close()
+            print(f"{policy:<14} {rate:>12,.0f}")
+        finally:
+            shutil.rmtree(directory)
+
+
+def bench_recovery(users: int, tail: int):
+    directory = tempfile.mkdtemp(prefix="wal-bench-")
+    try:
+        store = ProfileStore()
+        persistence = ProfilePersistence(store, directory, fsync_policy='never', snapshot_interval=0)
+        persistence.recover()
+        persistence.start()
+
+        started = time.perf_counter()
+        for i in range(users):
+            profile = new_profile()
+            apply_events(profile, EVENTS)
+            store.put(f"user_{i}", profile)
+        print(f"built {users:,} profiles in {time.perf_counter() - started:.1f}s")
+
+        info = persistence.snapshot()
+        print(f"snapshot: {info['bytes'] / 1e6:,.1f} MB in {info['seconds']:.1f}s")
+
+        rate = logged_ingest(persistence, store, tail, users)
+        print(f"log tail: {tail:,} events at {rate:,.0f} events/sec")
+        persistence.close()
+
+        del store, persistence
+        gc.collect()
+
+        restored = ProfileStore()
+        result = ProfilePersistence(restored, directory, snapshot_interval=0).recover()
+        total = result['snapshot_load_seconds'] + result['replay_seconds']
+        print(f"recovery: {result['users']:,} users, snapshot load {result['snapshot_load_seconds']:.1f}s, "
+              f"replayed {result['replayed_records']:,} records in {result['replay_seconds']:.1f}s, "
+              f"total {total:.1f}s")
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--tail", type=int, default=100_000, help="events logged after the snapshot")
+    parser.add_argument("--fsync-events", type=int, default=50_000)
+    args = parser.parse_args()
+
+    bench_fsync(args.fsync_events)
+    print()
+    bench_recovery(args.users, args.tail)
+
+
+if __name__ == "__main__":
+    main()
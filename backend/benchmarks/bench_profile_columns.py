@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Column analytics benchmark: percentiles, histograms and cross-tabs over NumPy
+column snapshots vs a per-profile Python pass, plus the cost of materializing
+
+Run from the backend directory:
+    python -m benchmarks.bench_profile_columns
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from profile_columns import ColumnSnapshot, NUMERIC_COLUMNS, materialize
+from profile_events import new_profile, apply_events
+from profile_store import ProfileStore
+from rule_table import compile_rules
+from user_agents import DEVICE_TYPES
+
+RULES = {
+    "returning_user_pricing": {"when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]], "variant": "pricing_focused"},
+    "content_explorer": {"when": [["avg_session_time", ">", 120], ["page_depth", ">", 5]], "variant": "content_heavy"},
+    "quick_browser": {"when": [["avg_session_time", "<", 30], ["bounce_rate", ">", 0.8]], "variant": "simplified"},
+}
+PAGES = ["/", "/pricing", "/pricing/enterprise", "/blog/launch", "/docs/install"]
+
+
+def synthetic_snapshot(size: int, table, rng: np.random.Generator) -> ColumnSnapshot:
+    """Columns shaped like materialize() output, generated directly so 10M rows fit in memory"""
+    numeric = {
+        'visit_count': rng.integers(1, 40, size).astype(np.float64),
+        'avg_session_time': rng.exponential(90, size),
+        'page_depth': rng.integers(1, 30, size).astype(np.float64),
+        'pricing_interest': rng.random(size),
+        'content_interest': rng.random(size),
+        'bounce_rate': rng.random(size),
+    }
+    decisions = table.decide_batch(numeric, size)
+    categories = {
+        'device_type': (rng.integers(0, len(DEVICE_TYPES), size).astype(np.int8), DEVICE_TYPES),
+        'variant': ((decisions + 1).astype(np.int8), table.variants),
+    }
+    return ColumnSnapshot(numeric, categories, size, time.time())
+
+
+def vectorized(snapshot: ColumnSnapshot, bins: int):
+    for field in NUMERIC_COLUMNS:
+        snapshot.percentiles(field)
+        snapshot.histogram(field, bins)
+    snapshot.crosstab('variant', 'device_type', bins)
+    snapshot.crosstab('variant', 'avg_session_time', bins)
+
+
+def python_pass(rows, bins: int):
+    """The same statistics computed the way a per-profile loop would"""
+    for field in NUMERIC_COLUMNS:
+        values = sorted(row[field] for row in rows)
+        [values[min(len(values) - 1, int(q / 100 * len(values)))] for q in (50, 90, 95, 99)]
+        low, high = values[0], values[-1]
+        width = (high - low) / bins or 1
+        counts = [0] * bins
+        for value in values:
+            counts[min(bins - 1, int((value - low) / width))] += 1
+    for column in ('device_type', 'avg_session_time'):
+        cells = {}
+        for row in rows:
+            key = (row['variant'], row[column] if column == 'device_type' else int(row[column] // 60))
+            cells[key] = cells.get(key, 0) + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000000,10000000", help="comma-separated snapshot sizes")
+    parser.add_argument("--python-max", type=int, default=1_000_000, help="largest size to run the Python pass at")
+    parser.add_argument("--store-users", type=int, default=100_000, help="profiles to materialize from a real store")
+    parser.add_argument("--bins", type=int, default=10)
+    args = parser.parse_args()
+
+    table = compile_rules(RULES)
+    print(f"{'profiles':>11} {'columns ms':>11} {'python ms':>11} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        snapshot = synthetic_snapshot(size, table, np.random.default_rng(5))
+        start = time.perf_counter()
+        vectorized(snapshot, args.bins)
+        columns_ms = (time.perf_counter() - start) * 1000
+
+        python_ms = None
+        if size <= args.python_max:
+            labels = [snapshot.categories[name][1] for name in ('device_type', 'variant')]
+            rows = [
+                {**{field: float(snapshot.numeric[field][i]) for field in NUMERIC_COLUMNS},
+                 'device_type': labels[0][snapshot.categories['device_type'][0][i]],
+                 'variant': labels[1][snapshot.categories['variant'][0][i]]}
+                for i in range(size)
+            ]
+            start = time.perf_counter()
+            python_pass(rows, args.bins)
+            python_ms = (time.perf_counter() - start) * 1000
+            del rows
+        print(f"{size:>11,} {columns_ms:>11.1f} "
+              f"{f'{python_ms:.1f}' if python_ms else 'skipped':>11} "
+              f"{f'{python_ms / columns_ms:.0f}x' if python_ms else '-':>8}")
+        del snapshot
+
+    # Materializing is the periodic background cost that buys the fast reads
+    store = ProfileStore()
+    rng = random.Random(5)
+    now = 1_700_000_000.0
+    for n in range(args.store_users):
+        events = [{"event": "page_view", "page": rng.choice(PAGES), "session_time": rng.choice([5, 60, 200])}
+                  for _ in range(rng.randint(1, 4))]
+        profile = new_profile(now=now)
+        apply_events(profile, events, now)
+        store.put(f"user_{n}", profile)
+    snapshot = materialize(store, table, now + 3600)
+    print(f"materialize: {snapshot.size:,} profiles in {snapshot.build_seconds * 1000:.0f} ms "
+          f"({snapshot.build_seconds / max(1, snapshot.size) * 1e6:.2f} us/profile)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Export memory benchmark: one JSON body built over every profile vs streaming
+NDJSON pages, peak allocation as the number of users grows
+
+Run from the backend directory:
+    python -m benchmarks.bench_profile_export
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from profile_events import new_profile, apply_events, serialize_profile
+from profile_export import ExportFilter, export_profiles
+from profile_store import ProfileStore
+from rule_table import compile_rules
+
+RULES = {
+    "returning_user_pricing": {"when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]], "variant": "pricing_focused"},
+}
+PAGES = ["/", "/pricing", "/pricing/enterprise", "/blog/launch", "/docs/install"]
+
+
+def build_store(users: int, rng: random.Random) -> ProfileStore:
+    store = ProfileStore()
+    now = time.time()
+    for n in range(users):
+        profile = new_profile(now=now)
+        apply_events(profile, [{"event": "page_view", "page": rng.choice(PAGES), "session_time": rng.choice([5, 60, 200])}
+                               for _ in range(rng.randint(1, 6))], now)
+        store.put(f"user_{n}", profile)
+    return store
+
+
+def bulk(store) -> int:
+    """What a single jsonify over user_data would do"""
+    body = json.dumps({user_id: serialize_profile(profile) for user_id, profile in store.items()}, default=str)
+    return len(body)
+
+
+def streamed(store, rules) -> int:
+    return sum(len(line) for line in export_profiles(store, ExportFilter(rules)))
+
+
+def measure(fn, *args):
+    # Timed untraced: tracemalloc slows every allocation, and streaming makes many small ones
+    start = time.perf_counter()
+    size = fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="10000,50000,100000", help="comma-separated user counts")
+    args = parser.parse_args()
+
+    rules = compile_rules(RULES)
+    print(f"{'users':>9} {'mode':<9} {'bytes out':>12} {'seconds':>8} {'peak MB':>8}")
+    for users in (int(s) for s in args.sizes.split(',')):
+        store = build_store(users, random.Random(9))
+        for mode, fn, extra in (("bulk", bulk, ()), ("streamed", streamed, (rules,))):
+            size, elapsed, peak = measure(fn, store, *extra)
+            print(f"{users:>9,} {mode:<9} {size:>12,} {elapsed:>8.2f} {peak / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: bytes per profile and process RSS for dict profiles vs
+slotted UserProfile objects
+
+Each variant runs in its own interpreter so RSS numbers do not mix.
+
+Run from the backend directory:
+    python -m benchmarks.bench_profile_memory
+"""
+
+import argparse
+import gc
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from profile_events import new_profile, apply_events
+
+EVENTS = [
+    {"event": "session_start", "device_type": "mobile", "os": "iOS", "browser": "Safari"},
+    {"event": "page_view", "page": "/pricing", "time_spent": 12},
+    {"event": "page_view", "page": "/blog/launch", "time_spent": 40, "session_time": 52},
+]
+
+
+def build(count: int, variant: str, history_size: int):
+    now = time.time()
+    profiles = {}
+    for i in range(count):
+        profile = new_profile(history_size, now)
+        apply_events(profile, EVENTS, now)
+        # The dict variant holds the very same values, only in a dict
+        profiles[f"user_{i}"] = profile.to_dict() if variant == "dict" else profile
+    return profiles
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1e6
+
+
+def measure(count: int, variant: str, history_size: int) -> None:
+    # RSS first, without tracemalloc's own bookkeeping inflating it
+    baseline = rss_mb()
+    profiles = build(count, variant, history_size)
+    gc.collect()
+    rss_growth = rss_mb() - baseline
+    del profiles
+    gc.collect()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    profiles = build(count, variant, history_size)
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{variant:<12} {count:>10,} {(after - before) / count:>12.0f} {rss_growth:>10.0f} {rss_mb():>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", type=int, default=1_000_000)
+    parser.add_argument("--history-size", type=int, default=100)
+    parser.add_argument("--variant", choices=("dict", "UserProfile"), help="run one variant in this process")
+    args = parser.parse_args()
+
+    if args.variant:
+        measure(args.profiles, args.variant, args.history_size)
+        return
+
+    print(f"{'variant':<12} {'profiles':>10} {'bytes/prof':>12} {'+RSS MB':>10} {'RSS MB':>10}")
+    for variant in ("dict", "UserProfile"):
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_profile_memory",
+                        "--profiles", str(args.profiles), "--history-size", str(args.history_size),
+                        "--variant", variant], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Contention benchmark for the striped profile store behind /api/track
+
+Updates are pure Python, so under the GIL total throughput stays roughly
+flat as threads are added whichever lock layout is used. What striping
+changes is how long an update waits for its lock while other threads hold
+it, so the p99 update latency is reported next to throughput.
+
+Run from the backend directory:
+    python -m benchmarks.bench_profile_store
+"""
+
+import argparse
+import threading
+import time
+from typing import List, Tuple
+
+from profile_events import new_profile, apply_event
+from profile_store import ProfileStore
+
+EVENTS = [
+    {"event": "session_start"},
+    {"event": "page_view", "page": "/pricing", "time_spent": 12},
+    {"event": "page_view", "page": "/blog/launch", "time_spent": 40},
+    {"event": "page_view", "page": "/", "time_spent": 5, "session_time": 57},
+]
+# Timing every update would add its own overhead; one in this many is timed
+SAMPLE_EVERY = 16
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(store: ProfileStore, threads: int, events_per_thread: int, users: int) -> Tuple[float, float]:
+    """Ingest events from ``threads`` workers; returns (events/sec, p99 update latency in us)"""
+    barrier = threading.Barrier(threads + 1)
+    latencies: List[float] = []
+
+    def worker(worker_id: int):
+        local = []
+        barrier.wait()
+        for i in range(events_per_thread):
+            user_id = f"user_{(worker_id * 7919 + i) % users}"
+            event = EVENTS[i % len(EVENTS)]
+            if i % SAMPLE_EVERY:
+                store.update(user_id, lambda profile: apply_event(profile, event), factory=new_profile)
+            else:
+                start = time.perf_counter()
+                store.update(user_id, lambda profile: apply_event(profile, event), factory=new_profile)
+                local.append(time.perf_counter() - start)
+        latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+
+    # Every session_start must be accounted for - lost updates show up here
+    expected = threads * sum(1 for i in range(events_per_thread) if i % len(EVENTS) == 0)
+    counted = sum(profile["visit_count"] for _, profile in store.items())
+    assert counted == expected, f"lost updates: expected {expected} visits, counted {counted}"
+
+    return threads * events_per_thread / elapsed, percentile(latencies, 0.99) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200_000, help="total events per run")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--stripes", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'global lock ev/s':>18} {'striped ev/s':>14} {'global p99 us':>14} {'striped p99 us':>15}")
+    for threads in (1, 8, 32):
+        per_thread = args.events // threads
+        single, single_p99 = run(ProfileStore(num_stripes=1), threads, per_thread, args.users)
+        striped, striped_p99 = run(ProfileStore(num_stripes=args.stripes), threads, per_thread, args.users)
+        print(f"{threads:>8} {single:>18,.0f} {striped:>14,.0f} {single_p99:>14,.0f} {striped_p99:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Overhead benchmark: per-event cost and memory of the count-min rate limiter
+vs an exact per-key deque of timestamps
+
+The deque is faster per event, but its memory grows with every distinct key
+it sees, and keys are client-controlled; the sketch's memory is fixed.
+
+Run from the backend directory:
+    python -m benchmarks.bench_rate_limiter
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import deque
+
+from rate_limiter import IngestRateLimiter
+
+
+class ExactLimiter:
+    """Baseline: exact sliding window, memory grows with every visitor"""
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.events = {}
+
+    def admit(self, user_id: str, ip, count: int = 1, now: float = None) -> int:
+        window = self.events.setdefault(user_id, deque())
+        while window and window[0] <= now - self.window_seconds:
+            window.popleft()
+        allowed = min(count, max(0, self.limit - len(window)))
+        window.extend([now] * allowed)
+        return allowed
+
+
+def make_traffic(events: int, users: int, rng: random.Random):
+    # Mostly ordinary visitors, plus a handful of bots sending a fifth of the traffic
+    bots = [f"bot_{n}" for n in range(5)]
+    traffic = []
+    for i in range(events):
+        user = rng.choice(bots) if rng.random() < 0.2 else f"user_{rng.randrange(users)}"
+        traffic.append((user, f"10.0.{i % 250}.{i % 7}", i * 0.001))
+    return traffic
+
+
+def run(make_limiter, traffic):
+    limiter = make_limiter()
+    start = time.perf_counter()
+    dropped = 0
+    for user, ip, now in traffic:
+        if not limiter.admit(user, ip, 1, now):
+            dropped += 1
+    per_event_us = (time.perf_counter() - start) / len(traffic) * 1e6
+
+    # Memory is measured on a second pass, since tracing slows every allocation
+    tracemalloc.start()
+    limiter = make_limiter()
+    for user, ip, now in traffic:
+        limiter.admit(user, ip, 1, now)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return per_event_us, peak, dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 100_000])
+    parser.add_argument("--limit", type=int, default=600)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    print(f"{'limiter':<14} {'users':>8} {'us/event':>9} {'peak MB':>8} {'dropped':>9}")
+    for users in args.users:
+        traffic = make_traffic(args.events, users, rng)
+        for name, make_limiter in (
+            ("exact deque", lambda: ExactLimiter(args.limit, 60)),
+            ("count-min", lambda: IngestRateLimiter(args.limit, window_seconds=60)),
+            ("count-min+ip", lambda: IngestRateLimiter(args.limit, ip_limit=args.limit * 10, window_seconds=60)),
+        ):
+            per_event_us, peak, dropped = run(make_limiter, traffic)
+            print(f"{name:<14} {users:>8} {per_event_us:>9.2f} {peak / 1e6:>8.1f} {dropped:>9}")
+
+
+if __name__ == "__main__":
+    main()
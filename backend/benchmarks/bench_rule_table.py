@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Rule evaluation benchmark: first-match lambdas vs the compiled decision
+table, per profile and vectorized over NumPy columns
+
+Run from the backend directory:
+    python -m benchmarks.bench_rule_table
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from rule_table import compile_rules
+
+# Same rules as app.OPTIMIZATION_RULES, in both forms
+RULES = {
+    "returning_user_pricing": {
+        "when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]],
+        "variant": "pricing_focused",
+    },
+    "content_explorer": {
+        "when": [["avg_session_time", ">", 120], ["page_depth", ">", 5]],
+        "variant": "content_heavy",
+    },
+    "quick_browser": {
+        "when": [["avg_session_time", "<", 30], ["bounce_rate", ">", 0.8]],
+        "variant": "simplified",
+    },
+}
+LAMBDA_RULES = [
+    (lambda data: data.get("visit_count", 0) >= 3 and data.get("pricing_interest", 0) > 0.7, "pricing_focused"),
+    (lambda data: data.get("avg_session_time", 0) > 120 and data.get("page_depth", 0) > 5, "content_heavy"),
+    (lambda data: data.get("avg_session_time", 0) < 30 and data.get("bounce_rate", 0) > 0.8, "simplified"),
+]
+
+
+def make_profiles(count: int, rng: random.Random):
+    # Values cluster on the thresholds so boundary comparisons are exercised
+    return [{
+        "visit_count": rng.choice([0, 1, 2, 3, 4, 10]),
+        "pricing_interest": rng.choice([0.0, 0.5, 0.7, 0.70001, 0.9, 1.0]),
+        "avg_session_time": rng.choice([0.0, 29.9, 30, 60, 120, 120.5, 300]),
+        "page_depth": rng.choice([0, 1, 5, 6, 12]),
+        "bounce_rate": rng.choice([0.0, 0.5, 0.8, 0.81, 1.0]),
+    } for _ in range(count)]
+
+
+def lambda_decide(profile):
+    for trigger, variant in LAMBDA_RULES:
+        if trigger(profile):
+            return variant
+    return "default"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    profiles = make_profiles(args.profiles, random.Random(7))
+    table = compile_rules(RULES)
+
+    start = time.perf_counter()
+    expected = [lambda_decide(profile) for profile in profiles]
+    lambda_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [(rule.variant if rule else "default") for rule in map(table.decide, profiles)]
+    compiled_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columns, size = table.columns(profiles)
+    columns_s = time.perf_counter() - start
+    start = time.perf_counter()
+    decisions = table.decide_batch(columns, size)
+    batch_s = time.perf_counter() - start
+
+    names = np.array(["default"] + [rule.variant for rule in table.rules])
+    batch = names[decisions + 1]
+    assert compiled == expected, "compiled table disagrees with the lambdas"
+    assert (batch == np.array(expected)).all(), "batch evaluation disagrees with the lambdas"
+
+    print(f"{args.profiles:,} profiles, decisions identical across all paths")
+    print(f"{'path':<28} {'seconds':>8} {'ns/profile':>11}")
+    for name, seconds in (
+        ("lambdas", lambda_s),
+        ("decision table, per profile", compiled_s),
+        ("columns from profiles", columns_s),
+        ("decision table, batch", batch_s),
+    ):
+        print(f"{name:<28} {seconds:>8.3f} {seconds / args.profiles * 1e9:>11.0f}")
+    print(f"variant counts: {table.variant_counts(decisions)}")
+
+
+if __name__ == "__main__":
+    main()
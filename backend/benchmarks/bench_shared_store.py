@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Multi-process benchmark for SharedProfileStore (one mmap'd file, N workers)
+
+Run from the backend directory:
+    python -m benchmarks.bench_shared_store
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from profile_events import new_profile, apply_event
+from shared_profile_store import SharedProfileStore
+
+EVENTS = [
+    {"event": "session_start"},
+    {"event": "page_view", "page": "/pricing", "time_spent": 12},
+    {"event": "page_view", "page": "/", "time_spent": 5, "session_time": 17},
+]
+
+
+def worker(path: str, worker_id: int, events: int, users: int):
+    # Each process opens the file on its own, like separate gunicorn workers
+    store = SharedProfileStore(path)
+    for i in range(events):
+        event = EVENTS[i % len(EVENTS)]
+        store.update(f"user_{(worker_id * 31 + i) % users}",
+                     lambda profile: apply_event(profile, event),
+                     factory=new_profile)
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=60_000, help="events per run, split across processes")
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--capacity", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{'processes':>9} {'events/sec':>12} {'lost updates':>13}")
+    for processes in (1, 2, 4, 8):
+        fd, path = tempfile.mkstemp(prefix="shared-profiles-")
+        os.close(fd)
+        os.unlink(path)
+        try:
+            SharedProfileStore(path, capacity=args.capacity).close()
+            per_process = args.events // processes
+            procs = [multiprocessing.Process(target=worker, args=(path, n, per_process, args.users))
+                     for n in range(processes)]
+            start = time.perf_counter()
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            rate = processes * per_process / (time.perf_counter() - start)
+
+            store = SharedProfileStore(path)
+            expected_visits = processes * sum(1 for i in range(per_process) if i % len(EVENTS) == 0)
+            expected_views = processes * sum(1 for i in range(per_process) if i % len(EVENTS) != 0)
+            visits = sum(p["visit_count"] for _, p in store.items())
+            views = sum(p["page_depth"] for _, p in store.items())
+            store.close()
+            print(f"{processes:>9} {rate:>12,.0f} {expected_visits - visits + expected_views - views:>13}")
+        finally:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Isolation benchmark: one shared profile store vs per-site partitions when a
+large site shares the backend with a small one
+
+Reports the small site's profile survival under memory pressure and the cost
+of its analytics scan. The hot quota counts profiles across the whole store,
+so a partition sized to the small site keeps every one of its users while the
+big site's traffic can only evict the big site's own profiles.
+
+Run from the backend directory:
+    python -m benchmarks.bench_tenants
+"""
+
+import argparse
+import random
+import time
+
+from profile_events import new_profile, apply_event
+from tiered_profile_store import TieredProfileStore
+
+EVENT = {"event": "page_view", "page": "/pricing", "time_spent": 10}
+
+
+def track(store, user_id):
+    store.update(user_id, lambda p: apply_event(p, EVENT), factory=new_profile)
+
+
+def analytics_scan(store, prefix=None) -> float:
+    start = time.perf_counter()
+    count = 0
+    for user_id, profile in store.items():
+        if prefix is None or user_id.startswith(prefix):
+            count += profile["page_depth"] > 1
+    return (time.perf_counter() - start) * 1000
+
+
+def run(partitioned: bool, big_users: int, small_users: int, quota: int, events: int, rng: random.Random):
+    if partitioned:
+        # The small site's quota is its own; the big site can only evict itself
+        stores = {"big": TieredProfileStore(quota - small_users), "small": TieredProfileStore(small_users)}
+    else:
+        shared = TieredProfileStore(quota)
+        stores = {"big": shared, "small": shared}
+
+    for _ in range(events):
+        if rng.random() < 0.95:
+            track(stores["big"], f"big/{rng.randrange(big_users)}")
+        else:
+            track(stores["small"], f"small/{rng.randrange(small_users)}")
+
+    small = stores["small"]
+    survived = sum(1 for n in range(small_users) if f"small/{n}" in small)
+    scan_ms = analytics_scan(small) if partitioned else analytics_scan(small, "small/")
+    return survived, scan_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--big-users", type=int, default=200_000)
+    parser.add_argument("--small-users", type=int, default=2_000)
+    parser.add_argument("--quota", type=int, default=50_000, help="total profiles kept in memory")
+    parser.add_argument("--events", type=int, default=400_000)
+    args = parser.parse_args()
+
+    print(f"{'layout':<12} {'small-site profiles kept':>25} {'small-site analytics ms':>24}")
+    for partitioned in (False, True):
+        survived, scan_ms = run(partitioned, args.big_users, args.small_users, args.quota, args.events, random.Random(9))
+        label = "partitioned" if partitioned else "shared"
+        print(f"{label:<12} {survived:>17,} / {args.small_users:<5,} {scan_ms:>24.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Latency benchmark for TieredProfileStore with 10x more users than fit in memory
+
+Run from the backend directory:
+    python -m benchmarks.bench_tiered_store
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from profile_events import new_profile, apply_event
+from profile_store import ProfileStore
+from tiered_profile_store import TieredProfileStore
+
+EVENT = {"event": "page_view", "page": "/pricing", "time_spent": 12}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def user_sequence(users: int, ops: int, distribution: str):
+    rng = random.Random(42)
+    if distribution == 'uniform':
+        return [rng.randrange(users) for _ in range(ops)]
+    # Zipf-like: a small set of returning visitors produces most of the traffic
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(users)]
+    return rng.choices(range(users), weights=weights, k=ops)
+
+
+def run(store, users: int, ops: int, distribution: str):
+    for i in range(users):
+        store.update(f"user_{i}", lambda p: apply_event(p, EVENT), factory=new_profile)
+    warm = store.stats() if hasattr(store, 'stats') else None
+
+    latencies = []
+    for n, index in enumerate(user_sequence(users, ops, distribution)):
+        user_id = f"user_{index}"
+        start = time.perf_counter()
+        if n % 2:
+            store.update(user_id, lambda p: apply_event(p, EVENT), factory=new_profile)  # /api/track
+        else:
+            store.get(user_id)  # /api/optimize
+        latencies.append((time.perf_counter() - start) * 1e6)
+
+    if warm is None:
+        return latencies, None
+    stats = store.stats()
+    hits = stats['hits'] - warm['hits']
+    return latencies, hits / (hits + stats['misses'] - warm['misses'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--hot", type=int, default=10_000, help="profiles that fit in memory")
+    parser.add_argument("--ratio", type=int, default=10, help="total users as a multiple of --hot")
+    parser.add_argument("--ops", type=int, default=100_000)
+    args = parser.parse_args()
+    users = args.hot * args.ratio
+
+    print(f"{'store':<10} {'access':<8} {'p50 us':>8} {'p99 us':>8} {'p99.9 us':>9} {'hit rate':>9}")
+    for distribution in ('uniform', 'zipf'):
+        baseline, _ = run(ProfileStore(), users, args.ops, distribution)
+        print(f"{'memory':<10} {distribution:<8} {percentile(baseline, 50):>8.1f} "
+              f"{percentile(baseline, 99):>8.1f} {percentile(baseline, 99.9):>9.1f} {'-':>9}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = TieredProfileStore(args.hot, os.path.join(directory, "cold.db"))
+            tiered, hit_rate = run(store, users, args.ops, distribution)
+            store.close()
+        print(f"{'tiered':<10} {distribution:<8} {percentile(tiered, 50):>8.1f} "
+              f"{percentile(tiered, 99):>8.1f} {percentile(tiered, 99.9):>9.1f} {hit_rate:>9.2%}")
+
+
+if __name__ == "__main__":
+    main()
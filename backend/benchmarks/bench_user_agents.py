@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+CPU benchmark: User-Agent classification with and without the LRU cache
+over a realistic, heavily skewed UA distribution
+
+Run from the backend directory:
+    python -m benchmarks.bench_user_agents
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+
+from user_agents import UserAgentClassifier
+
+# Common UA templates with rough traffic shares; versions vary per visitor
+TEMPLATES = [
+    (30, "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36"),
+    (20, "Mozilla/5.0 (iPhone; CPU iPhone OS {v}_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{v}.1 Mobile/15E148 Safari/604.1"),
+    (15, "Mozilla/5.0 (Linux; Android {v}; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36"),
+    (10, "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{v}.1 Safari/605.1.15"),
+    (8, "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36 Edg/{v}.0.0.0"),
+    (5, "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0"),
+    (4, "Mozilla/5.0 (Linux; Android 14; SAMSUNG SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/{v}.0 Chrome/115.0.0.0 Mobile Safari/537.36"),
+    (3, "Mozilla/5.0 (iPad; CPU OS {v}_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{v}.1 Mobile/15E148 Safari/604.1"),
+    (3, "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html) Chrome/{v}.0.0.0"),
+    (2, "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.0.0 Safari/537.36"),
+]
+
+
+def make_traffic(requests: int, rng: random.Random):
+    weights = [weight for weight, _ in TEMPLATES]
+    traffic = []
+    for _ in range(requests):
+        _, template = rng.choices(TEMPLATES, weights)[0]
+        # Most visitors run one of the latest few versions
+        version = 120 - min(int(rng.expovariate(0.5)), 30) if "{v}.0.0.0" in template else 17 - min(int(rng.expovariate(0.7)), 6)
+        traffic.append(template.format(v=version))
+    return traffic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    traffic = make_traffic(args.requests, random.Random(5))
+    classifier = UserAgentClassifier(cache_size=args.cache_size)
+
+    start = time.perf_counter()
+    for user_agent in traffic:
+        classifier._parse(user_agent)
+    uncached_us = (time.perf_counter() - start) / len(traffic) * 1e6
+
+    start = time.perf_counter()
+    for user_agent in traffic:
+        classifier.classify(user_agent)
+    cached_us = (time.perf_counter() - start) / len(traffic) * 1e6
+
+    info = classifier.cache_info()
+    devices = Counter(classifier.classify(user_agent).device_type for user_agent in traffic)
+    print(f"distinct UAs: {len(set(traffic)):,}  cache hit rate: {info.hits / (info.hits + info.misses):.2%}")
+    print(f"uncached: {uncached_us:.2f} us/request  cached: {cached_us:.2f} us/request "
+          f"({uncached_us / cached_us:.0f}x)")
+    print("device mix:", dict(devices.most_common()))
+
+
+if __name__ == "__main__":
+    main()
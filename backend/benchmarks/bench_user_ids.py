@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Throughput and shard spread of UserIdGenerator
+
+Run from the backend directory:
+    python -m benchmarks.bench_user_ids
+
+Uniqueness across threads and forked processes is checked in tests/test_user_ids.py.
+"""
+
+import argparse
+import threading
+import time
+from collections import Counter
+
+from user_ids import user_id_generator, shard_of, NUM_SHARDS
+
+
+def generate(count: int):
+    return [user_id_generator.new_id() for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ids", type=int, default=1_000_000, help="IDs for the throughput run")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ids = generate(args.ids)
+    elapsed = time.perf_counter() - start
+    print(f"single thread: {args.ids / elapsed:,.0f} IDs/sec")
+
+    threads, results = 8, []
+    start = time.perf_counter()
+    workers = [threading.Thread(target=lambda: results.append(generate(args.ids // threads))) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    print(f"{threads} threads: {args.ids / elapsed:,.0f} IDs/sec")
+
+    shards = Counter(shard_of(user_id) for user_id in ids)
+    print(f"shard spread: {len(shards)}/{NUM_SHARDS} used, min {min(shards.values())}, max {max(shards.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Generation benchmark: one Morph call per qualifying user vs one per cohort
+of quantized profiles, with the cohort cache's hit latency
+
+Run from the backend directory:
+    python -m benchmarks.bench_variant_cache
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+from optimization_rules import OPTIMIZATION_RULES
+from rule_table import compile_rules
+from variant_cache import VariantCache, cohort_profile
+
+BASE_COMPONENT = "export default function Homepage() { return <main>Welcome</main>; }"
+VARIANTS = ("pricing_focused", "content_heavy", "simplified")
+
+
+def make_morph_profile(n: int, rng: random.Random):
+    """Shaped like the morph_profile built in app.trigger_real_time_generation"""
+    variant = rng.choice(VARIANTS)
+    return {
+        "user_id": f"user_{n}",
+        "visit_count": rng.randint(1, 40),
+        "pricing_focused": variant == "pricing_focused",
+        "content_heavy": variant == "content_heavy",
+        "quick_browser": variant == "simplified",
+        "preferences": {
+            "analytics_top": 0.1,
+            "pricing_prominence": rng.random(),
+            "content_depth": rng.random(),
+        },
+        "behavior": {
+            "avg_session_time": rng.expovariate(1 / 90),
+            "page_depth": rng.randint(1, 30),
+            "bounce_rate": rng.random(),
+        },
+        "optimization_target": "engagement",
+        "device_type": rng.choice(["desktop", "mobile", "tablet"]),
+    }
+
+
+class FakeMorph:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def __call__(self, profile):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {"success": True, "generated_code": f"{BASE_COMPONENT} // {sorted(profile.items())}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--morph-latency", type=float, default=0.002, help="seconds per simulated Morph call")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    profiles = [make_morph_profile(n, rng) for n in range(args.users)]
+    rules = compile_rules(OPTIMIZATION_RULES)
+    cohorts = {repr(sorted(cohort_profile(p, rules).items())) for p in profiles}
+    print(f"{args.users:,} users fall into {len(cohorts):,} cohorts")
+
+    with tempfile.TemporaryDirectory() as directory:
+        morph = FakeMorph(args.morph_latency)
+        cache = VariantCache(directory=directory)
+        hit_us, miss_us = [], []
+        start = time.perf_counter()
+        for profile in profiles:
+            call_start = time.perf_counter()
+            result = cache.get_or_generate(profile, rules, BASE_COMPONENT, "react", morph)
+            (hit_us if result["cache"] == "hit" else miss_us).append((time.perf_counter() - call_start) * 1e6)
+        elapsed = time.perf_counter() - start
+        stats = cache.stats()
+
+        print(f"uncached: {args.users:,} Morph calls, ~{args.users * args.morph_latency:.1f}s of generation")
+        print(f"cohort cache: {morph.calls:,} Morph calls in {elapsed:.1f}s, hit rate {stats['hit_rate']:.1%}, "
+              f"hit {sum(hit_us) / max(1, len(hit_us)):.1f} us, miss {sum(miss_us) / max(1, len(miss_us)):.0f} us")
+
+        # A restarted process reads cohorts back from the directory instead of regenerating
+        restarted_morph = FakeMorph(args.morph_latency)
+        restarted = VariantCache(directory=directory)
+        for profile in profiles[:1000]:
+            restarted.get_or_generate(profile, rules, BASE_COMPONENT, "react", restarted_morph)
+        print(f"after restart: {restarted_morph.calls} Morph calls for 1,000 users, "
+              f"{restarted.stats()['cohorts']:,} cohorts loaded from disk")
+
+
+if __name__ == "__main__":
+    main()
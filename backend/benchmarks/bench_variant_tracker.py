@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Analytics benchmark: incrementally tracked variant distribution vs a full
+recompute, checked for consistency as time passes and interest decays
+
+Run from the backend directory:
+    python -m benchmarks.bench_variant_tracker
+"""
+
+import argparse
+import random
+import time
+
+from profile_events import new_profile, apply_events, current_view
+from profile_store import ProfileStore
+from rule_table import compile_rules
+from variant_tracker import VariantTracker
+
+RULES = {
+    "returning_user_pricing": {"when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]], "variant": "pricing_focused"},
+    "content_explorer": {"when": [["avg_session_time", ">", 120], ["page_depth", ">", 5]], "variant": "content_heavy"},
+    "quick_browser": {"when": [["avg_session_time", "<", 30], ["bounce_rate", ">", 0.8]], "variant": "simplified"},
+}
+PAGES = ["/", "/pricing", "/pricing/enterprise", "/blog/launch", "/docs/install"]
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def ingest(store, clock, users: int, events: int, rng: random.Random) -> float:
+    start = time.perf_counter()
+    for _ in range(events):
+        clock.now += 0.01
+        user_id = f"user_{rng.randrange(users)}"
+        event = {"event": "page_view", "page": rng.choice(PAGES), "session_time": rng.choice([5, 60, 200])}
+        store.update(user_id, lambda profile, event=event: apply_events(profile, [event], clock.now),
+                     lambda: new_profile(now=clock.now))
+    return (time.perf_counter() - start) / events * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--events", type=int, default=200_000)
+    args = parser.parse_args()
+
+    table = compile_rules(RULES)
+    rng = random.Random(3)
+
+    plain_clock = Clock(1_700_000_000.0)
+    per_event_plain = ingest(ProfileStore(), plain_clock, args.users, args.events, random.Random(3))
+
+    clock = Clock(1_700_000_000.0)
+    store = ProfileStore()
+    tracker = VariantTracker(table, clock=clock)
+    store.observer = tracker
+    per_event_tracked = ingest(store, clock, args.users, args.events, rng)
+    print(f"ingest: {per_event_plain:.1f} us/event untracked, {per_event_tracked:.1f} us/event tracked")
+
+    print(f"{'elapsed':>8} {'redecided':>10} {'tracked ms':>11} {'recompute ms':>13} {'consistent':>11}")
+    for hours in (0, 1, 24, 24 * 7, 24 * 30):
+        clock.now += hours * 3600
+        # Some writes between reads, so tracked decisions come from different times
+        ingest(store, clock, args.users, args.events // 20, rng)
+
+        start = time.perf_counter()
+        redecided = tracker.refresh(store)
+        _, tracked = tracker.distribution()
+        tracked_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        decisions = table.evaluate(current_view(profile, clock.now) for _, profile in store.items())
+        recomputed = table.variant_counts(decisions)
+        recompute_ms = (time.perf_counter() - start) * 1000
+
+        consistent = tracked == recomputed
+        print(f"{f'+{hours}h':>8} {redecided:>10,} {tracked_ms:>11.2f} {recompute_ms:>13.1f} {str(consistent):>11}")
+        assert consistent, f"tracked {tracked} != recomputed {recomputed}"
+    print(f"final distribution: {tracked}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import itertools
+import json
+import queue
+import threading
+from typing import Dict, Any, Optional, Set
+
+# Seconds between SSE comment lines that keep idle connections (and proxies) open
+KEEPALIVE_SECONDS = 15.0
+
+
+class Subscription:
+    """One client's view of one user's decisions: a small queue of pending events"""
+
+    __slots__ = ('user_id', 'events', 'dropped')
+
+    def __init__(self, user_id: str, max_queued: int):
+        self.user_id = user_id
+        self.events: 'queue.Queue[Dict[str, Any]]' = queue.Queue(max_queued)
+        self.dropped = 0
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        """Queue without blocking; a subscriber that falls behind loses its oldest events"""
+        while True:
+            try:
+                self.events.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class DecisionStream:
+    """
+    Fans decided-variant changes out to the clients subscribed to each user.
+
+    ``publish`` is called from the ingest path (VariantTracker, with the
+    user's stripe lock held), so it never blocks: it is a dict lookup when
+    nobody is listening, and a non-blocking put per subscriber otherwise.
+    Only the latest decision matters to a client, so a slow subscriber
+    drops its oldest queued events rather than holding up writers.
+    """
+
+    def __init__(self, max_queued: int = 16, max_subscribers: int = 100_000):
+        self.max_queued = max_queued
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, user_id: str) -> Optional[Subscription]:
+        """Return a new subscription to ``user_id``'s decisions, or None at ``max_subscribers``"""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            subscription = Subscription(user_id, self.max_queued)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: Dict[str, Any]) -> int:
+        """Deliver ``event`` to ``user_id``'s subscribers; returns how many there were"""
+        if user_id not in self._subscribers:
+            return 0
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+            self.published += 1
+            self.delivered += len(subscribers)
+            event = {**event, "id": next(self._ids)}
+        for subscription in subscribers:
+            subscription.offer(event)
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "subscribers": self._count,
+                "subscribed_users": len(self._subscribers),
+                "published": self.published,
+                "delivered": self.delivered
+            }
+
+
+def sse_event(event: Dict[str, Any], name: str = 'decision') -> str:
+    """Format one server-sent event"""
+    lines = [f"event: {name}"]
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def sse_stream(stream: DecisionStream, subscription: Subscription, initial: Optional[Dict[str, Any]] = None,
+               keepalive_seconds: float = KEEPALIVE_SECONDS):
+    """Yield a subscription as SSE text until the client disconnects"""
+    try:
+        if initial is not None:
+            yield sse_event(initial)
+        while True:
+            event = subscription.get(keepalive_seconds)
+            yield sse_event(event) if event is not None else ": keepalive\n\n"
+    finally:
+        stream.unsubscribe(subscription)
@@ -0,0 +1,38 @@
+
+import React from 'react';
+
+const Homepage = () => {
+  return (
+    <div className="homepage">
+      <section className="hero">
+        <div className="container">
+          <h1>Welcome to TechFlow</h1>
+          <p>The most innovative SaaS platform for modern businesses.</p>
+          <button className="cta-button">Get Started Free</button>
+        </div>
+      </section>
+      
+      <section className="features">
+        <div className="container">
+          <h2>Why Choose TechFlow?</h2>
+          <div className="feature-grid">
+            <div className="feature">
+              <h3>🚀 Fast Performance</h3>
+              <p>Lightning-fast processing with 99.9% uptime guarantee.</p>
+            </div>
+            <div className="feature">
+              <h3>🔒 Secure & Compliant</h3>
+              <p>Enterprise-grade security with SOC 2 compliance.</p>
+            </div>
+            <div className="feature">
+              <h3>📊 Advanced Analytics</h3>
+              <p>Real-time insights and detailed reports.</p>
+            </div>
+          </div>
+        </div>
+      </section>
+    </div>
+  );
+};
+
+export default Homepage;
@@ -0,0 +1,75 @@
+import json
+from numbers import Real
+from typing import Dict, Any, List, Optional, Tuple
+
+# Event fields the profile update reads, and the types it can apply
+STRING_FIELDS = ('event', 'page', 'user_id', 'device_type', 'os', 'browser')
+NUMERIC_FIELDS = ('time_spent', 'session_time')
+
+
+def parse_event_batch(body: bytes, content_type: Optional[str] = None) -> List[Any]:
+    """
+    Decode a batch of tracking events.
+
+    Accepts either a JSON array (optionally wrapped as ``{"events": [...]}``)
+    or newline-delimited JSON with one event per line. Raises ``ValueError``
+    if the body cannot be decoded.
+    """
+    text = body.decode('utf-8') if isinstance(body, (bytes, bytearray)) else body
+    is_ndjson = bool(content_type) and ('ndjson' in content_type or 'jsonlines' in content_type)
+
+    if not is_ndjson:
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            payload = None  # several lines of JSON, fall through to NDJSON
+        if isinstance(payload, dict) and isinstance(payload.get('events'), list):
+            return payload['events']
+        if isinstance(payload, list):
+            return payload
+        if isinstance(payload, dict):
+            return [payload]
+
+    events = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            events.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e.msg}")
+    return events
+
+
+def event_error(event: Any) -> Optional[str]:
+    """Return why an event cannot be applied to a profile, or None if it can"""
+    if not isinstance(event, dict):
+        return "Event must be a JSON object"
+    for field in STRING_FIELDS:
+        if event.get(field) is not None and not isinstance(event[field], str):
+            return f"{field} must be a string"
+    for field in NUMERIC_FIELDS:
+        value = event.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, Real)):
+            return f"{field} must be a number"
+    return None
+
+
+def group_events_by_user(events: List[Any], default_user_id: str) -> Tuple[Dict[str, List[Dict[str, Any]]], int]:
+    """
+    Group events by ``user_id`` while preserving per-user order.
+
+    Events without a ``user_id`` belong to ``default_user_id`` (the cookie
+    user). Returns the groups and the number of malformed events skipped
+    (see ``event_error``).
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    rejected = 0
+    for event in events:
+        if event_error(event):
+            rejected += 1
+            continue
+        user_id = event.get('user_id') or default_user_id
+        groups.setdefault(user_id, []).append(event)
+    return groups, rejected
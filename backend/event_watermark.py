@@ -0,0 +1,106 @@
+import heapq
+import itertools
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+# A buffered event: (event time, arrival order, arrival time, event)
+PendingEvent = Tuple[float, int, float, Dict[str, Any]]
+
+_arrivals = itertools.count()
+
+
+def event_time(event: Dict[str, Any], now: float) -> float:
+    """
+    Return the client-side time of an event in epoch seconds.
+
+    ``timestamp`` may be an ISO 8601 string (as sent by the frontend and
+    PostHog) or a number of epoch seconds or milliseconds. Missing or
+    unparseable timestamps, and timestamps in the future, fall back to ``now``.
+    """
+    value = event.get('timestamp')
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            ts = value / 1000.0 if value > 1e11 else float(value)
+        elif isinstance(value, str) and value:
+            ts = datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        else:
+            return now
+    except (ValueError, OverflowError):
+        return now
+    return min(ts, now)
+
+
+class EventWatermark:
+    """
+    Releases each user's events in event-time order, waiting for stragglers.
+
+    Arriving events are buffered on the profile. An event is released once
+    the user's watermark, the latest event time seen minus
+    ``lateness_seconds``, passes it, or once it has waited
+    ``lateness_seconds`` since arrival. Everything up to a released event's
+    time is released with it, so events are applied in event-time order,
+    each exactly once, and derived metrics are updated incrementally.
+
+    An event that arrives after later events were already applied cannot be
+    reordered any more. It is applied at the time of the last applied event
+    and counted as late.
+
+    Release depends only on the events and their logged arrival times, so
+    replaying the event log rebuilds the same profiles and buffers.
+    """
+
+    def __init__(self, lateness_seconds: float = 0.0):
+        self.lateness_seconds = max(0.0, lateness_seconds)
+        # admit runs under different stripe locks at once, so the counter has its own
+        self._lock = threading.Lock()
+        self.late = 0
+
+    def admit(self, profile, events: Iterable[Dict[str, Any]], now: float) -> List[PendingEvent]:
+        """Buffer ``events`` on the profile and return those now due, oldest first"""
+        pending = profile.pending_events or []
+        floor = profile.last_event_at
+        late = 0
+        for event in events:
+            ts = event_time(event, now)
+            if floor is not None and ts < floor:
+                ts = floor
+                late += 1
+            heapq.heappush(pending, (ts, next(_arrivals), now, event))
+        if late:
+            with self._lock:
+                self.late += late
+
+        lateness = self.lateness_seconds
+        watermark = max(entry[0] for entry in pending) - lateness if pending else None
+        for ts, _, arrived, _ in pending:
+            if arrived + lateness <= now and ts > watermark:
+                watermark = ts
+
+        released = []
+        while pending and pending[0][0] <= watermark:
+            released.append(heapq.heappop(pending))
+        profile.pending_events = pending or None
+        return released
+
+    def drain(self, profile) -> List[PendingEvent]:
+        """Release everything buffered on the profile, oldest first"""
+        pending = profile.pending_events or []
+        profile.pending_events = None
+        return sorted(pending)
+
+    def pending_count(self, profile) -> int:
+        return len(profile.pending_events or ())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"lateness_seconds": self.lateness_seconds, "late": self.late}
+
+
+def load_event_watermark() -> EventWatermark:
+    """Read the allowed event lateness, e.g. EVENT_WATERMARK_SECONDS=5 (0 buffers nothing)"""
+    return EventWatermark(float(os.getenv('EVENT_WATERMARK_SECONDS', '0')))
+
+
+event_watermark = load_event_watermark()
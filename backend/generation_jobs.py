@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable, Optional, Tuple
+
+# Job states; queued and running jobs are in flight
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class GenerationJob:
+    """One background variant generation for a user"""
+
+    __slots__ = ('job_id', 'key', 'user_id', 'variant', 'status', 'created_at',
+                 'started_at', 'finished_at', 'result', 'error', '_run')
+
+    def __init__(self, key: Hashable, user_id: str, variant: str, run: Callable[[], Dict[str, Any]]):
+        self.job_id = uuid.uuid4().hex
+        self.key = key
+        self.user_id = user_id
+        self.variant = variant
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._run = run
+
+    @property
+    def in_flight(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "variant": self.variant,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class GenerationJobs:
+    """
+    Runs variant generation (Morph, repo write, Freestyle deploy, routing) on
+    background worker threads, so requests only pay for queueing a job.
+
+    Jobs are deduplicated by key, e.g. (site, user, variant): while a job
+    for a key is queued or running, submitting the same key returns that job
+    instead of starting another. Once it has succeeded it keeps being
+    returned, since the variant is already live; a failed job is retried by
+    the next submission, and ``force`` starts a new job whenever none is in
+    flight. Finished jobs stay queryable by ID until ``max_retained`` newer
+    jobs have been created.
+    """
+
+    def __init__(self, num_workers: int = 2, max_queued: int = 1000, max_retained: int = 10000):
+        self.max_retained = max_retained
+        self._queue: 'queue.Queue[Optional[GenerationJob]]' = queue.Queue(max_queued)
+        self._lock = threading.Lock()
+        self._jobs: 'OrderedDict[str, GenerationJob]' = OrderedDict()
+        self._latest: Dict[Hashable, GenerationJob] = {}
+        self.counters = dict.fromkeys(('submitted', 'deduplicated', 'rejected', 'succeeded', 'failed'), 0)
+        self._workers = [
+            threading.Thread(target=self._work, name=f"generation-worker-{n}", daemon=True)
+            for n in range(max(1, num_workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self,
+               key: Hashable,
+               user_id: str,
+               variant: str,
+               run: Callable[[], Dict[str, Any]],
+               force: bool = False) -> Tuple[Optional[GenerationJob], bool]:
+        """
+        Return ``(job, created)`` for ``key``, queueing ``run`` unless an
+        existing job covers it. The job is None if the queue is full.
+        """
+        with self._lock:
+            latest = self._latest.get(key)
+            if latest is not None and (latest.in_flight or (latest.status == SUCCEEDED and not force)):
+                self.counters['deduplicated'] += 1
+                return latest, False
+            job = GenerationJob(key, user_id, variant, run)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.counters['rejected'] += 1
+                return None, False
+            self.counters['submitted'] += 1
+            self._latest[key] = job
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_retained:
+                _, dropped = self._jobs.popitem(last=False)
+                if self._latest.get(dropped.key) is dropped:
+                    del self._latest[dropped.key]
+            return job, True
+
+    def get(self, job_id: str) -> Optional[GenerationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                job.started_at = time.time()
+                job.status = RUNNING
+            try:
+                result = job._run()
+            except Exception as e:
+                traceback.print_exc()
+                result, error = None, str(e)
+            else:
+                # The pipeline reports its own failures as {"error": ...}
+                error = result.get("error") if isinstance(result, dict) else None
+            with self._lock:
+                job.result = result
+                job.error = error
+                job.finished_at = time.time()
+                job.status = FAILED if error else SUCCEEDED
+                job._run = None
+                self.counters[job.status] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = sum(1 for job in self._latest.values() if job.in_flight)
+            return {
+                **self.counters,
+                "queued": self._queue.qsize(),
+                "in_flight": in_flight,
+                "workers": len(self._workers),
+                "retained": len(self._jobs)
+            }
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the workers after the jobs already queued"""
+        for _ in self._workers:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                return
+        for worker in self._workers:
+            worker.join(timeout)
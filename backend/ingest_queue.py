@@ -0,0 +1,237 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from user_ids import shard_of
+
+# Overflow policies when the queue is full
+OVERFLOW_BLOCK = 'block'              # wait for space (up to block_timeout), then reject
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # discard the oldest queued item to make room
+OVERFLOW_REJECT = 'reject'            # refuse the new item immediately (HTTP 503)
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_REJECT)
+
+# A queued item is one user's events, in arrival order
+IngestItem = Tuple[str, List[Dict[str, Any]]]
+
+
+class _Partition:
+    """One worker's slice of the queue; a user's events always land in the same one"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items: deque = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.idle = threading.Condition(self.lock)
+        self.in_flight = False
+        self.enqueued = 0
+        self.applied = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed = 0
+
+
+class IngestQueue:
+    """
+    Bounded in-process queue that decouples /api/track from profile updates.
+
+    Handlers ``put`` validated events and return immediately; worker threads
+    drain the queue in batches and hand them to ``apply_batch`` grouped by
+    user. ``apply_batch`` returns the users whose events could not be applied,
+    mapped to the error, so one bad user does not fail the rest of the batch.
+    Each worker owns one partition and users are hashed to partitions, so a
+    user's events are always applied in arrival order. ``close`` stops intake
+    and applies everything still queued.
+    """
+
+    def __init__(self,
+                 apply_batch: Callable[[Dict[str, List[Dict[str, Any]]]], Optional[Dict[str, Exception]]],
+                 max_size: int = 10000,
+                 overflow_policy: str = OVERFLOW_BLOCK,
+                 num_workers: int = 1,
+                 max_batch: int = 500,
+                 block_timeout: float = 1.0):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {', '.join(OVERFLOW_POLICIES)}")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.apply_batch = apply_batch
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.max_batch = max_batch
+        self.block_timeout = block_timeout
+        self._closed = False
+
+        num_workers = max(1, num_workers)
+        partition_size = max(1, max_size // num_workers)
+        self._partitions = [_Partition(partition_size) for _ in range(num_workers)]
+        self._workers = [
+            threading.Thread(target=self._run, args=(partition,), name=f"ingest-worker-{n}", daemon=True)
+            for n, partition in enumerate(self._partitions)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def put(self, user_id: str, events: List[Dict[str, Any]]) -> bool:
+        """Queue one user's events; returns False if they were rejected"""
+        partition = self._partitions[shard_of(user_id) % len(self._partitions)]
+        with partition.lock:
+            if self._closed:
+                partition.rejected += len(events)
+                return False
+
+            if len(partition.items) >= partition.max_size:
+                if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                    _, oldest = partition.items.popleft()
+                    partition.dropped += len(oldest)
+                elif self.overflow_policy == OVERFLOW_BLOCK:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(partition.items) >= partition.max_size and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        partition.not_full.wait(remaining)
+                    if len(partition.items) >= partition.max_size or self._closed:
+                        partition.rejected += len(events)
+                        return False
+                else:
+                    partition.rejected += len(events)
+                    return False
+
+            partition.items.append((user_id, events))
+            partition.enqueued += len(events)
+            partition.not_empty.notify()
+            return True
+
+    def put_many(self, groups: Dict[str, List[Dict[str, Any]]]) -> bool:
+        """
+        Queue several users' events all or nothing; returns False if they were rejected.
+
+        Room is reserved in every partition the users hash to before any of
+        them is queued, so a rejected batch can be retried without applying
+        some users twice.
+        """
+        by_partition: Dict[int, List[IngestItem]] = {}
+        for user_id, events in groups.items():
+            by_partition.setdefault(shard_of(user_id) % len(self._partitions), []).append((user_id, events))
+        # Locks are always taken in partition order, so concurrent batches cannot deadlock
+        partitions = [(self._partitions[index], items) for index, items in sorted(by_partition.items())]
+        count = sum(len(events) for events in groups.values())
+        fits = all(len(items) <= partition.max_size for partition, items in partitions)
+        deadline = time.monotonic() + self.block_timeout
+
+        while True:
+            for partition, _ in partitions:
+                partition.lock.acquire()
+            try:
+                full = None
+                if not self._closed and fits:
+                    full = next(((partition, items) for partition, items in partitions
+                                 if len(partition.items) + len(items) > partition.max_size), None)
+                    if full is not None and self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                        for partition, items in partitions:
+                            while len(partition.items) + len(items) > partition.max_size:
+                                _, oldest = partition.items.popleft()
+                                partition.dropped += len(oldest)
+                        full = None
+                    if full is None:
+                        for partition, items in partitions:
+                            partition.items.extend(items)
+                            partition.enqueued += sum(len(events) for _, events in items)
+                            partition.not_empty.notify()
+                        return True
+                remaining = deadline - time.monotonic()
+                if full is None or self.overflow_policy != OVERFLOW_BLOCK or remaining <= 0:
+                    partitions[0][0].rejected += count
+                    return False
+            finally:
+                for partition, _ in reversed(partitions):
+                    partition.lock.release()
+
+            partition, items = full
+            with partition.lock:
+                partition.not_full.wait_for(
+                    lambda: len(partition.items) + len(items) <= partition.max_size or self._closed, remaining)
+
+    def _take_batch(self, partition: _Partition) -> Optional[List[IngestItem]]:
+        with partition.lock:
+            while not partition.items and not self._closed:
+                partition.not_empty.wait()
+            if not partition.items:
+                return None  # closed and fully drained
+            batch = []
+            while partition.items and len(batch) < self.max_batch:
+                batch.append(partition.items.popleft())
+            partition.in_flight = True
+            partition.not_full.notify_all()
+            return batch
+
+    def _run(self, partition: _Partition):
+        while True:
+            batch = self._take_batch(partition)
+            if batch is None:
+                return
+
+            groups: Dict[str, List[Dict[str, Any]]] = {}
+            count = 0
+            for user_id, events in batch:
+                groups.setdefault(user_id, []).extend(events)
+                count += len(events)
+
+            try:
+                errors = self.apply_batch(groups) or {}
+                failed = sum(len(groups[user_id]) for user_id in errors)
+                for user_id, e in errors.items():
+                    print(f"Error applying queued tracking events for {user_id}: {e}")
+            except Exception as e:
+                print(f"Error applying queued tracking events: {e}")
+                failed = count
+            applied = count - failed
+
+            with partition.lock:
+                partition.applied += applied
+                partition.failed += failed
+                partition.in_flight = False
+                if not partition.items:
+                    partition.idle.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued event has been applied"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for partition in self._partitions:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            with partition.lock:
+                if not partition.idle.wait_for(lambda: not partition.items and not partition.in_flight, remaining):
+                    return False
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting events, apply everything still queued and stop the workers"""
+        self._closed = True
+        for partition in self._partitions:
+            with partition.lock:
+                partition.not_empty.notify_all()
+                partition.not_full.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        totals = {"queue_depth": 0, "enqueued": 0, "applied": 0, "dropped": 0, "rejected": 0, "failed": 0}
+        for partition in self._partitions:
+            with partition.lock:
+                totals["queue_depth"] += len(partition.items)
+                totals["enqueued"] += partition.enqueued
+                totals["applied"] += partition.applied
+                totals["dropped"] += partition.dropped
+                totals["rejected"] += partition.rejected
+                totals["failed"] += partition.failed
+        return {
+            **totals,
+            "max_size": self.max_size,
+            "overflow_policy": self.overflow_policy,
+            "workers": len(self._workers),
+            "closed": self._closed
+        }
@@ -0,0 +1,75 @@
+import os
+import time
+from typing import Dict, Any, Optional
+
+# Interest score -> default half-life in hours
+DEFAULT_HALF_LIVES_HOURS: Dict[str, float] = {
+    "pricing_interest": 7 * 24,
+    "content_interest": 3 * 24,
+}
+
+
+def updated_at_key(field: str) -> str:
+    return f"{field}_updated_at"
+
+
+class InterestDecay:
+    """
+    Exponentially decaying interest scores, evaluated lazily.
+
+    A profile stores each score as of its last update together with that
+    update's timestamp (``<field>_updated_at``). Reads decay the stored value
+    by ``0.5 ** (elapsed / half_life)``, which is O(1) per score and needs no
+    background sweep over all profiles. A half-life of 0 disables decay.
+    """
+
+    def __init__(self, half_lives_hours: Optional[Dict[str, float]] = None):
+        half_lives = half_lives_hours if half_lives_hours is not None else DEFAULT_HALF_LIVES_HOURS
+        self.half_lives = {field: hours * 3600.0 for field, hours in half_lives.items()}
+
+    def value(self, profile: Dict[str, Any], field: str, now: Optional[float] = None) -> float:
+        """Return the decayed score at ``now`` without modifying the profile"""
+        stored = profile.get(field, 0) or 0
+        half_life = self.half_lives.get(field)
+        updated_at = profile.get(updated_at_key(field))
+        if not stored or not half_life or updated_at is None:
+            return stored
+        elapsed = max(0.0, (time.time() if now is None else now) - updated_at)
+        return stored * 0.5 ** (elapsed / half_life)
+
+    def bump(self, profile: Dict[str, Any], field: str, amount: float, now: float, cap: float = 1.0) -> float:
+        """Decay a score to ``now``, add ``amount`` and store it with its new timestamp"""
+        score = min(cap, self.value(profile, field, now) + amount)
+        profile[field] = score
+        profile[updated_at_key(field)] = now
+        return score
+
+    def stamp(self, profile: Dict[str, Any], now: float) -> None:
+        """Give scores that have no timestamp yet (e.g. seeded profiles) one at ``now``"""
+        for field in self.half_lives:
+            profile.setdefault(updated_at_key(field), now)
+
+    def apply(self, profile: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Replace the stored scores in ``profile`` with their decayed values.
+
+        Only use this on a copy (e.g. from ``ProfileStore.get``): the stored
+        values must keep pairing with their original timestamps.
+        """
+        now = time.time() if now is None else now
+        for field in self.half_lives:
+            if field in profile:
+                profile[field] = self.value(profile, field, now)
+        return profile
+
+
+def load_interest_decay() -> InterestDecay:
+    """Read per-interest half-lives, e.g. PRICING_INTEREST_HALF_LIFE_HOURS=168"""
+    half_lives = {
+        field: float(os.getenv(f"{field.upper()}_HALF_LIFE_HOURS", default))
+        for field, default in DEFAULT_HALF_LIVES_HOURS.items()
+    }
+    return InterestDecay(half_lives)
+
+
+interest_decay = load_interest_decay()
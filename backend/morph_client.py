@@ -119,6 +119,7 @@ class MorphClient:
         
         return {
             "success": True,
+            "mock": True,
             "generated_code": self._generate_variant_code(optimization_type, base_component),
             "optimization_type": optimization_type,
             "description": description,
@@ -0,0 +1,20 @@
+# Mock AI optimization rules, declared as conditions that must all hold
+# (field, operator, threshold). The first matching rule wins: rules with a higher
+# "priority" are checked first, and rules of equal priority in the order listed.
+OPTIMIZATION_RULES = {
+    "returning_user_pricing": {
+        "when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]],
+        "variant": "pricing_focused",
+        "reason": "User shows high interest in pricing across multiple visits"
+    },
+    "content_explorer": {
+        "when": [["avg_session_time", ">", 120], ["page_depth", ">", 5]],
+        "variant": "content_heavy",
+        "reason": "User spends significant time exploring content"
+    },
+    "quick_browser": {
+        "when": [["avg_session_time", "<", 30], ["bounce_rate", ">", 0.8]],
+        "variant": "simplified",
+        "reason": "User prefers quick, simplified experiences"
+    }
+}
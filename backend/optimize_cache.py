@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+class OptimizeCache:
+    """
+    Memoized /api/optimize responses, one per user, tied to a profile version.
+
+    An entry answers polls only while the user's profile still has the
+    version it was computed from, and until it expires: after
+    ``ttl_seconds``, or earlier when interest decay could change the
+    decision (see ``decision_expires_at``). The TTL bounds how stale the
+    decayed scores echoed in the response may get. Storing the serialized
+    body means a hit skips rule evaluation, the profile copy and JSON
+    encoding. At most ``max_entries`` users are kept, least recently used
+    first out.
+    """
+
+    def __init__(self, max_entries: int = 100_000, ttl_seconds: float = 30.0):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[str, Tuple[int, float, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, user_id: str, version: int, now: float) -> Optional[bytes]:
+        """Return the cached body for this profile version, or None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            cached_version, expires_at, body = entry
+            if cached_version != version or now >= expires_at:
+                del self._entries[user_id]
+                self.stale += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return body
+
+    def put(self, user_id: str, version: int, body: bytes, now: float, expires_at: float = float('inf')) -> None:
+        with self._lock:
+            self._entries[user_id] = (version, min(expires_at, now + self.ttl_seconds), body)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+
+# Recorded in place of pages first seen after the interner is full
+OTHER_PAGE = '(other)'
+
+
+class PageInterner:
+    """
+    Maps page strings to small integer IDs shared by every profile.
+
+    Page strings come from clients, so at most ``max_pages`` are kept: once
+    the table is full, new pages all share the ID of ``OTHER_PAGE`` (ID 0)
+    instead of growing memory without bound.
+    """
+
+    def __init__(self, max_pages: int = 100_000):
+        if max_pages < 2:
+            raise ValueError("max_pages must be at least 2")
+        self.max_pages = max_pages
+        self._ids: Dict[str, int] = {OTHER_PAGE: 0}
+        self._pages: List[str] = [OTHER_PAGE]
+        self._lock = threading.Lock()
+        self.overflowed = 0
+
+    def intern(self, page: str) -> int:
+        page_id = self._ids.get(page)
+        if page_id is None:
+            with self._lock:
+                page_id = self._ids.get(page)
+                if page_id is None:
+                    if len(self._pages) >= self.max_pages:
+                        if not self.overflowed:
+                            print(f"⚠️  {self.max_pages:,} distinct pages seen; recording new pages as {OTHER_PAGE}")
+                        self.overflowed += 1
+                        return 0
+                    page_id = len(self._pages)
+                    self._pages.append(page)
+                    self._ids[page] = page_id
+        return page_id
+
+    def lookup(self, page_id: int) -> str:
+        return self._pages[page_id]
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def pages(self) -> List[str]:
+        """Snapshot of the ID -> page table (IDs are list positions)"""
+        return list(self._pages)
+
+
+def load_page_interner() -> PageInterner:
+    """Read the distinct-page limit, e.g. MAX_INTERNED_PAGES=100000"""
+    return PageInterner(int(os.getenv('MAX_INTERNED_PAGES', '100000')))
+
+
+# Page IDs are process-wide so repeated URLs cost 4 bytes per view, not a string
+page_interner = load_page_interner()
+
+
+def _seconds(value: float) -> Any:
+    """Undo float32 storage for output: whole seconds as int, the rest to milliseconds"""
+    return int(value) if value.is_integer() else round(value, 3)
+
+
+class PageViewHistory:
+    """
+    Bounded, column-oriented page-view history for a single profile.
+
+    The most recent ``capacity`` views are kept in a ring of typed arrays
+    (page ID, epoch seconds, float32 time spent). Running totals cover every
+    view ever recorded, so ``len()`` and ``total_time_spent`` stay exact after
+    older entries have been overwritten.
+    """
+
+    __slots__ = ('capacity', 'page_ids', 'timestamps', 'time_spent', 'head', 'total_views', 'total_time_spent')
+
+    def __init__(self, capacity: int = 100):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.page_ids = array('I')
+        self.timestamps = array('q')
+        self.time_spent = array('f')
+        self.head = 0  # next slot to overwrite once the ring is full
+        self.total_views = 0
+        self.total_time_spent = 0.0
+
+    def append(self, page: str, timestamp: Optional[float] = None, time_spent: float = 0) -> None:
+        page_id = page_interner.intern(page or '')
+        ts = int(time.time() if timestamp is None else timestamp)
+        spent = float(time_spent or 0)
+
+        if len(self.page_ids) < self.capacity:
+            self.page_ids.append(page_id)
+            self.timestamps.append(ts)
+            self.time_spent.append(spent)
+        else:
+            self.page_ids[self.head] = page_id
+            self.timestamps[self.head] = ts
+            self.time_spent[self.head] = spent
+            self.head = (self.head + 1) % self.capacity
+
+        self.total_views += 1
+        self.total_time_spent += spent
+
+    def __len__(self) -> int:
+        return self.total_views
+
+    @property
+    def retained(self) -> int:
+        """Number of views still held in the ring"""
+        return len(self.page_ids)
+
+    def _order(self) -> Iterator[int]:
+        # head stays at 0 until the ring fills, so this is also correct while growing
+        size = len(self.page_ids)
+        for offset in range(size):
+            yield (self.head + offset) % size
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Yield retained views oldest first, in the original dict shape"""
+        for i in self._order():
+            yield {
+                'page': page_interner.lookup(self.page_ids[i]),
+                'timestamp': datetime.fromtimestamp(self.timestamps[i]).isoformat(),
+                'time_spent': _seconds(self.time_spent[i])
+            }
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return list(self)
+
+    def __getstate__(self):
+        # A flat tuple keeps snapshots small and fast to load
+        return (self.capacity, self.page_ids, self.timestamps, self.time_spent,
+                self.head, self.total_views, self.total_time_spent)
+
+    def __setstate__(self, state):
+        (self.capacity, self.page_ids, self.timestamps, self.time_spent,
+         self.head, self.total_views, self.total_time_spent) = state
+
+    def remap_pages(self, remap: List[int]) -> None:
+        """Translate page IDs from another process's interner into this one's"""
+        self.page_ids = array('I', (remap[page_id] for page_id in self.page_ids))
+
+    def copy(self) -> 'PageViewHistory':
+        clone = PageViewHistory(self.capacity)
+        clone.page_ids = array('I', self.page_ids)
+        clone.timestamps = array('q', self.timestamps)
+        clone.time_spent = array('f', self.time_spent)
+        clone.head = self.head
+        clone.total_views = self.total_views
+        clone.total_time_spent = self.total_time_spent
+        return clone
+
+    @classmethod
+    def from_list(cls, page_views: List[Dict[str, Any]], capacity: int = 100) -> 'PageViewHistory':
+        """Build a history from the legacy list-of-dicts representation"""
+        history = cls(capacity)
+        for view in page_views:
+            timestamp = view.get('timestamp')
+            if isinstance(timestamp, str):
+                timestamp = datetime.fromisoformat(timestamp).timestamp()
+            history.append(view.get('page', ''), timestamp, view.get('time_spent', 0))
+        return history
@@ -0,0 +1,65 @@
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Pattern, Tuple
+
+# Category -> URL substrings. "pricing" and "content" feed the profile interest scores.
+DEFAULT_TAXONOMY: Dict[str, List[str]] = {
+    "pricing": ["pricing", "price"],
+    "content": ["about", "blog", "docs"],
+}
+
+EMPTY: FrozenSet[str] = frozenset()
+
+
+class PageTaxonomy:
+    """
+    Classifies page URLs into categories with precompiled matchers.
+
+    Each category's patterns are compiled into one case-insensitive regex,
+    so a URL is in every category with a pattern anywhere in it, even where
+    patterns of different categories overlap. Results are memoized per URL
+    in a bounded LRU cache, since a site has far fewer distinct URLs than
+    it has page views.
+    """
+
+    def __init__(self, taxonomy: Optional[Dict[str, List[str]]] = None, cache_size: int = 4096):
+        self.taxonomy = {category: list(patterns) for category, patterns in (taxonomy or DEFAULT_TAXONOMY).items()}
+        self._patterns: List[Tuple[str, Pattern[str]]] = [
+            (category, re.compile('|'.join(re.escape(p) for p in patterns), re.IGNORECASE))
+            for category, patterns in self.taxonomy.items()
+            if patterns
+        ]
+        self.categories = lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, url: Optional[str]) -> FrozenSet[str]:
+        if not url:
+            return EMPTY
+        return frozenset(category for category, pattern in self._patterns if pattern.search(url))
+
+    def matches(self, url: Optional[str], category: str) -> bool:
+        return category in self.categories(url)
+
+    def cache_info(self):
+        return self.categories.cache_info()
+
+
+def load_taxonomy() -> PageTaxonomy:
+    """
+    Build the taxonomy from the environment.
+
+    PAGE_TAXONOMY may hold a JSON object of category -> patterns, or
+    PAGE_TAXONOMY_FILE may point at a JSON file with the same shape.
+    """
+    taxonomy = None
+    if os.getenv('PAGE_TAXONOMY'):
+        taxonomy = json.loads(os.getenv('PAGE_TAXONOMY'))
+    elif os.getenv('PAGE_TAXONOMY_FILE'):
+        with open(os.getenv('PAGE_TAXONOMY_FILE')) as f:
+            taxonomy = json.load(f)
+    return PageTaxonomy(taxonomy, cache_size=int(os.getenv('PAGE_TAXONOMY_CACHE_SIZE', '4096')))
+
+
+# Shared by the tracking endpoint and both PostHog clients
+page_taxonomy = load_taxonomy()
@@ -5,6 +5,8 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import json
 
+from page_taxonomy import page_taxonomy
+
 class PostHogClient:
     """Client for interacting with PostHog API to retrieve user data and events"""
     
@@ -175,9 +177,10 @@ class PostHogClient:
                             if current_url:
                                 user_data['summary']['pages_visited'].add(current_url)
                                 # Calculate interest scores
-                                if 'pricing' in current_url.lower() or 'price' in current_url.lower():
+                                categories = page_taxonomy.categories(current_url)
+                                if 'pricing' in categories:
                                     pricing_events += 1
-                                if 'about' in current_url.lower() or 'blog' in current_url.lower() or 'docs' in current_url.lower():
+                                if 'content' in categories:
                                     content_events += 1
                     
                     # Count session starts
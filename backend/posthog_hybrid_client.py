@@ -5,6 +5,8 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import json
 
+from page_taxonomy import page_taxonomy
+
 class PostHogHybridClient:
     """
     Hybrid PostHog client that works with both project keys and personal API keys
@@ -212,9 +214,10 @@ class PostHogHybridClient:
                             current_url = properties.get('$current_url', '')
                             if current_url:
                                 user_data['summary']['pages_visited'].add(current_url)
-                                if 'pricing' in current_url.lower():
+                                categories = page_taxonomy.categories(current_url)
+                                if 'pricing' in categories:
                                     pricing_events += 1
-                                if 'about' in current_url.lower() or 'blog' in current_url.lower():
+                                if 'content' in categories:
                                     content_events += 1
                 
                 user_data['summary']['pricing_interest'] = min(1.0, pricing_events / max(user_data['summary']['page_views'], 1))
@@ -0,0 +1,166 @@
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from profile_events import current_values
+from rule_table import DecisionTable
+from user_agents import DEVICE_TYPES, OS_FAMILIES, BROWSER_FAMILIES
+
+# Numeric profile fields copied into float64 columns
+NUMERIC_COLUMNS = ('visit_count', 'avg_session_time', 'page_depth',
+                   'pricing_interest', 'content_interest', 'bounce_rate')
+# Categorical fields, stored as small integer codes into these value lists
+CATEGORY_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    'device_type': DEVICE_TYPES,
+    'os': OS_FAMILIES,
+    'browser': BROWSER_FAMILIES,
+}
+# Each profile's decided variant, computed from the other columns
+VARIANT_COLUMN = 'variant'
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+
+class ColumnSnapshot:
+    """
+    A point-in-time copy of a site's profiles as NumPy columns.
+
+    Interest scores are decayed to ``taken_at`` and buffered events are
+    included, as ``current_view`` would show them. Statistics are computed
+    over whole columns at once rather than per profile.
+    """
+
+    def __init__(self,
+                 numeric: Dict[str, np.ndarray],
+                 categories: Dict[str, Tuple[np.ndarray, Tuple[str, ...]]],
+                 size: int,
+                 taken_at: float,
+                 build_seconds: float = 0.0):
+        self.numeric = numeric
+        self.categories = categories
+        self.size = size
+        self.taken_at = taken_at
+        self.build_seconds = build_seconds
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.numeric) + list(self.categories)
+
+    def _numeric(self, field: str) -> np.ndarray:
+        if field not in self.numeric:
+            raise KeyError(field)
+        return self.numeric[field]
+
+    def percentiles(self, field: str, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, float]:
+        values = self._numeric(field)
+        if not values.size:
+            return {f"p{q:g}": None for q in percentiles}
+        return {f"p{q:g}": float(v) for q, v in zip(percentiles, np.percentile(values, percentiles))}
+
+    def histogram(self, field: str, bins: int = 10) -> Dict[str, Any]:
+        if field in self.categories:
+            codes, labels = self.categories[field]
+            return {"labels": list(labels), "counts": np.bincount(codes, minlength=len(labels)).tolist()}
+        counts, edges = np.histogram(self._numeric(field), bins=bins)
+        return {"edges": edges.tolist(), "counts": counts.tolist()}
+
+    def _binned(self, field: str, bins: int) -> Tuple[np.ndarray, List[str]]:
+        """Codes and labels for one cross-tab axis; numeric fields are cut into equal-width bins"""
+        if field in self.categories:
+            codes, labels = self.categories[field]
+            return codes, list(labels)
+        values = self._numeric(field)
+        edges = np.histogram_bin_edges(values, bins=bins)
+        codes = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+        return codes, [f"{low:g}-{high:g}" for low, high in zip(edges[:-1], edges[1:])]
+
+    def crosstab(self, rows: str, columns: str, bins: int = 5) -> Dict[str, Any]:
+        row_codes, row_labels = self._binned(rows, bins)
+        column_codes, column_labels = self._binned(columns, bins)
+        cells = np.bincount(row_codes.astype(np.int64) * len(column_labels) + column_codes,
+                            minlength=len(row_labels) * len(column_labels))
+        return {
+            "rows": row_labels,
+            "columns": column_labels,
+            "counts": cells.reshape(len(row_labels), len(column_labels)).tolist()
+        }
+
+
+def materialize(store, rules: DecisionTable, now: Optional[float] = None) -> ColumnSnapshot:
+    """Copy every profile in ``store`` into a ColumnSnapshot, deciding each one's variant"""
+    now = time.time() if now is None else now
+    start = time.perf_counter()
+    numeric_fields = NUMERIC_COLUMNS + tuple(
+        field for field in rules.fields if field not in NUMERIC_COLUMNS and field not in CATEGORY_COLUMNS
+    )
+    fields = numeric_fields + tuple(CATEGORY_COLUMNS)
+    code_of = {field: {value: code for code, value in enumerate(values)} for field, values in CATEGORY_COLUMNS.items()}
+
+    def row(profile):
+        values = current_values(profile, fields, now)
+        return (tuple(values[field] or 0 for field in numeric_fields)
+                + tuple(code_of[field].get(values[field], 0) for field in CATEGORY_COLUMNS))
+
+    rows = list(store.scan(row))
+    table = np.array(rows, dtype=np.float64).reshape(len(rows), len(fields))
+    numeric = {field: np.ascontiguousarray(table[:, index]) for index, field in enumerate(numeric_fields)}
+    categories = {
+        field: (table[:, len(numeric_fields) + index].astype(np.int8), values)
+        for index, (field, values) in enumerate(CATEGORY_COLUMNS.items())
+    }
+
+    # Rules comparing a categorical field against a string see the decoded values
+    rule_columns = {field: numeric[field] for field in rules.fields if field in numeric}
+    for field in rules.fields:
+        if field in categories:
+            codes, values = categories[field]
+            rule_columns[field] = np.array(values)[codes]
+    decisions = rules.decide_batch(rule_columns, len(rows))
+    # Rule index -> position in rules.variants, with -1 (no rule) at the front
+    variant_codes = np.array([0] + [rules.variants.index(rule.variant) for rule in rules], dtype=np.int8)
+    categories[VARIANT_COLUMN] = (variant_codes[decisions + 1], rules.variants)
+
+    return ColumnSnapshot(numeric, categories, len(rows), now, time.perf_counter() - start)
+
+
+class ColumnMaterializer:
+    """
+    Keeps a site's ColumnSnapshot fresh on a background thread.
+
+    The snapshot is rebuilt every ``interval_seconds`` (never, if 0) and
+    swapped in whole, so readers always see one consistent snapshot and
+    never wait for a rebuild; the first read builds one if none exists yet.
+    """
+
+    def __init__(self, store, rules: DecisionTable, interval_seconds: float = 60.0):
+        self.store = store
+        self.rules = rules
+        self.interval_seconds = interval_seconds
+        self.snapshot: Optional[ColumnSnapshot] = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        if interval_seconds > 0:
+            self._thread = threading.Thread(target=self._loop, name="profile-columns", daemon=True)
+            self._thread.start()
+
+    def refresh(self) -> ColumnSnapshot:
+        with self._refresh_lock:
+            self.snapshot = materialize(self.store, self.rules)
+            return self.snapshot
+
+    def current(self) -> ColumnSnapshot:
+        snapshot = self.snapshot
+        return snapshot if snapshot is not None else self.refresh()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error materializing profile columns: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
@@ -0,0 +1,152 @@
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterable, Mapping, Optional, Sequence
+
+from page_history import PageViewHistory
+from page_taxonomy import page_taxonomy
+from interest_decay import interest_decay, updated_at_key
+from user_profile import UserProfile
+from event_watermark import event_watermark
+
+DEFAULT_HISTORY_SIZE = 100
+
+# Decimal places of interest scores in API output; decay makes every read a fresh float
+INTEREST_DECIMALS = 4
+
+# Set from the request's User-Agent (see user_agents.py) or sent by the client
+DEVICE_FIELDS = ('device_type', 'os', 'browser')
+
+
+def new_profile(history_size: int = DEFAULT_HISTORY_SIZE, now: Optional[float] = None) -> UserProfile:
+    """Create an empty behavioral profile for a first-time visitor"""
+    created_at = datetime.now() if now is None else datetime.fromtimestamp(now)
+    return UserProfile(PageViewHistory(history_size), created_at.isoformat())
+
+
+def profile_from_dict(data: Dict[str, Any],
+                      history_size: int = DEFAULT_HISTORY_SIZE,
+                      now: Optional[float] = None) -> UserProfile:
+    """Build a profile from its JSON shape, e.g. for seeded demo users"""
+    fields = dict(data)
+    page_views = fields.get('page_views', [])
+    if not isinstance(page_views, PageViewHistory):
+        fields['page_views'] = PageViewHistory.from_list(page_views, history_size)
+    fields.setdefault('created_at', (datetime.now() if now is None else datetime.fromtimestamp(now)).isoformat())
+    profile = UserProfile.from_dict(fields)
+    # Interest scores given without a timestamp start decaying from now
+    interest_decay.stamp(profile, time.time() if now is None else now)
+    return profile
+
+
+def current_view(profile: UserProfile, now: Optional[float] = None) -> UserProfile:
+    """
+    Bring a profile up to ``now`` for reading: apply any events still waiting
+    for the watermark and decay the interest scores.
+
+    Only use this on a copy (e.g. from ``ProfileStore.get``); the stored
+    profile keeps its buffer and undecayed scores.
+    """
+    now = time.time() if now is None else now
+    if profile.pending_events:
+        _apply_released(profile, event_watermark.drain(profile))
+        update_derived_metrics(profile)
+    return interest_decay.apply(profile, now)
+
+
+def current_values(profile: UserProfile, fields: Sequence[str], now: float) -> Dict[str, Any]:
+    """
+    Read some fields as ``current_view`` would show them at ``now``, without
+    copying the profile unless it has buffered events. Missing fields read as 0.
+    """
+    if getattr(profile, 'pending_events', None):
+        view = current_view(profile.copy(), now)
+        return {field: view.get(field, 0) for field in fields}
+    return {field: interest_decay.value(profile, field, now) if field in interest_decay.half_lives
+            else profile.get(field, 0) for field in fields}
+
+
+def serialize_profile(profile: Mapping[str, Any], now: Optional[float] = None, copy: bool = True) -> Dict[str, Any]:
+    """
+    Return the JSON-ready shape of a profile as of ``now``.
+
+    Pass ``copy=False`` for a profile that is already a private copy (e.g.
+    from ``ProfileStore.pages``); it is then brought up to ``now`` in place.
+    """
+    if isinstance(profile, UserProfile):
+        data = current_view(profile.copy() if copy else profile, now).to_dict()
+    else:
+        data = interest_decay.apply(dict(profile), now)
+    for field in interest_decay.half_lives:
+        data.pop(updated_at_key(field), None)
+        if isinstance(data.get(field), float):
+            data[field] = round(data[field], INTEREST_DECIMALS)
+    page_views = data.get('page_views')
+    if isinstance(page_views, PageViewHistory):
+        data['page_views'] = page_views.to_list()
+    return data
+
+
+def apply_event(profile: UserProfile, data: Dict[str, Any], now: Optional[float] = None) -> None:
+    """
+    Apply a single /api/track event to a profile.
+
+    ``now`` is the server receive time (epoch seconds); it defaults to the
+    current time and is passed explicitly when replaying logged events.
+    """
+    apply_events(profile, [data], now)
+
+
+def apply_events(profile: UserProfile, events: Iterable[Dict[str, Any]], now: Optional[float] = None) -> None:
+    """
+    Apply events to a profile in event-time order, recomputing derived metrics once.
+
+    Events are ordered by their client ``timestamp`` and may be held back
+    until the watermark passes them (see event_watermark.py).
+    """
+    now = time.time() if now is None else now
+    released = event_watermark.admit(profile, events, now)
+    if released:
+        _apply_released(profile, released)
+        update_derived_metrics(profile)
+
+
+def _apply_released(profile: UserProfile, released) -> None:
+    for ts, _, _, data in released:
+        _apply_event_fields(profile, data, ts)
+        profile.last_event_at = ts
+
+
+def _apply_event_fields(profile: UserProfile, data: Dict[str, Any], now: float) -> None:
+    # Update visit count
+    if data.get('event') == 'session_start':
+        profile.visit_count += 1
+
+    # Track page views
+    if data.get('event') == 'page_view':
+        page = data.get('page', '')
+        profile.page_views.append(page, now, data.get('time_spent', 0))
+
+        # Update interests based on page
+        categories = page_taxonomy.categories(page)
+        if 'pricing' in categories:
+            interest_decay.bump(profile, 'pricing_interest', 0.2, now)
+        if 'content' in categories:
+            interest_decay.bump(profile, 'content_interest', 0.1, now)
+
+    # Latest known device wins
+    if data.get('device_type'):
+        for field in DEVICE_FIELDS:
+            if data.get(field):
+                profile[field] = data[field]
+
+    # Update session time
+    if data.get('session_time'):
+        profile.total_session_time += data.get('session_time')
+
+
+def update_derived_metrics(profile: UserProfile) -> None:
+    """Recompute the metrics the optimization rules read"""
+    profile.avg_session_time = profile.total_session_time / max(1, profile.visit_count)
+    # The history is bounded, but its length is the exact number of views ever recorded
+    profile.page_depth = len(profile.page_views)
+    profile.bounce_rate = 1.0 if profile.page_depth <= 1 else 0.0
@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterator, Optional
+
+from profile_events import current_values, serialize_profile
+from profile_store import Position
+from rule_table import DecisionTable, DEFAULT_VARIANT
+
+EXPORT_PAGE_SIZE = 500
+
+
+def encode_cursor(position: Position) -> str:
+    """Opaque, URL-safe form of an export position"""
+    return base64.urlsafe_b64encode(json.dumps(list(position)).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Position:
+    try:
+        shard, user_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError("Invalid export cursor") from e
+    if not isinstance(shard, int) or not isinstance(user_id, str):
+        raise ValueError("Invalid export cursor")
+    return shard, user_id
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[str]:
+    """Normalize an ISO 8601 bound so it compares correctly with stored ``created_at`` strings"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError as e:
+        raise ValueError(f"Invalid timestamp: {value}") from e
+
+
+class ExportFilter:
+    """Which profiles an export includes; unset criteria match everyone"""
+
+    def __init__(self,
+                 rules: DecisionTable,
+                 created_after: Optional[str] = None,
+                 created_before: Optional[str] = None,
+                 variant: Optional[str] = None,
+                 min_visits: Optional[int] = None):
+        self.rules = rules
+        self.created_after = created_after
+        self.created_before = created_before
+        self.variant = variant
+        self.min_visits = min_visits
+
+    def matches(self, profile: Dict[str, Any], now: float) -> bool:
+        created_at = profile.get('created_at') or ''
+        if self.created_after and created_at < self.created_after:
+            return False
+        if self.created_before and created_at >= self.created_before:
+            return False
+        if self.min_visits is not None and profile.get('visit_count', 0) < self.min_visits:
+            return False
+        if self.variant is not None:
+            rule = self.rules.decide(current_values(profile, self.rules.fields, now))
+            if (rule.variant if rule else DEFAULT_VARIANT) != self.variant:
+                return False
+        return True
+
+
+def export_profiles(store,
+                    profile_filter: ExportFilter,
+                    after: Optional[Position] = None,
+                    limit: Optional[int] = None,
+                    now: Optional[float] = None,
+                    page_size: int = EXPORT_PAGE_SIZE) -> Iterator[str]:
+    """
+    Yield matching profiles as NDJSON lines, one store page at a time.
+
+    Every line carries the ``cursor`` to resume after it, so a client whose
+    stream broke, or that asked for ``limit`` profiles, continues from the
+    last line it received. Only one page (and one shard's user IDs) is
+    held in memory at a time.
+    """
+    now = time.time() if now is None else now
+    remaining = limit
+    if remaining is not None and remaining <= 0:
+        return
+    for page in store.pages(after, page_size):
+        for position, profile in page:
+            if not profile_filter.matches(profile, now):
+                continue
+            record = {"user_id": position[1], "cursor": encode_cursor(position),
+                      "profile": serialize_profile(profile, now, copy=False)}
+            yield json.dumps(record, separators=(',', ':'), default=str) + '\n'
+            if remaining is not None:
+                remaining -= 1
+                if not remaining:
+                    return
@@ -0,0 +1,374 @@
+import glob
+import json
+import os
+import pickle
+import threading
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+from page_history import page_interner
+from profile_events import new_profile, profile_from_dict, apply_events, DEFAULT_HISTORY_SIZE
+from profile_store import ProfileStore
+
+# When appended log records are forced to disk
+FSYNC_ALWAYS = 'always'      # fsync after every record: no loss, lowest throughput
+FSYNC_INTERVAL = 'interval'  # fsync at most every fsync_interval seconds
+FSYNC_NEVER = 'never'        # leave it to the OS; flushed on rotation and close
+FSYNC_POLICIES = (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER)
+
+SEGMENT_PREFIX = 'events-'
+SNAPSHOT_PREFIX = 'snapshot-'
+SNAPSHOT_VERSION = 1
+
+
+def _segment_path(directory: str, first_seq: int) -> str:
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{first_seq:020d}.log")
+
+
+def _snapshot_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"{SNAPSHOT_PREFIX}{seq:020d}.pkl")
+
+
+def _numbered_files(directory: str, prefix: str, suffix: str) -> List[Tuple[int, str]]:
+    """Return ``(number, path)`` pairs for files named ``<prefix><number><suffix>``, sorted"""
+    found = []
+    for path in glob.glob(os.path.join(directory, f"{prefix}*{suffix}")):
+        name = os.path.basename(path)[len(prefix):-len(suffix)]
+        if name.isdigit():
+            found.append((int(name), path))
+    return sorted(found)
+
+
+class EventLog:
+    """
+    Append-only log of profile mutations, one JSON record per line.
+
+    Every record gets a monotonically increasing ``seq``. The log is split
+    into segments named after their first ``seq`` and rotated once a segment
+    exceeds ``segment_bytes``, so segments already covered by a snapshot can
+    be deleted whole.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 segment_bytes: int = 64 * 1024 * 1024,
+                 fsync_policy: str = FSYNC_INTERVAL,
+                 fsync_interval: float = 1.0,
+                 last_seq: int = 0):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {', '.join(FSYNC_POLICIES)}")
+
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.last_seq = last_seq
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_size = 0
+        self._last_sync = time.monotonic()
+        self._dirty = False
+        self._closed = False
+
+        os.makedirs(directory, exist_ok=True)
+        self._open_segment()
+
+        self._sync_thread = None
+        if fsync_policy == FSYNC_INTERVAL:
+            self._sync_thread = threading.Thread(target=self._sync_loop, name="event-log-sync", daemon=True)
+            self._sync_thread.start()
+
+    def _open_segment(self):
+        # Always start a fresh segment. A file that already carries the next seq
+        # can only hold a torn record from a crash, so it is discarded.
+        self._file = open(_segment_path(self.directory, self.last_seq + 1), 'wb')
+        self._segment_size = 0
+
+    def _sync_locked(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+        self._dirty = False
+
+    def _sync_loop(self):
+        while not self._closed:
+            time.sleep(self.fsync_interval)
+            with self._lock:
+                if self._dirty and not self._closed:
+                    self._sync_locked()
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Write a record and return the ``seq`` assigned to it"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("event log is closed")
+
+            self.last_seq += 1
+            record['seq'] = self.last_seq
+            line = json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+            self._file.write(line)
+            self._segment_size += len(line)
+            self._dirty = True
+
+            if self.fsync_policy == FSYNC_ALWAYS:
+                self._sync_locked()
+
+            if self._segment_size >= self.segment_bytes:
+                self._sync_locked()
+                self._file.close()
+                self._open_segment()
+
+            return self.last_seq
+
+    def truncate_through(self, seq: int) -> int:
+        """Delete segments whose records all have ``seq`` <= the given one"""
+        segments = _numbered_files(self.directory, SEGMENT_PREFIX, '.log')
+        removed = 0
+        with self._lock:
+            active = self._file.name
+            for (first, path), (next_first, _) in zip(segments, segments[1:]):
+                if next_first - 1 <= seq and path != active:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            if self.fsync_policy != FSYNC_NEVER or self._dirty:
+                self._sync_locked()
+            self._file.close()
+            self._closed = True
+
+
+def read_log(directory: str, after_seq: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield logged records with ``seq`` > ``after_seq`` in order, skipping a torn final line"""
+    segments = _numbered_files(directory, SEGMENT_PREFIX, '.log')
+    for index, (first_seq, path) in enumerate(segments):
+        if index + 1 < len(segments) and segments[index + 1][0] - 1 <= after_seq:
+            continue  # the whole segment is already covered
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # partially written record from a crash
+                if record.get('seq', 0) > after_seq:
+                    yield record
+
+
+class ProfilePersistence:
+    """
+    Durability for a ProfileStore: an event log plus periodic snapshots.
+
+    Mutations are logged from inside the store's update callbacks, i.e.
+    while the user's stripe lock is held. Snapshots record, for every stripe,
+    the last ``seq`` at the moment it was copied, so recovery can load the
+    newest snapshot and replay exactly the log records it does not include.
+    """
+
+    def __init__(self,
+                 store: ProfileStore,
+                 directory: str,
+                 history_size: int = DEFAULT_HISTORY_SIZE,
+                 fsync_policy: str = FSYNC_INTERVAL,
+                 fsync_interval: float = 1.0,
+                 segment_bytes: int = 64 * 1024 * 1024,
+                 snapshot_interval: float = 300.0,
+                 keep_snapshots: int = 2):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {', '.join(FSYNC_POLICIES)}")
+
+        self.store = store
+        self.directory = directory
+        self.history_size = history_size
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.segment_bytes = segment_bytes
+        self.snapshot_interval = snapshot_interval
+        self.keep_snapshots = max(1, keep_snapshots)
+
+        self.log: Optional[EventLog] = None
+        self._recovered_seq: Optional[int] = None
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshot_thread = None
+        self.last_snapshot: Dict[str, Any] = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+    # Logging (called while the stripe lock for user_id is held)
+
+    def log_events(self, user_id: str, events: List[Dict[str, Any]], now: float) -> None:
+        if self.log:
+            self.log.append({"ts": now, "user_id": user_id, "events": events})
+
+    def log_profile(self, user_id: str, data: Dict[str, Any], now: float) -> None:
+        if self.log:
+            self.log.append({"ts": now, "user_id": user_id, "profile": data})
+
+    # Recovery
+
+    def recover(self) -> Dict[str, Any]:
+        """Restore the store from the latest readable snapshot plus the log tail"""
+        started = time.perf_counter()
+        thresholds: Dict[str, int] = {}
+        snapshot_seq = 0
+        snapshot_max_seq = 0
+        snapshot_path = None
+
+        for seq, path in reversed(_numbered_files(self.directory, SNAPSHOT_PREFIX, '.pkl')):
+            try:
+                thresholds, snapshot_max_seq = self._load_snapshot(path)
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError) as e:
+                print(f"⚠️  Skipping unreadable snapshot {path}: {e}")
+                continue
+            snapshot_seq, snapshot_path = seq, path
+            break
+        loaded_at = time.perf_counter()
+
+        replayed = 0
+        # Never hand out a seq some stripe of the snapshot already claims to include
+        last_seq = max(snapshot_seq, snapshot_max_seq)
+        for record in read_log(self.directory, snapshot_seq):
+            seq = record['seq']
+            last_seq = max(last_seq, seq)
+            if seq <= thresholds.get(record['user_id'], snapshot_seq):
+                continue  # already part of the snapshot
+            try:
+                self._replay(record)
+                replayed += 1
+            except Exception as e:
+                print(f"⚠️  Skipping unreplayable log record {seq}: {e}")
+
+        self._recovered_seq = last_seq
+        return {
+            "snapshot": snapshot_path,
+            "snapshot_seq": snapshot_seq,
+            "users": len(self.store),
+            "replayed_records": replayed,
+            "last_seq": last_seq,
+            "snapshot_load_seconds": loaded_at - started,
+            "replay_seconds": time.perf_counter() - loaded_at
+        }
+
+    def _replay(self, record: Dict[str, Any]) -> None:
+        user_id, now = record['user_id'], record['ts']
+        if 'profile' in record:
+            data = record['profile']
+            self.store.replace(user_id, lambda _: profile_from_dict(data, self.history_size, now))
+        else:
+            events = record['events']
+            self.store.update(user_id,
+                              lambda profile: apply_events(profile, events, now),
+                              factory=lambda: new_profile(self.history_size, now))
+
+    def _load_snapshot(self, path: str) -> Tuple[Dict[str, int], int]:
+        thresholds: Dict[str, int] = {}
+        loaded = []
+        with open(path, 'rb') as f:
+            header = pickle.load(f)
+            if header.get('version') != SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported snapshot version {header.get('version')}")
+            while True:
+                chunk = pickle.load(f)
+                if chunk is None:
+                    break
+                mark, batch = chunk
+                for user_id, profile in batch:
+                    thresholds[user_id] = mark
+                loaded.extend(batch)
+            trailer = pickle.load(f)
+
+        # Page IDs in the snapshot belong to the writer's interner
+        remap = [page_interner.intern(page) for page in trailer['pages']]
+        needs_remap = remap != list(range(len(remap)))
+        for user_id, profile in loaded:
+            if needs_remap:
+                profile.page_views.remap_pages(remap)
+            self.store.put(user_id, profile)
+        return thresholds, trailer['max_seq']
+
+    # Snapshots
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Write a snapshot of the store, then drop snapshots and log segments it supersedes"""
+        with self._snapshot_lock:
+            started = time.perf_counter()
+            tmp_path = os.path.join(self.directory, f"{SNAPSHOT_PREFIX}tmp-{os.getpid()}")
+            marker = (lambda: self.log.last_seq) if self.log else (lambda: 0)
+            min_mark = None
+            max_mark = 0
+            users = 0
+
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({"version": SNAPSHOT_VERSION, "created_at": time.time()}, f, pickle.HIGHEST_PROTOCOL)
+                for mark, batch in self.store.iter_stripes(marker):
+                    min_mark = mark if min_mark is None else min(min_mark, mark)
+                    max_mark = max(max_mark, mark)
+                    users += len(batch)
+                    pickle.dump((mark, batch), f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(None, f, pickle.HIGHEST_PROTOCOL)
+                # Written last: every page ID used above is already in the table
+                pickle.dump({"pages": page_interner.pages(), "max_seq": max_mark}, f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+
+            seq = min_mark or 0
+            path = _snapshot_path(self.directory, seq)
+            os.replace(tmp_path, path)
+
+            snapshots = _numbered_files(self.directory, SNAPSHOT_PREFIX, '.pkl')
+            for _, old_path in snapshots[:-self.keep_snapshots]:
+                os.remove(old_path)
+            kept = _numbered_files(self.directory, SNAPSHOT_PREFIX, '.pkl')
+            removed_segments = self.log.truncate_through(kept[0][0]) if self.log and kept else 0
+
+            self.last_snapshot = {
+                "path": path,
+                "seq": seq,
+                "users": users,
+                "bytes": os.path.getsize(path),
+                "seconds": time.perf_counter() - started,
+                "removed_segments": removed_segments,
+                "created_at": time.time()
+            }
+            return self.last_snapshot
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            try:
+                self.snapshot()
+            except Exception as e:
+                print(f"Error writing profile snapshot: {e}")
+
+    # Lifecycle
+
+    def start(self) -> None:
+        """Open the log for writing and start periodic snapshots; ``recover`` must run first"""
+        if self._recovered_seq is None:
+            raise RuntimeError("recover() must run before start() so the log continues after the last seq")
+        self.log = EventLog(self.directory,
+                            segment_bytes=self.segment_bytes,
+                            fsync_policy=self.fsync_policy,
+                            fsync_interval=self.fsync_interval,
+                            last_seq=self._recovered_seq)
+        if self.snapshot_interval > 0:
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop, name="profile-snapshots", daemon=True)
+            self._snapshot_thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self.log:
+            self.log.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "fsync_policy": self.fsync_policy,
+            "last_seq": self.log.last_seq if self.log else None,
+            "segments": len(_numbered_files(self.directory, SEGMENT_PREFIX, '.log')),
+            "last_snapshot": self.last_snapshot
+        }
@@ -0,0 +1,309 @@
+import itertools
+import threading
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from user_ids import shard_of, NUM_SHARDS
+from user_profile import UserProfile
+
+Profile = Dict[str, Any]
+# Where a user sits in export order: (shard, user ID)
+Position = Tuple[int, str]
+
+# Profile versions come from one process-wide counter, so a user's version keeps
+# increasing even when their profile object is replaced outright
+_versions = itertools.count(1)
+
+
+class _Stripe:
+    """One independently locked partition of the profile store"""
+
+    __slots__ = ('index', 'lock', 'profiles')
+
+    def __init__(self, index: int, profiles: Dict[str, Profile]):
+        self.index = index
+        self.lock = threading.Lock()
+        self.profiles = profiles
+
+
+class ProfileStore:
+    """
+    Thread-safe in-memory store for behavioral profiles.
+
+    User IDs are routed onto a fixed number of stripes by their shard (see
+    ``user_ids.shard_of``), each guarded by its own lock, so concurrent
+    requests for different users rarely contend and every read-modify-write
+    on a single profile is atomic. ``num_stripes`` should divide 256.
+
+    Every write stamps the profile with a new ``version``. An optional
+    ``observer`` is told about every write, with the stripe lock
+    still held, through ``profile_changed(user_id, profile)`` and
+    ``profile_removed(user_id)`` (see VariantTracker).
+    """
+
+    def __init__(self, num_stripes: int = 64):
+        if num_stripes < 1:
+            raise ValueError("num_stripes must be at least 1")
+        self.num_stripes = num_stripes
+        self.observer = None
+        self._stripes = [_Stripe(index, self._new_stripe_map()) for index in range(num_stripes)]
+
+    # Storage hooks, always called with the stripe lock held. Subclasses
+    # override these to change where profiles live (see TieredProfileStore).
+
+    def _new_stripe_map(self) -> Dict[str, Profile]:
+        return {}
+
+    def _lookup(self, stripe: _Stripe, user_id: str) -> Optional[Profile]:
+        return stripe.profiles.get(user_id)
+
+    def _insert(self, stripe: _Stripe, user_id: str, profile: Profile) -> None:
+        stripe.profiles[user_id] = profile
+
+    def _delete(self, stripe: _Stripe, user_id: str) -> None:
+        del stripe.profiles[user_id]
+
+    def _peek(self, stripe: _Stripe, user_id: str) -> Optional[Profile]:
+        """Like _lookup, but for bulk reads that must not count as use"""
+        return stripe.profiles.get(user_id)
+
+    def _contains(self, stripe: _Stripe, user_id: str) -> bool:
+        return user_id in stripe.profiles
+
+    def _stripe_len(self, stripe: _Stripe) -> int:
+        return len(stripe.profiles)
+
+    def _stripe_items(self, stripe: _Stripe) -> Iterator[Tuple[str, Profile]]:
+        return iter(stripe.profiles.items())
+
+    def _stripe_keys(self, stripe: _Stripe) -> Iterator[str]:
+        return iter(stripe.profiles)
+
+    def _changed(self, user_id: str, profile: Profile) -> None:
+        if isinstance(profile, UserProfile):
+            profile.version = next(_versions)
+        if self.observer is not None:
+            self.observer.profile_changed(user_id, profile)
+
+    def _removed(self, user_id: str) -> None:
+        if self.observer is not None:
+            self.observer.profile_removed(user_id)
+
+    def _stripe_index(self, user_id: str) -> int:
+        return shard_of(user_id) % self.num_stripes
+
+    def _stripe(self, user_id: str) -> _Stripe:
+        return self._stripes[self._stripe_index(user_id)]
+
+    def __contains__(self, user_id: str) -> bool:
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            return self._contains(stripe, user_id)
+
+    def __len__(self) -> int:
+        return sum(self._stripe_len(stripe) for stripe in self._stripes)
+
+    def get(self, user_id: str, default: Optional[Profile] = None) -> Optional[Profile]:
+        """Return a consistent copy of a profile, or ``default`` if unknown"""
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            profile = self._lookup(stripe, user_id)
+            if profile is None:
+                return default
+            return copy_profile(profile)
+
+    def read(self, user_id: str, reader: Callable[[Profile], Any], default: Any = None) -> Any:
+        """Run ``reader`` against a profile while holding its stripe lock"""
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            profile = self._lookup(stripe, user_id)
+            if profile is None:
+                return default
+            return reader(profile)
+
+    def update(self,
+               user_id: str,
+               mutator: Callable[[Profile], Any],
+               factory: Optional[Callable[[], Profile]] = None) -> Any:
+        """
+        Atomically apply ``mutator`` to a profile and return its result.
+
+        If the user is unknown the profile is created with ``factory`` first;
+        without a factory a ``KeyError`` is raised instead.
+        """
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            return self._apply(stripe, user_id, mutator, factory)
+
+    def _apply(self,
+               stripe: _Stripe,
+               user_id: str,
+               mutator: Callable[[Profile], Any],
+               factory: Optional[Callable[[], Profile]]) -> Any:
+        """Run one update with the stripe lock held; a mutator that raises leaves no new profile and no change"""
+        profile = self._lookup(stripe, user_id)
+        created = profile is None
+        if created:
+            if factory is None:
+                raise KeyError(user_id)
+            profile = factory()
+            self._insert(stripe, user_id, profile)
+        try:
+            result = mutator(profile)
+        except Exception:
+            if created:
+                self._delete(stripe, user_id)
+            raise
+        self._changed(user_id, profile)
+        return result
+
+    def update_many(self,
+                    mutators: Dict[str, Callable[[Profile], Any]],
+                    factory: Optional[Callable[[], Profile]] = None,
+                    errors: Optional[Dict[str, Exception]] = None) -> Dict[str, Any]:
+        """
+        Apply one mutator per user, taking each stripe lock only once.
+
+        Every individual profile update is atomic; the batch as a whole is not.
+        If ``errors`` is given, a mutator that raises is recorded there under
+        its user and the other users are still updated.
+        """
+        by_stripe: Dict[int, List[str]] = {}
+        for user_id in mutators:
+            by_stripe.setdefault(self._stripe_index(user_id), []).append(user_id)
+
+        results: Dict[str, Any] = {}
+        for index, user_ids in by_stripe.items():
+            stripe = self._stripes[index]
+            with stripe.lock:
+                for user_id in user_ids:
+                    try:
+                        results[user_id] = self._apply(stripe, user_id, mutators[user_id], factory)
+                    except Exception as e:
+                        if errors is None:
+                            raise
+                        errors[user_id] = e
+        return results
+
+    def replace(self, user_id: str, builder: Callable[[Optional[Profile]], Profile]) -> Profile:
+        """Atomically swap in ``builder(current_profile_or_None)`` as the user's profile"""
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            profile = builder(self._lookup(stripe, user_id))
+            self._insert(stripe, user_id, profile)
+            self._changed(user_id, profile)
+            return profile
+
+    def put(self, user_id: str, profile: Profile) -> None:
+        """Insert or replace a whole profile"""
+        stripe = self._stripe(user_id)
+        with stripe.lock:
+            self._insert(stripe, user_id, profile)
+            self._changed(user_id, profile)
+
+    def put_many(self, profiles: Dict[str, Profile]) -> None:
+        """Insert or replace several profiles"""
+        for user_id, profile in profiles.items():
+            self.put(user_id, profile)
+
+    def items(self) -> Iterator[Tuple[str, Profile]]:
+        """
+        Iterate over copies of all profiles.
+
+        Each stripe is copied under its lock, so every profile is internally
+        consistent, but the store as a whole is not frozen while iterating.
+        """
+        for stripe in self._stripes:
+            with stripe.lock:
+                batch: List[Tuple[str, Profile]] = [
+                    (user_id, copy_profile(profile)) for user_id, profile in self._stripe_items(stripe)
+                ]
+            yield from batch
+
+    def scan(self, reader: Callable[[Profile], Any]) -> Iterator[Any]:
+        """
+        Yield ``reader(profile)`` for every profile without copying them.
+
+        ``reader`` runs with the profile's stripe lock held, one stripe at a
+        time, so it must be quick and must not keep the profile.
+        """
+        for stripe in self._stripes:
+            with stripe.lock:
+                batch = [reader(profile) for _, profile in self._stripe_items(stripe)]
+            yield from batch
+
+    def iter_stripes(self, marker: Optional[Callable[[], Any]] = None) -> Iterator[Tuple[Any, List[Tuple[str, Profile]]]]:
+        """
+        Yield ``(mark, [(user_id, profile copy), ...])`` one stripe at a time.
+
+        ``marker`` is called while the stripe lock is held, so it can record
+        exactly which updates the copied profiles already include.
+        """
+        for stripe in self._stripes:
+            with stripe.lock:
+                mark = marker() if marker else None
+                batch = [(user_id, copy_profile(profile)) for user_id, profile in self._stripe_items(stripe)]
+            yield mark, batch
+
+    def page(self, after: Optional[Position] = None, limit: int = 1000) -> List[Tuple[Position, Profile]]:
+        """
+        Return up to ``limit`` ``((shard, user_id), profile copy)`` pairs in
+        (shard, user ID) order, starting after the position ``after``.
+
+        That order does not depend on the stripe count or on insertion order,
+        so passing the last position of one page as ``after`` resumes where
+        it stopped, even across restarts. To read many pages, use ``pages``.
+        """
+        return next(self.pages(after, limit), [])
+
+    def pages(self, after: Optional[Position] = None, page_size: int = 1000) -> Iterator[List[Tuple[Position, Profile]]]:
+        """
+        Yield consecutive ``page`` results from ``after`` to the end of the store.
+
+        Each shard's user IDs are collected and sorted in one pass over its
+        stripe, then read ``page_size`` at a time, taking the stripe lock
+        once per page. Users added to a shard after it was collected are
+        not returned. Memory use is bounded by one shard's IDs plus a page.
+        """
+        shard, last = after if after is not None else (0, None)
+        batch: List[Tuple[Position, Profile]] = []
+        while shard < NUM_SHARDS:
+            stripe = self._stripes[shard % self.num_stripes]
+            with stripe.lock:
+                user_ids = sorted(user_id for user_id in self._stripe_keys(stripe)
+                                  if shard_of(user_id) == shard and (last is None or user_id > last))
+            start = 0
+            while start < len(user_ids):
+                chunk = user_ids[start:start + page_size - len(batch)]
+                start += len(chunk)
+                with stripe.lock:
+                    for user_id in chunk:
+                        profile = self._peek(stripe, user_id)
+                        if profile is not None:  # removed since the shard was collected
+                            batch.append(((shard, user_id), copy_profile(profile)))
+                if len(batch) == page_size:
+                    yield batch
+                    batch = []
+            shard, last = shard + 1, None
+        if batch:
+            yield batch
+
+    def user_ids(self) -> List[str]:
+        """Return a snapshot of all known user IDs"""
+        result: List[str] = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                result.extend(self._stripe_keys(stripe))
+        return result
+
+
+def copy_profile(profile: Profile) -> Profile:
+    """Copy a profile deeply enough that later updates cannot leak into it"""
+    if isinstance(profile, UserProfile):
+        return profile.copy()
+    copied = dict(profile)
+    page_views = copied.get('page_views')
+    if isinstance(page_views, list):
+        copied['page_views'] = list(page_views)
+    elif page_views is not None:
+        copied['page_views'] = page_views.copy()
+    return copied
@@ -0,0 +1,166 @@
+import math
+import operator
+from typing import Dict, Any, Iterable, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_VARIANT = "default"
+
+# Each operator works on scalars and elementwise on NumPy columns
+OPERATORS = {
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+# Fields a rule can test, compared against numbers or against strings. Histories
+# (page_views) and timestamps (created_at, *_updated_at) are not rule inputs.
+NUMERIC_RULE_FIELDS = frozenset({'visit_count', 'total_session_time', 'pricing_interest', 'content_interest',
+                                 'avg_session_time', 'page_depth', 'bounce_rate'})
+CATEGORICAL_RULE_FIELDS = frozenset({'device_type', 'os', 'browser'})
+RULE_FIELDS = NUMERIC_RULE_FIELDS | CATEGORICAL_RULE_FIELDS
+
+
+class Condition(NamedTuple):
+    field: str
+    op: str
+    threshold: Any
+
+
+class Rule(NamedTuple):
+    name: str
+    conditions: Tuple[Condition, ...]
+    variant: str
+    reason: str
+    priority: int = 0
+
+
+def parse_rule(name: str, definition: Mapping[str, Any]) -> Rule:
+    """
+    Build a rule from its declarative form, e.g.
+    ``{"when": [["visit_count", ">=", 3]], "variant": "pricing_focused", "reason": "...", "priority": 0}``.
+    Every condition must hold for the rule to fire.
+    """
+    conditions = []
+    for field, op, threshold in definition.get("when", ()):
+        if field not in RULE_FIELDS:
+            raise ValueError(f"Rule {name}: unknown profile field {field!r}")
+        if op not in OPERATORS:
+            raise ValueError(f"Rule {name}: unknown operator {op!r}")
+        if field in CATEGORICAL_RULE_FIELDS:
+            if not isinstance(threshold, str):
+                raise ValueError(f"Rule {name}: threshold for {field} must be a string")
+            if op not in ("==", "!="):
+                raise ValueError(f"Rule {name}: string thresholds only support == and !=")
+        elif isinstance(threshold, bool) or not isinstance(threshold, (int, float)) or (
+                isinstance(threshold, float) and not math.isfinite(threshold)):
+            raise ValueError(f"Rule {name}: threshold for {field} must be a finite number")
+        conditions.append(Condition(field, op, threshold))
+    if not conditions:
+        raise ValueError(f"Rule {name}: needs at least one condition")
+    return Rule(name, tuple(conditions), definition["variant"], definition.get("reason", ""),
+                int(definition.get("priority", 0)))
+
+
+class DecisionTable:
+    """
+    Rules compiled into a first-match decision table.
+
+    Rules are checked in descending priority; rules of equal priority keep
+    the order they were given in, so a rule set without priorities behaves
+    exactly like the ordered list it came from. A missing field reads as 0.
+
+    Each row is one rule's conditions as (field, operator, threshold).
+    ``decide`` evaluates a single profile, with the table compiled down to
+    plain comparisons. ``decide_batch`` evaluates NumPy columns of many
+    profiles at once: each rule is a vectorized AND over its conditions,
+    applied only to rows no higher rule has claimed.
+    """
+
+    def __init__(self, rules: Iterable[Rule]):
+        self.rules: Tuple[Rule, ...] = tuple(sorted(rules, key=lambda rule: -rule.priority))
+        self.fields: Tuple[str, ...] = tuple(dict.fromkeys(
+            condition.field for rule in self.rules for condition in rule.conditions
+        ))
+        self._rows = [
+            tuple((c.field, OPERATORS[c.op], c.threshold) for c in rule.conditions)
+            for rule in self.rules
+        ]
+        self.decide = self._compile_decide()
+        self.variants: Tuple[str, ...] = tuple(dict.fromkeys(
+            [DEFAULT_VARIANT] + [rule.variant for rule in self.rules]
+        ))
+        # Fields compared against strings stay as text columns; the rest are float64
+        self._text_fields = frozenset(
+            c.field for rule in self.rules for c in rule.conditions if isinstance(c.threshold, str)
+        )
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def _compile_decide(self):
+        """
+        Generate ``decide`` as straight-line Python: one ``if`` per rule with its
+        conditions inlined, short-circuiting like hand-written triggers would.
+        """
+        lines = ["def decide(profile):", "    get = profile.get"]
+        for index, rule in enumerate(self.rules):
+            test = " and ".join(f"get({c.field!r}, 0) {c.op} {c.threshold!r}" for c in rule.conditions)
+            lines += [f"    if {test}:", f"        return rules[{index}]"]
+        lines.append("    return None")
+        namespace = {"rules": self.rules}
+        exec(compile("\n".join(lines), f"<decision table {id(self):x}>", "exec"), namespace)
+        decide = namespace["decide"]
+        decide.__doc__ = "Return the first rule the profile satisfies, or None for the default experience"
+        return decide
+
+    def columns(self, profiles: Iterable[Mapping[str, Any]]) -> Tuple[Dict[str, np.ndarray], int]:
+        """Collect the fields the rules read from many profiles into NumPy columns; returns (columns, rows)"""
+        profiles = profiles if isinstance(profiles, list) else list(profiles)
+        columns = {
+            field: np.array([profile.get(field, 0) for profile in profiles],
+                            dtype=None if field in self._text_fields else np.float64)
+            for field in self.fields
+        }
+        return columns, len(profiles)
+
+    def decide_batch(self, columns: Mapping[str, np.ndarray], size: int) -> np.ndarray:
+        """Return the index into ``rules`` of each row's matching rule, or -1 for none"""
+        decisions = np.full(size, -1, dtype=np.int32)
+        undecided = np.ones(size, dtype=bool)
+        for index, row in enumerate(self._rows):
+            matched = undecided.copy()
+            for field, op, threshold in row:
+                matched &= op(columns[field], threshold)
+            decisions[matched] = index
+            undecided &= ~matched
+        return decisions
+
+    def evaluate(self, profiles: Iterable[Mapping[str, Any]]) -> np.ndarray:
+        """``decide_batch`` over profiles, in iteration order"""
+        return self.decide_batch(*self.columns(profiles))
+
+    def variant_counts(self, decisions: np.ndarray) -> Dict[str, int]:
+        """Count users per variant, default included, from ``decide_batch`` output"""
+        counts = dict.fromkeys(self.variants, 0)
+        per_rule = np.bincount(decisions + 1, minlength=len(self.rules) + 1)
+        counts[DEFAULT_VARIANT] += int(per_rule[0])
+        for rule, count in zip(self.rules, per_rule[1:]):
+            counts[rule.variant] += int(count)
+        return counts
+
+
+def compile_rules(definitions: Mapping[str, Mapping[str, Any]], names: Optional[Sequence[str]] = None) -> DecisionTable:
+    """Compile the named rules, in the given order, or all of them"""
+    if names is None:
+        names = list(definitions)
+    unknown = [name for name in names if name not in definitions]
+    if unknown:
+        raise ValueError(f"Unknown optimization rules: {', '.join(unknown)}")
+    return DecisionTable(parse_rule(name, definitions[name]) for name in names)
@@ -0,0 +1,351 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+
+from page_history import PageViewHistory
+from user_agents import DEVICE_TYPES, OS_FAMILIES, BROWSER_FAMILIES
+from user_profile import UserProfile
+from profile_store import Position
+from user_ids import shard_of, NUM_SHARDS
+
+Profile = Dict[str, Any]
+
+MAGIC = b'PSTORE01'
+LAYOUT_VERSION = 5
+
+# magic, layout version, capacity, stripes, slots per stripe
+HEADER = struct.Struct('<8sIQII')
+HEADER_SIZE = 64
+
+# state, key length, key, the numeric profile fields, device/OS/browser codes, then the
+# profile version, bumped on every write by whichever process makes it
+RECORD = struct.Struct('<BB62sqdddqdddddBBBq')
+VERSION_OFFSET = RECORD.size - 8
+MAX_KEY_BYTES = 62
+SLOT_EMPTY = 0
+SLOT_USED = 1
+
+# Byte offsets used only as fcntl lock ranges, far past the end of the data
+LOCK_BASE = 1 << 40
+INIT_LOCK = LOCK_BASE
+
+
+def _key_bytes(user_id: str) -> bytes:
+    key = user_id.encode('utf-8')
+    if len(key) > MAX_KEY_BYTES:
+        key = b'#' + hashlib.blake2b(key, digest_size=30).hexdigest().encode('ascii')
+    return key
+
+
+def _key_hash(key: bytes) -> int:
+    # Must be identical in every process, so Python's randomized hash() won't do
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+def _code(values: Tuple[str, ...], value: Optional[str]) -> int:
+    # Index 0 is "unknown"
+    return values.index(value) if value in values else 0
+
+
+class SharedProfileStore:
+    """
+    Profile store shared by several server processes through an mmap'd file.
+
+    Each user gets a fixed-layout record with the numeric profile fields
+    (visit_count, total_session_time, interests and their last-update times,
+    page_depth, bounce_rate, avg_session_time, created_at) and the device,
+    OS and browser as indexes into the user_agents value lists; other
+    strings are stored as "unknown", plus the profile version, which every
+    write increments. Records live in an open-addressing hash table split
+    into stripes; a key only ever probes inside its own stripe, so one
+    stripe lock (a thread lock plus an fcntl byte-range lock for other
+    processes) makes every read-modify-write atomic across all workers.
+
+    Page-view history is not shared: profiles read from this store carry an
+    empty history whose length is the shared page_depth. Records are never
+    deleted, so ``capacity`` must cover every user the deployment will see.
+    """
+
+    def __init__(self, path: str, capacity: int = 1_000_000, num_stripes: int = 64):
+        if num_stripes < 1:
+            raise ValueError("num_stripes must be at least 1")
+
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, INIT_LOCK)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                slots_per_stripe = -(-capacity // num_stripes)
+                self._layout(num_stripes, slots_per_stripe)
+                os.ftruncate(self._fd, self._size)
+                self._mm = mmap.mmap(self._fd, self._size)
+                HEADER.pack_into(self._mm, 0, MAGIC, LAYOUT_VERSION, self.capacity, num_stripes, slots_per_stripe)
+            else:
+                with open(path, 'rb') as f:
+                    magic, version, _, stored_stripes, slots_per_stripe = HEADER.unpack(f.read(HEADER.size))
+                if magic != MAGIC or version != LAYOUT_VERSION:
+                    raise ValueError(f"{path} is not a version {LAYOUT_VERSION} shared profile store")
+                # An existing file wins: every process must agree on the layout
+                self._layout(stored_stripes, slots_per_stripe)
+                self._mm = mmap.mmap(self._fd, self._size)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, INIT_LOCK)
+
+        self._thread_locks = [threading.Lock() for _ in range(self.num_stripes)]
+
+    def _layout(self, num_stripes: int, slots_per_stripe: int):
+        self.num_stripes = num_stripes
+        self.slots_per_stripe = slots_per_stripe
+        self.capacity = num_stripes * slots_per_stripe
+        # Per-stripe occupancy counters follow the header
+        self._counts_offset = HEADER_SIZE
+        self._slots_offset = HEADER_SIZE + 8 * num_stripes
+        self._size = self._slots_offset + RECORD.size * self.capacity
+
+    @contextmanager
+    def _locked(self, stripe: int):
+        with self._thread_locks[stripe]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, LOCK_BASE + 1 + stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, LOCK_BASE + 1 + stripe)
+
+    def _stripe_index(self, user_id: str) -> int:
+        return shard_of(user_id) % self.num_stripes
+
+    def _find(self, user_id: str, key: bytes) -> Tuple[int, int, bool]:
+        """Return ``(stripe, slot offset, found)``; the offset is the free slot if not found"""
+        stripe = self._stripe_index(user_id)
+        start = _key_hash(key) % self.slots_per_stripe
+        base = self._slots_offset + stripe * self.slots_per_stripe * RECORD.size
+        for probe in range(self.slots_per_stripe):
+            offset = base + ((start + probe) % self.slots_per_stripe) * RECORD.size
+            state, key_len = self._mm[offset], self._mm[offset + 1]
+            if state == SLOT_EMPTY:
+                return stripe, offset, False
+            if self._mm[offset + 2:offset + 2 + key_len] == key:
+                return stripe, offset, True
+        return stripe, -1, False
+
+    def _count(self, stripe: int) -> int:
+        return struct.unpack_from('<q', self._mm, self._counts_offset + 8 * stripe)[0]
+
+    def _decode(self, offset: int) -> Profile:
+        (_, _, _, visit_count, total_session_time, pricing_interest, content_interest,
+         page_depth, bounce_rate, avg_session_time, created_at,
+         pricing_updated_at, content_updated_at,
+         device_code, os_code, browser_code, version) = RECORD.unpack_from(self._mm, offset)
+        page_views = PageViewHistory(1)
+        page_views.total_views = page_depth
+        profile = UserProfile(
+            page_views,
+            datetime.fromtimestamp(created_at).isoformat(),
+            visit_count=visit_count,
+            total_session_time=total_session_time,
+            pricing_interest=pricing_interest,
+            content_interest=content_interest,
+            pricing_interest_updated_at=pricing_updated_at or None,
+            content_interest_updated_at=content_updated_at or None,
+            device_type=DEVICE_TYPES[device_code],
+            os=OS_FAMILIES[os_code],
+            browser=BROWSER_FAMILIES[browser_code],
+            avg_session_time=avg_session_time,
+            page_depth=page_depth,
+            bounce_rate=bounce_rate
+        )
+        profile.version = version
+        return profile
+
+    def _encode(self, offset: int, key: bytes, profile: Profile) -> None:
+        created_at = profile.get("created_at")
+        created_ts = datetime.fromisoformat(created_at).timestamp() if created_at else 0.0
+        # Unclaimed slots are zeroed, so a new record starts at version 1
+        version = struct.unpack_from('<q', self._mm, offset + VERSION_OFFSET)[0] + 1
+        RECORD.pack_into(
+            self._mm, offset, SLOT_USED, len(key), key,
+            int(profile.get("visit_count", 0)),
+            float(profile.get("total_session_time", 0)),
+            float(profile.get("pricing_interest", 0)),
+            float(profile.get("content_interest", 0)),
+            int(profile.get("page_depth", len(profile.get("page_views") or ()))),
+            float(profile.get("bounce_rate", 0)),
+            float(profile.get("avg_session_time", 0)),
+            created_ts,
+            float(profile.get("pricing_interest_updated_at") or 0),
+            float(profile.get("content_interest_updated_at") or 0),
+            _code(DEVICE_TYPES, profile.get("device_type")),
+            _code(OS_FAMILIES, profile.get("os")),
+            _code(BROWSER_FAMILIES, profile.get("browser")),
+            version
+        )
+        if isinstance(profile, UserProfile):
+            profile.version = version
+
+    def _claim(self, stripe: int, offset: int, user_id: str) -> None:
+        if offset < 0:
+            raise RuntimeError(f"Shared profile store stripe {stripe} is full; cannot add {user_id}")
+        counter = self._counts_offset + 8 * stripe
+        struct.pack_into('<q', self._mm, counter, self._count(stripe) + 1)
+
+    def _release(self, stripe: int) -> None:
+        counter = self._counts_offset + 8 * stripe
+        struct.pack_into('<q', self._mm, counter, self._count(stripe) - 1)
+
+    def __contains__(self, user_id: str) -> bool:
+        key = _key_bytes(user_id)
+        stripe = self._stripe_index(user_id)
+        with self._locked(stripe):
+            return self._find(user_id, key)[2]
+
+    def __len__(self) -> int:
+        return sum(self._count(stripe) for stripe in range(self.num_stripes))
+
+    def get(self, user_id: str, default: Optional[Profile] = None) -> Optional[Profile]:
+        return self.read(user_id, lambda profile: profile, default)
+
+    def read(self, user_id: str, reader: Callable[[Profile], Any], default: Any = None) -> Any:
+        key = _key_bytes(user_id)
+        with self._locked(self._stripe_index(user_id)):
+            _, offset, found = self._find(user_id, key)
+            if not found:
+                return default
+            return reader(self._decode(offset))
+
+    def update(self,
+               user_id: str,
+               mutator: Callable[[Profile], Any],
+               factory: Optional[Callable[[], Profile]] = None) -> Any:
+        key = _key_bytes(user_id)
+        with self._locked(self._stripe_index(user_id)):
+            return self._update_locked(user_id, key, mutator, factory)
+
+    def _update_locked(self, user_id, key, mutator, factory):
+        stripe, offset, found = self._find(user_id, key)
+        if found:
+            profile = self._decode(offset)
+        else:
+            if factory is None:
+                raise KeyError(user_id)
+            self._claim(stripe, offset, user_id)
+            profile = factory()
+        try:
+            result = mutator(profile)
+        except Exception:
+            # Nothing is written, so only the claimed slot count needs undoing
+            if not found:
+                self._release(stripe)
+            raise
+        self._encode(offset, key, profile)
+        return result
+
+    def update_many(self,
+                    mutators: Dict[str, Callable[[Profile], Any]],
+                    factory: Optional[Callable[[], Profile]] = None,
+                    errors: Optional[Dict[str, Exception]] = None) -> Dict[str, Any]:
+        by_stripe: Dict[int, List[str]] = {}
+        for user_id in mutators:
+            by_stripe.setdefault(self._stripe_index(user_id), []).append(user_id)
+
+        results: Dict[str, Any] = {}
+        for stripe, user_ids in by_stripe.items():
+            with self._locked(stripe):
+                for user_id in user_ids:
+                    try:
+                        results[user_id] = self._update_locked(user_id, _key_bytes(user_id), mutators[user_id], factory)
+                    except Exception as e:
+                        if errors is None:
+                            raise
+                        errors[user_id] = e
+        return results
+
+    def replace(self, user_id: str, builder: Callable[[Optional[Profile]], Profile]) -> Profile:
+        key = _key_bytes(user_id)
+        with self._locked(self._stripe_index(user_id)):
+            stripe, offset, found = self._find(user_id, key)
+            profile = builder(self._decode(offset) if found else None)
+            if not found:
+                self._claim(stripe, offset, user_id)
+            self._encode(offset, key, profile)
+            return profile
+
+    def put(self, user_id: str, profile: Profile) -> None:
+        self.replace(user_id, lambda _: profile)
+
+    def put_many(self, profiles: Dict[str, Profile]) -> None:
+        for user_id, profile in profiles.items():
+            self.put(user_id, profile)
+
+    def _stripe_keys(self, stripe: int) -> Iterator[Tuple[str, int]]:
+        """Yield ``(user_id, record offset)`` for every used slot in the stripe"""
+        base = self._slots_offset + stripe * self.slots_per_stripe * RECORD.size
+        for slot in range(self.slots_per_stripe):
+            offset = base + slot * RECORD.size
+            if self._mm[offset] == SLOT_USED:
+                key_len = self._mm[offset + 1]
+                yield self._mm[offset + 2:offset + 2 + key_len].decode('utf-8'), offset
+
+    def _stripe_records(self, stripe: int) -> List[Tuple[str, Profile]]:
+        return [(user_id, self._decode(offset)) for user_id, offset in self._stripe_keys(stripe)]
+
+    def items(self) -> Iterator[Tuple[str, Profile]]:
+        for _, batch in self.iter_stripes():
+            yield from batch
+
+    def scan(self, reader: Callable[[Profile], Any]) -> Iterator[Any]:
+        for _, batch in self.iter_stripes():
+            yield from (reader(profile) for _, profile in batch)
+
+    def iter_stripes(self, marker: Optional[Callable[[], Any]] = None) -> Iterator[Tuple[Any, List[Tuple[str, Profile]]]]:
+        for stripe in range(self.num_stripes):
+            with self._locked(stripe):
+                mark = marker() if marker else None
+                batch = self._stripe_records(stripe)
+            yield mark, batch
+
+    def page(self, after: Optional[Position] = None, limit: int = 1000) -> List[Tuple[Position, Profile]]:
+        """
+        Same (shard, user ID) order as ProfileStore.page. IDs too long to
+        store are kept as a hash that no longer carries their shard, so
+        those sort under their stripe's index instead.
+        """
+        return next(self.pages(after, limit), [])
+
+    def pages(self, after: Optional[Position] = None, page_size: int = 1000) -> Iterator[List[Tuple[Position, Profile]]]:
+        """Same as ProfileStore.pages; slots are never freed, so collected offsets stay valid"""
+        shard, last = after if after is not None else (0, None)
+        batch: List[Tuple[Position, Profile]] = []
+        while shard < NUM_SHARDS:
+            stripe = shard % self.num_stripes
+            with self._locked(stripe):
+                keys = sorted(
+                    (user_id, offset) for user_id, offset in self._stripe_keys(stripe)
+                    if (stripe if user_id.startswith('#') else shard_of(user_id)) == shard
+                    and (last is None or user_id > last)
+                )
+            start = 0
+            while start < len(keys):
+                chunk = keys[start:start + page_size - len(batch)]
+                start += len(chunk)
+                with self._locked(stripe):
+                    batch.extend(((shard, user_id), self._decode(offset)) for user_id, offset in chunk)
+                if len(batch) == page_size:
+                    yield batch
+                    batch = []
+            shard, last = shard + 1, None
+        if batch:
+            yield batch
+
+    def user_ids(self) -> List[str]:
+        return [user_id for user_id, _ in self.items()]
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,141 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, Any, Callable, Iterator, List, Optional
+
+from rule_table import DecisionTable
+
+DEFAULT_TENANT = 'default'
+TENANT_HEADER = 'X-Site-Id'
+TENANT_PARAM = 'site'
+
+_TENANT_ID = re.compile(r'^[a-z0-9][a-z0-9_.-]{0,63}$')
+
+
+class TenantError(ValueError):
+    """A request named a malformed or unknown site"""
+
+
+def tenant_id_from_request(request) -> str:
+    """Read the site key from the X-Site-Id header or ?site=, defaulting to "default" """
+    tenant_id = (request.headers.get(TENANT_HEADER) or request.args.get(TENANT_PARAM) or DEFAULT_TENANT).strip().lower()
+    if not _TENANT_ID.match(tenant_id):
+        raise TenantError(f"Invalid site id: {tenant_id!r}")
+    return tenant_id
+
+
+def tenant_path(path: str, tenant_id: str) -> str:
+    """Per-tenant variant of a file path; the default tenant keeps the path as configured"""
+    if tenant_id == DEFAULT_TENANT:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{tenant_id}{ext}"
+
+
+class Tenant:
+    """One site's partition: its own profile store, rules, variant counts and ingest pipeline"""
+
+    def __init__(self,
+                 tenant_id: str,
+                 store,
+                 rules: DecisionTable,
+                 max_profiles: int = 0,
+                 persistence=None,
+                 ingest_queue=None,
+                 variants=None,
+                 optimize_cache=None,
+                 columns=None,
+                 decisions=None):
+        self.tenant_id = tenant_id
+        self.store = store
+        self.rules = rules
+        self.max_profiles = max_profiles
+        self.persistence = persistence
+        self.ingest_queue = ingest_queue
+        self.variants = variants
+        self.optimize_cache = optimize_cache
+        self.columns = columns
+        self.decisions = decisions
+
+    def close(self) -> None:
+        # Queued events are applied (and logged) before the log and store close
+        if self.ingest_queue:
+            self.ingest_queue.close()
+        if self.columns:
+            self.columns.close()
+        if self.variants:
+            self.variants.close()
+        if self.persistence:
+            self.persistence.close()
+        if hasattr(self.store, 'close'):
+            self.store.close()
+
+
+class TenantRegistry:
+    """
+    Creates each tenant's partition on first use and hands it out afterwards.
+
+    Tenants named in the config are always accepted. Others are created on
+    demand until ``max_tenants`` partitions exist, after which requests for
+    new sites are refused, so arbitrary X-Site-Id values cannot allocate
+    unbounded stores.
+    """
+
+    def __init__(self,
+                 factory: Callable[[str, Dict[str, Any]], Tenant],
+                 config: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_tenants: int = 32):
+        self.factory = factory
+        self.config = config or {}
+        self.max_tenants = max_tenants
+        self._tenants: Dict[str, Tenant] = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant_id: str) -> Tenant:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None:
+            return tenant
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                if not _TENANT_ID.match(tenant_id):
+                    raise TenantError(f"Invalid site id: {tenant_id!r}")
+                if tenant_id not in self.config and len(self._tenants) >= self.max_tenants:
+                    raise TenantError(f"Unknown site {tenant_id!r}: the tenant limit ({self.max_tenants}) is reached")
+                tenant = self.factory(tenant_id, self.config.get(tenant_id, {}))
+                self._tenants[tenant_id] = tenant
+            return tenant
+
+    def __contains__(self, tenant_id: str) -> bool:
+        return tenant_id in self._tenants
+
+    def __iter__(self) -> Iterator[Tenant]:
+        return iter(list(self._tenants.values()))
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    def ids(self) -> List[str]:
+        return list(self._tenants)
+
+    def close(self) -> None:
+        for tenant in self:
+            tenant.close()
+
+
+def load_tenant_config() -> Dict[str, Dict[str, Any]]:
+    """
+    Read per-site settings, e.g. TENANTS='{"shop": {"max_profiles": 50000, "rules": ["quick_browser"]}}',
+    or the same JSON object from the file at TENANTS_FILE.
+    """
+    config: Dict[str, Dict[str, Any]] = {}
+    if os.getenv('TENANTS'):
+        config = json.loads(os.getenv('TENANTS'))
+    elif os.getenv('TENANTS_FILE'):
+        with open(os.getenv('TENANTS_FILE')) as f:
+            config = json.load(f)
+    for tenant_id in config:
+        if not _TENANT_ID.match(tenant_id):
+            raise ValueError(f"Invalid site id in tenant config: {tenant_id!r}")
+    return config
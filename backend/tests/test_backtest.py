@@ -0,0 +1,45 @@
+"""
+Backtest input that cannot be replayed must be counted as rejected, not dropped.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import json
+
+from backtest import parse_line, run_backtest
+
+TS = "2024-01-15T10:30:00Z"
+
+
+def test_parse_line_marks_missing_user_or_time():
+    assert list(parse_line(json.dumps({"event": "page_view", "page": "/"}))) == [
+        (None, None, {"event": "page_view", "page": "/"})]
+    [(user_id, ts, _)] = parse_line(json.dumps({"user_id": "a", "event": "page_view", "timestamp": TS}))
+    assert user_id == "a" and ts is not None
+    # Event log record without "ts"
+    [(user_id, ts, _)] = parse_line(json.dumps({"user_id": "a", "events": [{"event": "page_view"}]}))
+    assert user_id == "a" and ts is None
+    assert list(parse_line("42")) == [(None, None, 42)]
+
+
+def test_unreplayable_events_are_rejected(tmp_path):
+    lines = [
+        {"user_id": "a", "event": "session_start", "timestamp": TS},
+        {"user_id": "a", "event": "page_view", "page": "/pricing", "timestamp": TS},
+        {"user_id": "b", "event": "page_view", "page": "/", "timestamp": TS},
+        # No user
+        {"event": "page_view", "page": "/", "timestamp": TS},
+        # No usable time
+        {"user_id": "c", "event": "page_view", "page": "/"},
+        # Event log record: one event replayable, one not an event at all
+        {"ts": 1705314600.0, "user_id": "d", "events": [{"event": "page_view", "page": "/"}, "junk"]},
+    ]
+    path = tmp_path / "events.ndjson"
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n{not json\n")
+
+    report = run_backtest([str(path)], workers=1)
+
+    assert report["events"] == 4
+    assert report["rejected"] == 4
+    assert report["users"] == 3
@@ -0,0 +1,68 @@
+"""
+Duplicate events must be dropped, and new ones kept, within the dedup window.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+from event_dedup import EventDeduplicator, RotatingBloomFilter
+
+NOW = 1_700_000_000.0
+
+
+def test_duplicates_are_dropped_once_seen():
+    dedup = EventDeduplicator(capacity=1000, window_seconds=60)
+    events = [{"event": "page_view", "event_id": "a"}, {"event": "page_view", "uuid": "b"}]
+    assert dedup.filter_new(events, NOW) == events
+    assert dedup.filter_new(events, NOW + 1) == []
+    # Repeats inside one batch count too
+    assert dedup.filter_new([{"event_id": "c"}, {"event_id": "c"}], NOW + 2) == [{"event_id": "c"}]
+    stats = dedup.stats()
+    assert stats["checked"] == 6
+    assert stats["duplicates"] == 3
+
+
+def test_events_without_an_id_are_kept():
+    dedup = EventDeduplicator(capacity=1000)
+    events = [{"event": "page_view", "page": "/"}] * 3
+    assert dedup.filter_new(events, NOW) == events
+    assert dedup.filter_new(events, NOW) == events
+
+
+def test_keys_are_remembered_for_a_window_then_forgotten():
+    bloom = RotatingBloomFilter(capacity=1000, window_seconds=60, generations=2)
+    assert bloom.add_if_absent("a", NOW)
+    assert not bloom.add_if_absent("a", NOW + 59)
+    # Rotated once: "a" is still in the older generation
+    assert not bloom.add_if_absent("a", NOW + 61)
+    # Rotated out of both generations
+    bloom.add_if_absent("other", NOW + 125)
+    assert bloom.add_if_absent("a", NOW + 190)
+
+
+def test_no_false_negatives_and_bounded_false_positives():
+    capacity, error_rate = 10_000, 0.01
+    bloom = RotatingBloomFilter(capacity, error_rate, window_seconds=3600)
+    keys = [f"event-{n}" for n in range(capacity // 2)]
+    for key in keys:
+        bloom.add_if_absent(key, NOW)
+    assert not any(bloom.add_if_absent(key, NOW) for key in keys)
+
+    fresh = [f"fresh-{n}" for n in range(capacity // 2)]
+    false_positives = sum(not bloom.add_if_absent(key, NOW) for key in fresh)
+    assert false_positives <= 3 * error_rate * len(fresh)
+
+
+def test_capacity_rotation_shortens_memory():
+    bloom = RotatingBloomFilter(capacity=100, error_rate=1e-6, window_seconds=3600, generations=2)
+    assert bloom.add_if_absent("a", NOW)
+    # Filling the filter "a" is in, then rotating once, keeps it
+    for n in range(150):
+        bloom.add_if_absent(f"k{n}", NOW)
+    assert bloom.rotations == 1
+    assert not bloom.add_if_absent("a", NOW)
+    # Filling the next filter too drops it, well inside the window
+    for n in range(150, 300):
+        bloom.add_if_absent(f"k{n}", NOW)
+    assert bloom.rotations >= 2
+    assert bloom.add_if_absent("a", NOW)
@@ -0,0 +1,116 @@
+"""
+The ingest queue must apply events in order and honor its overflow policy.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import threading
+
+import pytest
+
+from ingest_queue import IngestQueue, OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_REJECT
+
+
+class Recorder:
+    """apply_batch that records events and can be held until released"""
+
+    def __init__(self, fail=()):
+        self.applied = {}
+        self.fail = set(fail)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, groups):
+        self.started.set()
+        self.release.wait()
+        for user_id, events in groups.items():
+            if user_id not in self.fail:
+                self.applied.setdefault(user_id, []).extend(events)
+        return {user_id: ValueError("bad") for user_id in groups if user_id in self.fail}
+
+
+def held_queue(policy, max_size=3):
+    """A single-worker queue whose worker is stuck applying one item"""
+    recorder = Recorder()
+    recorder.release.clear()
+    queue = IngestQueue(recorder, max_size=max_size, overflow_policy=policy, block_timeout=0.05)
+    queue.put("busy", [{"n": 0}])
+    assert recorder.started.wait(5)
+    return queue, recorder
+
+
+def test_events_are_applied_in_order():
+    recorder = Recorder()
+    queue = IngestQueue(recorder, max_size=100, num_workers=4, max_batch=7)
+    for n in range(200):
+        assert queue.put(f"user_{n % 5}", [{"n": n}])
+    assert queue.flush(5)
+    queue.close(5)
+    for user in range(5):
+        assert [event["n"] for event in recorder.applied[f"user_{user}"]] == list(range(user, 200, 5))
+    assert queue.stats()["applied"] == 200
+
+
+@pytest.mark.parametrize("policy", [OVERFLOW_REJECT, OVERFLOW_BLOCK])
+def test_full_queue_rejects(policy):
+    queue, recorder = held_queue(policy)
+    for n in range(3):
+        assert queue.put("a", [{"n": n}])
+    assert not queue.put("a", [{"n": 3}, {"n": 4}])
+    assert not queue.put_many({"b": [{"n": 5}]})
+
+    recorder.release.set()
+    assert queue.flush(5)
+    queue.close(5)
+    stats = queue.stats()
+    assert stats["rejected"] == 3
+    assert stats["applied"] == 4
+    assert [event["n"] for event in recorder.applied["a"]] == [0, 1, 2]
+
+
+def test_full_queue_drops_oldest():
+    queue, recorder = held_queue(OVERFLOW_DROP_OLDEST)
+    for n in range(5):
+        assert queue.put("a", [{"n": n}])
+    assert queue.put_many({"b": [{"n": 5}], "c": [{"n": 6}]})
+
+    recorder.release.set()
+    assert queue.flush(5)
+    queue.close(5)
+    assert queue.stats()["dropped"] == 4
+    assert [event["n"] for event in recorder.applied["a"]] == [4]
+    assert set(recorder.applied) == {"busy", "a", "b", "c"}
+
+
+def test_blocked_put_succeeds_once_room_frees():
+    queue, recorder = held_queue(OVERFLOW_BLOCK)
+    queue.block_timeout = 5
+    for n in range(3):
+        assert queue.put("a", [{"n": n}])
+    threading.Timer(0.05, recorder.release.set).start()
+    assert queue.put("a", [{"n": 3}])
+    assert queue.flush(5)
+    queue.close(5)
+    assert [event["n"] for event in recorder.applied["a"]] == [0, 1, 2, 3]
+
+
+def test_failed_users_do_not_fail_the_batch():
+    recorder = Recorder(fail={"bad"})
+    queue = IngestQueue(recorder, max_size=100)
+    assert queue.put_many({"good": [{"n": 1}], "bad": [{"n": 2}, {"n": 3}]})
+    assert queue.flush(5)
+    queue.close(5)
+    stats = queue.stats()
+    assert stats["applied"] == 1
+    assert stats["failed"] == 2
+    assert recorder.applied == {"good": [{"n": 1}]}
+
+
+def test_closed_queue_rejects():
+    recorder = Recorder()
+    queue = IngestQueue(recorder)
+    queue.close(5)
+    assert not queue.put("a", [{"n": 1}])
+    assert not queue.put_many({"a": [{"n": 1}]})
@@ -0,0 +1,39 @@
+"""
+A URL must be in every category with a pattern anywhere in it.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import random
+
+from page_taxonomy import PageTaxonomy
+
+TAXONOMY = {
+    "pricing": ["pricing", "price"],
+    "enterprise": ["pricing/enterprise", "enterprise"],
+    "content": ["about", "blog", "docs"],
+    "unused": [],
+}
+
+
+def substring_categories(url):
+    return frozenset(category for category, patterns in TAXONOMY.items()
+                     if any(pattern in url.lower() for pattern in patterns))
+
+
+def test_overlapping_patterns_match_every_category():
+    taxonomy = PageTaxonomy({"pricing": ["pricing"], "enterprise": ["pricing/enterprise"]})
+    assert taxonomy.categories("/pricing/enterprise") == {"pricing", "enterprise"}
+    assert taxonomy.categories("/PRICING") == {"pricing"}
+    assert taxonomy.categories("") == frozenset()
+    assert taxonomy.categories(None) == frozenset()
+
+
+def test_matches_substring_scan():
+    rng = random.Random(9)
+    taxonomy = PageTaxonomy(TAXONOMY)
+    parts = ["pricing", "price", "enterprise", "Blog", "docs", "about", "careers", "/", "x"]
+    for _ in range(2000):
+        url = "/" + "".join(rng.choice(parts) for _ in range(rng.randint(0, 4)))
+        assert taxonomy.categories(url) == substring_categories(url), url
@@ -0,0 +1,118 @@
+"""
+Recovery from the event log and snapshots must rebuild the store exactly.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import os
+import random
+
+from profile_events import new_profile, apply_events, serialize_profile
+from profile_persistence import ProfilePersistence, FSYNC_NEVER, SNAPSHOT_PREFIX
+from profile_store import ProfileStore
+
+NOW = 1_700_000_000.0
+PAGES = ["/", "/pricing", "/pricing/enterprise", "/blog/launch", "/docs/install"]
+
+
+def open_persistence(directory):
+    store = ProfileStore(num_stripes=8)
+    persistence = ProfilePersistence(store, str(directory), fsync_policy=FSYNC_NEVER,
+                                     snapshot_interval=0, segment_bytes=4096)
+    recovery = persistence.recover()
+    persistence.start()
+    return store, persistence, recovery
+
+
+def track(store, persistence, rng, now, users=50):
+    user_id = f"user_{rng.randrange(users)}"
+    events = [{"event": rng.choice(["page_view", "session_start"]), "page": rng.choice(PAGES),
+               "session_time": rng.choice([0, 5, 60, 200])} for _ in range(rng.randint(1, 3))]
+
+    def mutate(profile):
+        persistence.log_events(user_id, events, now)
+        apply_events(profile, events, now)
+
+    store.update(user_id, mutate, lambda: new_profile(now=now))
+
+
+def contents(store):
+    return {user_id: serialize_profile(profile, NOW) for user_id, profile in store.items()}
+
+
+def test_log_replay_without_snapshot(tmp_path):
+    rng = random.Random(1)
+    store, persistence, _ = open_persistence(tmp_path)
+    for n in range(500):
+        track(store, persistence, rng, NOW + n)
+    persistence.close()
+
+    recovered, persistence, recovery = open_persistence(tmp_path)
+    persistence.close()
+    assert recovery["snapshot"] is None
+    assert contents(recovered) == contents(store)
+
+
+def test_snapshot_plus_log_tail(tmp_path):
+    rng = random.Random(2)
+    store, persistence, _ = open_persistence(tmp_path)
+    for n in range(300):
+        track(store, persistence, rng, NOW + n)
+    persistence.snapshot()
+    for n in range(300, 600):
+        track(store, persistence, rng, NOW + n)
+    last_seq = persistence.log.last_seq
+    persistence.close()
+
+    recovered, persistence, recovery = open_persistence(tmp_path)
+    assert recovery["snapshot"] is not None
+    assert 0 < recovery["replayed_records"] < 600
+    assert recovery["last_seq"] == last_seq
+    assert contents(recovered) == contents(store)
+
+    # The reopened log continues after the recovered seq
+    track(recovered, persistence, rng, NOW + 600)
+    assert persistence.log.last_seq == last_seq + 1
+    persistence.close()
+
+
+def test_replaced_profiles_are_recovered(tmp_path):
+    store, persistence, _ = open_persistence(tmp_path)
+    data = serialize_profile(new_profile(now=NOW), NOW)
+    data["visit_count"] = 7
+
+    def seed(_):
+        persistence.log_profile("seeded", data, NOW)
+        profile = new_profile(now=NOW)
+        profile["visit_count"] = 7
+        return profile
+
+    store.replace("seeded", seed)
+    persistence.close()
+
+    recovered, persistence, _ = open_persistence(tmp_path)
+    persistence.close()
+    assert recovered.read("seeded", lambda profile: profile["visit_count"]) == 7
+
+
+def test_unreadable_snapshot_falls_back(tmp_path):
+    rng = random.Random(3)
+    store, persistence, _ = open_persistence(tmp_path)
+    for n in range(200):
+        track(store, persistence, rng, NOW + n)
+    persistence.snapshot()
+    for n in range(200, 400):
+        track(store, persistence, rng, NOW + n)
+    persistence.snapshot()
+    persistence.close()
+
+    newest = max(name for name in os.listdir(tmp_path) if name.startswith(SNAPSHOT_PREFIX))
+    with open(tmp_path / newest, "r+b") as f:
+        f.truncate(10)
+
+    recovered, persistence, recovery = open_persistence(tmp_path)
+    persistence.close()
+    assert recovery["snapshot"] is not None
+    assert not recovery["snapshot"].endswith(newest)
+    assert contents(recovered) == contents(store)
@@ -0,0 +1,157 @@
+"""
+Every profile store backend must give the same results for batch ingest,
+and the tiered store must stay within its hot quota without losing users.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import random
+
+import pytest
+
+from profile_events import new_profile, apply_events
+from profile_store import ProfileStore
+from shared_profile_store import SharedProfileStore
+from tiered_profile_store import TieredProfileStore
+
+NOW = 1_700_000_000.0
+PAGES = ["/", "/pricing", "/pricing/enterprise", "/blog/launch", "/docs/install"]
+FIELDS = ("visit_count", "total_session_time", "page_depth", "pricing_interest", "content_interest")
+
+
+class Observer:
+    def __init__(self):
+        self.changed = []
+        self.removed = []
+
+    def profile_changed(self, user_id, profile):
+        self.changed.append(user_id)
+
+    def profile_removed(self, user_id):
+        self.removed.append(user_id)
+
+
+@pytest.fixture(params=["striped", "tiered", "tiered_spill", "shared"])
+def store(request, tmp_path):
+    if request.param == "striped":
+        store = ProfileStore(num_stripes=8)
+    elif request.param == "tiered":
+        store = TieredProfileStore(10_000, num_stripes=8)
+    elif request.param == "tiered_spill":
+        # A small hot tier forces most users through the cold tier and back
+        store = TieredProfileStore(20, spill_path=str(tmp_path / "cold.db"), num_stripes=8)
+    else:
+        store = SharedProfileStore(str(tmp_path / "profiles.shm"), capacity=10_000, num_stripes=8)
+    yield store
+    if hasattr(store, "close"):
+        store.close()
+
+
+def random_groups(rng: random.Random, users: int):
+    groups = {}
+    for _ in range(rng.randint(1, 40)):
+        event = {"event": rng.choice(["page_view", "session_start"]),
+                 "page": rng.choice(PAGES), "session_time": rng.choice([0, 5, 60, 200])}
+        groups.setdefault(f"user_{rng.randrange(users)}", []).append(event)
+    return groups
+
+
+def apply_groups(store, groups, errors=None):
+    return store.update_many(
+        {uid: (lambda profile, events=events: (apply_events(profile, events, NOW), len(events))[1])
+         for uid, events in groups.items()},
+        factory=lambda: new_profile(now=NOW),
+        errors=errors)
+
+
+def snapshot(store):
+    return {uid: tuple(round(profile[f], 6) for f in FIELDS) for uid, profile in store.items()}
+
+
+def test_batch_ingest_matches_reference(store):
+    rng = random.Random(4)
+    reference = ProfileStore(num_stripes=1)
+    for _ in range(300):
+        groups = random_groups(rng, 200)
+        assert apply_groups(store, groups, errors={}) == apply_groups(reference, groups)
+
+    assert len(store) == len(reference)
+    assert snapshot(store) == snapshot(reference)
+
+
+def test_batch_errors_are_per_user(store):
+    apply_groups(store, {"existing": [{"event": "page_view", "page": "/"}]})
+    before = store.read("existing", lambda profile: profile["visit_count"])
+
+    def fail(profile):
+        profile["visit_count"] += 100
+        raise ValueError("bad event")
+
+    errors = {}
+    results = store.update_many({"existing": fail, "new": fail, "ok": lambda profile: 1},
+                                factory=lambda: new_profile(now=NOW), errors=errors)
+
+    assert results == {"ok": 1}
+    assert set(errors) == {"existing", "new"}
+    assert all(isinstance(e, ValueError) for e in errors.values())
+    # A user created for a failed update is not left behind
+    assert "new" not in store
+    assert "ok" in store
+    assert len(store) == 2
+    if isinstance(store, SharedProfileStore):
+        # Nothing is written back when the mutator fails
+        assert store.read("existing", lambda profile: profile["visit_count"]) == before
+
+    with pytest.raises(ValueError):
+        store.update_many({"new": fail}, factory=lambda: new_profile(now=NOW))
+    assert "new" not in store
+    with pytest.raises(ValueError):
+        store.update("new", fail, lambda: new_profile(now=NOW))
+    assert "new" not in store
+
+
+@pytest.mark.parametrize("make_store", [
+    lambda: ProfileStore(num_stripes=8),
+    lambda: TieredProfileStore(10_000, num_stripes=8),
+], ids=["striped", "tiered"])
+def test_failed_update_is_not_a_change(make_store):
+    store = make_store()
+    store.observer = observer = Observer()
+    store.update("a", lambda profile: None, lambda: new_profile(now=NOW))
+    version = store.read("a", lambda profile: profile.version)
+
+    def fail(profile):
+        raise ValueError("bad event")
+
+    store.update_many({"a": fail, "b": fail}, factory=lambda: new_profile(now=NOW), errors={})
+
+    assert observer.changed == ["a"]
+    assert store.read("a", lambda profile: profile.version) == version
+    assert "b" not in store
+
+
+@pytest.mark.parametrize("spill", [False, True], ids=["discard", "spill"])
+def test_tiered_eviction_keeps_the_quota(spill, tmp_path):
+    rng = random.Random(9)
+    store = TieredProfileStore(50, spill_path=str(tmp_path / "cold.db") if spill else None, num_stripes=8)
+    store.observer = observer = Observer()
+    reference = ProfileStore(num_stripes=1)
+    for _ in range(200):
+        groups = random_groups(rng, 400)
+        apply_groups(store, groups)
+        apply_groups(reference, groups)
+        assert store.stats()["hot_profiles"] <= 50
+
+    stats = store.stats()
+    assert stats["evictions"] > 0
+    if spill:
+        # Every user survives eviction, in exactly one tier
+        assert stats["hot_profiles"] + stats["cold_profiles"] == len(store) == len(reference)
+        assert snapshot(store) == snapshot(reference)
+        assert stats["rehydrations"] > 0
+        assert not observer.removed
+    else:
+        assert len(store) == stats["hot_profiles"] == 50
+        assert stats["discarded"] == len(observer.removed) == stats["evictions"]
+    store.close()
@@ -0,0 +1,67 @@
+"""
+The rate limiter must admit exactly up to each limit per sliding window.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import random
+from collections import Counter
+
+from rate_limiter import IngestRateLimiter, WindowedCountMinSketch
+
+NOW = 1_700_000_000.0
+
+
+def test_user_limit_per_window():
+    limiter = IngestRateLimiter(user_limit=10, window_seconds=60)
+    assert limiter.admit("a", None, 4, NOW) == 4
+    assert limiter.admit("a", None, 10, NOW + 1) == 6
+    assert limiter.admit("a", None, 1, NOW + 2) == 0
+    # Other users have their own budget
+    assert limiter.admit("b", None, 10, NOW + 2) == 10
+    # Once the window has slid past the first events, the user is let through again
+    assert limiter.admit("a", None, 10, NOW + 61) == 10
+
+    stats = limiter.stats()
+    assert stats["admitted"] == 30
+    assert stats["dropped_user"] == 5
+
+
+def test_ip_limit_spans_users():
+    limiter = IngestRateLimiter(user_limit=10, ip_limit=15, window_seconds=60)
+    assert limiter.admit("a", "10.0.0.1", 10, NOW) == 10
+    assert limiter.admit("b", "10.0.0.1", 10, NOW) == 5
+    assert limiter.admit("c", "10.0.0.2", 10, NOW) == 10
+    # Without an IP only the user limit applies
+    assert limiter.admit("d", None, 10, NOW) == 10
+
+    stats = limiter.stats()
+    assert stats["dropped_user"] == 0
+    assert stats["dropped_ip"] == 5
+
+
+def test_dropped_events_do_not_count():
+    limiter = IngestRateLimiter(user_limit=5, window_seconds=60)
+    assert limiter.admit("a", None, 5, NOW) == 5
+    for second in range(1, 50):
+        assert limiter.admit("a", None, 1, NOW + second) == 0
+    # Only the 5 admitted at NOW were counted, and they have expired
+    assert limiter.admit("a", None, 5, NOW + 61) == 5
+
+
+def test_zero_limits_disable():
+    limiter = IngestRateLimiter(user_limit=0, ip_limit=0)
+    assert limiter.admit("a", "10.0.0.1", 1000, NOW) == 1000
+
+
+def test_sketch_never_undercounts():
+    rng = random.Random(11)
+    sketch = WindowedCountMinSketch(window_seconds=60, num_buckets=6, width=256, depth=4)
+    exact = Counter()
+    for _ in range(5000):
+        key = f"user_{rng.randrange(2000)}"
+        sketch.add(key, 1, NOW)
+        exact[key] += 1
+    assert all(sketch.estimate(key, NOW) >= count for key, count in exact.items())
+    assert sketch.estimate("never-seen", NOW + 120) == 0
@@ -0,0 +1,56 @@
+"""
+The compiled ``decide`` and the NumPy ``decide_batch`` must always agree.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import random
+
+from optimization_rules import OPTIMIZATION_RULES
+from rule_table import compile_rules, DEFAULT_VARIANT
+
+RULES = {
+    **OPTIMIZATION_RULES,
+    "mobile_visitor": {"when": [["device_type", "==", "Mobile"]], "variant": "mobile_optimized"},
+    "urgent_pricing": {"when": [["pricing_interest", ">=", 0.9]], "variant": "pricing_focused", "priority": 5},
+}
+
+
+def random_profile(rng: random.Random):
+    # Values sit on and around every threshold so boundary comparisons are exercised
+    profile = {
+        "visit_count": rng.choice([0, 2, 3, 4]),
+        "pricing_interest": rng.choice([0.0, 0.7, 0.71, 0.9, 1.0]),
+        "avg_session_time": rng.choice([0, 29.9, 30, 120, 121]),
+        "page_depth": rng.choice([0, 5, 6]),
+        "bounce_rate": rng.choice([0.0, 0.8, 0.81]),
+        "device_type": rng.choice(["Desktop", "Mobile", "Tablet"]),
+    }
+    # Missing fields read as 0
+    for field in rng.sample(list(profile), rng.randint(0, 2)):
+        del profile[field]
+    return profile
+
+
+def test_decide_matches_decide_batch():
+    rng = random.Random(7)
+    table = compile_rules(RULES)
+    profiles = [random_profile(rng) for _ in range(5000)]
+
+    decisions = table.evaluate(profiles)
+    for profile, index in zip(profiles, decisions):
+        rule = table.decide(profile)
+        assert (table.rules.index(rule) if rule else -1) == index, profile
+
+    counts = table.variant_counts(decisions)
+    assert sum(counts.values()) == len(profiles)
+    assert counts[DEFAULT_VARIANT] == sum(table.decide(profile) is None for profile in profiles)
+
+
+def test_priority_then_listed_order():
+    table = compile_rules(RULES)
+    assert table.decide({"pricing_interest": 0.95, "visit_count": 5}).name == "urgent_pricing"
+    assert table.decide({"pricing_interest": 0.8, "visit_count": 5}).name == "returning_user_pricing"
+    assert table.decide({"avg_session_time": 10, "bounce_rate": 0.9, "device_type": "Mobile"}).name == "quick_browser"
+    assert table.decide({}) is None
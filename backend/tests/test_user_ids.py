@@ -0,0 +1,55 @@
+"""
+Generated user IDs must never collide, across threads or forked processes.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import multiprocessing
+import threading
+
+import pytest
+
+from user_ids import user_id_generator, shard_of, id_timestamp
+
+PER_WORKER = 20_000
+
+
+def generate(count: int):
+    return [user_id_generator.new_id() for _ in range(count)]
+
+
+def is_monotonic(ids):
+    # The 128-bit part after the shard prefix must be strictly increasing per process
+    values = [user_id[8:] for user_id in ids]
+    return all(a < b for a, b in zip(values, values[1:]))
+
+
+def test_ids_increase_and_carry_their_shard():
+    ids = generate(PER_WORKER)
+    assert is_monotonic(ids)
+    assert all(shard_of(user_id) == int(user_id[5:7], 16) for user_id in ids)
+    assert id_timestamp(ids[0]) is not None
+    assert id_timestamp("demo_user") is None
+
+
+def test_no_collisions_across_threads():
+    results = []
+    workers = [threading.Thread(target=lambda: results.append(generate(PER_WORKER))) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    all_ids = [user_id for batch in results for user_id in batch]
+    assert len(set(all_ids)) == len(all_ids)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_no_collisions_across_forked_processes():
+    parent = generate(PER_WORKER)
+    # Forked workers inherit the parent's generator state, the case gunicorn workers hit
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        batches = pool.map(generate, [PER_WORKER] * 4)
+    all_ids = parent + [user_id for batch in batches for user_id in batch]
+    assert len(set(all_ids)) == len(all_ids)
+    assert all(map(is_monotonic, batches))
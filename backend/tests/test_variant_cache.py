@@ -0,0 +1,46 @@
+"""
+Users in one cohort must get the same decision from every rule.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import random
+
+from optimization_rules import OPTIMIZATION_RULES
+from rule_table import compile_rules, OPERATORS
+from variant_cache import cohort_profile, MORPH_FIELD_NAMES
+
+RULES = {
+    **OPTIMIZATION_RULES,
+    "loyal": {"when": [["visit_count", ">", 7], ["content_interest", "<=", 0.2]], "variant": "content_heavy"},
+}
+
+
+def morph_profile(profile):
+    """The numeric part of app.trigger_real_time_generation's Morph profile"""
+    names = {field: MORPH_FIELD_NAMES.get(field, field) for field in profile}
+    return {
+        "visit_count": profile["visit_count"],
+        "preferences": {names[f]: profile[f] for f in ("pricing_interest", "content_interest")},
+        "behavior": {f: profile[f] for f in ("avg_session_time", "page_depth", "bounce_rate")},
+    }
+
+
+def test_cohorts_never_straddle_a_rule():
+    rng = random.Random(21)
+    table = compile_rules(RULES)
+    decisions = {}
+    for _ in range(20_000):
+        # Values on and around every threshold
+        profile = {
+            "visit_count": rng.choice([0, 2, 3, 7, 8, 10, 12]),
+            "pricing_interest": rng.choice([0.0, 0.5, 0.7, 0.71, 1.0]),
+            "content_interest": rng.choice([0.0, 0.2, 0.21, 0.5, 0.9]),
+            "avg_session_time": rng.choice([0, 29.9, 30, 120, 120.5]),
+            "page_depth": rng.choice([0, 5, 6]),
+            "bounce_rate": rng.choice([0.0, 0.8, 0.81]),
+        }
+        cohort = repr(cohort_profile(morph_profile(profile), table))
+        fired = tuple(all(OPERATORS[c.op](profile[c.field], c.threshold) for c in rule.conditions) for rule in table)
+        assert decisions.setdefault(cohort, fired) == fired, profile
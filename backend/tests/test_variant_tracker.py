@@ -0,0 +1,67 @@
+"""
+The tracked variant distribution must always match a full recompute.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+
+import random
+
+import pytest
+
+from profile_events import new_profile, apply_events
+from profile_store import ProfileStore
+from rule_table import compile_rules
+from tiered_profile_store import TieredProfileStore
+from variant_tracker import VariantTracker
+
+RULES = {
+    "returning_user_pricing": {"when": [["visit_count", ">=", 3], ["pricing_interest", ">", 0.7]], "variant": "pricing_focused"},
+    "content_explorer": {"when": [["avg_session_time", ">", 120], ["page_depth", ">", 5]], "variant": "content_heavy"},
+    "quick_browser": {"when": [["avg_session_time", "<", 30], ["bounce_rate", ">", 0.8]], "variant": "simplified"},
+    "mobile_visitor": {"when": [["device_type", "==", "Mobile"]], "variant": "mobile_optimized"},
+}
+PAGES = ["/", "/pricing", "/pricing/enterprise", "/blog/launch", "/docs/install"]
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def random_event(rng: random.Random):
+    kind = rng.choice(["page_view", "page_view", "session_start"])
+    event = {"event": kind, "page": rng.choice(PAGES), "session_time": rng.choice([0, 5, 60, 200])}
+    if rng.random() < 0.1:
+        event["device_type"] = rng.choice(["Desktop", "Mobile"])
+    return event
+
+
+@pytest.mark.parametrize("make_store", [
+    ProfileStore,
+    # Evictions without a cold tier remove users, which the tracker must forget
+    lambda: TieredProfileStore(150, num_stripes=8),
+], ids=["striped", "tiered"])
+def test_random_updates_stay_consistent(make_store):
+    rng = random.Random(18)
+    clock = Clock(1_700_000_000.0)
+    store = make_store()
+    tracker = VariantTracker(compile_rules(RULES), clock=clock)
+    store.observer = tracker
+
+    # Hours to days between rounds, so decayed interest flips decisions with no write
+    for step in (0, 600, 3600, 6 * 3600, 24 * 3600, 7 * 24 * 3600):
+        clock.now += step
+        for _ in range(2000):
+            clock.now += rng.uniform(0, 2)
+            events = [random_event(rng) for _ in range(rng.randint(1, 3))]
+            store.update(f"user_{rng.randrange(300)}",
+                         lambda profile, events=events: apply_events(profile, events, clock.now),
+                         lambda: new_profile(now=clock.now))
+
+        report = tracker.verify(store)
+        assert report["consistent"], report
+        assert report["tracked"]["total_users"] == len(store)
@@ -0,0 +1,216 @@
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from profile_store import ProfileStore, Profile, _Stripe
+
+
+class TieredProfileStore(ProfileStore):
+    """
+    ProfileStore with a bounded hot tier and an optional SQLite cold tier.
+
+    At most ``max_hot_profiles`` profiles are kept in memory, counted across
+    all stripes. Each stripe keeps its profiles in LRU order; when the total
+    goes over the quota, the least recently used profile of the largest
+    stripe is spilled to the SQLite file at ``spill_path`` (or discarded if
+    there is none) and is transparently rehydrated the next time that user
+    is read or updated.
+    The spill file is a cache owned by this process and is recreated on start.
+    """
+
+    def __init__(self, max_hot_profiles: int, spill_path: Optional[str] = None, num_stripes: int = 64):
+        if max_hot_profiles < 1:
+            raise ValueError("max_hot_profiles must be at least 1")
+        self.max_hot_profiles = max_hot_profiles
+        # Hot profiles in all stripes; the quota applies to this total, not per stripe
+        self._hot_count = 0
+        self._hot_lock = threading.Lock()
+        self.spill_path = spill_path
+
+        # Counters are kept per stripe so they are only ever touched under that stripe's lock
+        self._counters = [dict.fromkeys(('hits', 'misses', 'evictions', 'rehydrations', 'discarded'), 0)
+                          for _ in range(num_stripes)]
+
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._cold_count = 0
+        if spill_path:
+            if os.path.exists(spill_path):
+                os.remove(spill_path)
+            self._db = sqlite3.connect(spill_path, check_same_thread=False, isolation_level=None)
+            # Losing the cold tier on a crash is fine: it only mirrors evicted memory
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute(
+                "CREATE TABLE profiles (user_id TEXT PRIMARY KEY, stripe INTEGER NOT NULL, data BLOB NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX profiles_stripe ON profiles (stripe)")
+
+        super().__init__(num_stripes)
+
+    def _new_stripe_map(self) -> Dict[str, Profile]:
+        return OrderedDict()
+
+    def _lookup(self, stripe: _Stripe, user_id: str) -> Optional[Profile]:
+        profile = stripe.profiles.get(user_id)
+        if profile is not None:
+            stripe.profiles.move_to_end(user_id)
+            self._counters[stripe.index]['hits'] += 1
+            return profile
+
+        self._counters[stripe.index]['misses'] += 1
+        profile = self._rehydrate(stripe, user_id)
+        if profile is not None:
+            self._insert_hot(stripe, user_id, profile)
+        return profile
+
+    def _peek(self, stripe: _Stripe, user_id: str) -> Optional[Profile]:
+        # Exports read cold profiles in place rather than churning the hot tier
+        profile = stripe.profiles.get(user_id)
+        if profile is not None or not self._db:
+            return profile
+        with self._db_lock:
+            row = self._db.execute("SELECT data FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def _insert(self, stripe: _Stripe, user_id: str, profile: Profile) -> None:
+        if user_id not in stripe.profiles and self._cold_count:
+            # put() writes without a lookup, so a stale cold copy may still exist
+            self._discard_cold(user_id)
+        self._insert_hot(stripe, user_id, profile)
+
+    def _insert_hot(self, stripe: _Stripe, user_id: str, profile: Profile) -> None:
+        added = user_id not in stripe.profiles
+        stripe.profiles[user_id] = profile
+        stripe.profiles.move_to_end(user_id)
+        if added:
+            with self._hot_lock:
+                self._hot_count += 1
+                over = self._hot_count - self.max_hot_profiles
+            for _ in range(over):
+                if not self._evict(stripe):
+                    break
+
+    def _delete(self, stripe: _Stripe, user_id: str) -> None:
+        del stripe.profiles[user_id]
+        with self._hot_lock:
+            self._hot_count -= 1
+
+    def _evict(self, current: _Stripe) -> bool:
+        """
+        Spill the least recently used profile of the largest stripe.
+
+        Only ``current``'s lock is held; another stripe's lock is tried but
+        never waited for, so stripes cannot deadlock on each other. If it is
+        busy, ``current`` gives up its own oldest profile instead (never the
+        one just inserted). Returns False if neither was possible; the total
+        then stays over quota until a later insert evicts.
+        """
+        others = [candidate for candidate in self._stripes if candidate is not current]
+        victim = max(others, key=lambda candidate: len(candidate.profiles)) if others else None
+        if len(current.profiles) > 1 and (victim is None or len(current.profiles) >= len(victim.profiles)):
+            self._evict_oldest(current)
+            return True
+        if victim is not None and victim.lock.acquire(blocking=False):
+            try:
+                if victim.profiles:
+                    self._evict_oldest(victim)
+                    return True
+            finally:
+                victim.lock.release()
+        if len(current.profiles) > 1:
+            self._evict_oldest(current)
+            return True
+        return False
+
+    def _evict_oldest(self, stripe: _Stripe) -> None:
+        evicted_id, evicted = stripe.profiles.popitem(last=False)
+        with self._hot_lock:
+            self._hot_count -= 1
+        self._spill(stripe, evicted_id, evicted)
+
+    def _contains(self, stripe: _Stripe, user_id: str) -> bool:
+        if user_id in stripe.profiles:
+            return True
+        if not self._db:
+            return False
+        with self._db_lock:
+            row = self._db.execute("SELECT 1 FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return super().__len__() + self._cold_count
+
+    def _stripe_items(self, stripe: _Stripe) -> Iterator[Tuple[str, Profile]]:
+        yield from stripe.profiles.items()
+        if self._db:
+            with self._db_lock:
+                rows = self._db.execute("SELECT user_id, data FROM profiles WHERE stripe = ?", (stripe.index,)).fetchall()
+            for user_id, data in rows:
+                yield user_id, pickle.loads(data)
+
+    def _stripe_keys(self, stripe: _Stripe) -> Iterator[str]:
+        yield from stripe.profiles
+        if self._db:
+            with self._db_lock:
+                rows = self._db.execute("SELECT user_id FROM profiles WHERE stripe = ?", (stripe.index,)).fetchall()
+            for (user_id,) in rows:
+                yield user_id
+
+    def _spill(self, stripe: _Stripe, user_id: str, profile: Profile) -> None:
+        counters = self._counters[stripe.index]
+        counters['evictions'] += 1
+        if not self._db:
+            counters['discarded'] += 1
+            self._removed(user_id)
+            return
+        data = pickle.dumps(profile, pickle.HIGHEST_PROTOCOL)
+        with self._db_lock:
+            updated = self._db.execute("UPDATE profiles SET data = ? WHERE user_id = ?", (data, user_id)).rowcount
+            if not updated:
+                self._db.execute("INSERT INTO profiles (user_id, stripe, data) VALUES (?, ?, ?)",
+                                 (user_id, stripe.index, data))
+                self._cold_count += 1
+
+    def _discard_cold(self, user_id: str) -> None:
+        if not self._db:
+            return
+        with self._db_lock:
+            if self._db.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,)).rowcount:
+                self._cold_count -= 1
+
+    def _rehydrate(self, stripe: _Stripe, user_id: str) -> Optional[Profile]:
+        if not self._db:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT data FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return None
+            # A profile lives in exactly one tier, so it leaves SQLite as it re-enters memory
+            self._db.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,))
+            self._cold_count -= 1
+        self._counters[stripe.index]['rehydrations'] += 1
+        return pickle.loads(row[0])
+
+    def stats(self) -> Dict[str, Any]:
+        totals = dict.fromkeys(self._counters[0], 0)
+        for counters in self._counters:
+            for name, value in counters.items():
+                totals[name] += value
+        lookups = totals['hits'] + totals['misses']
+        return {
+            "hot_profiles": self._hot_count,
+            "cold_profiles": self._cold_count,
+            "max_hot_profiles": self.max_hot_profiles,
+            **totals,
+            "hit_rate": totals['hits'] / lookups if lookups else 0.0
+        }
+
+    def close(self) -> None:
+        if self._db:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
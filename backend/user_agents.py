@@ -0,0 +1,96 @@
+import os
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+# First matching pattern wins, so more specific families come first
+DEVICE_RULES = [
+    ("bot", r"bot|crawl|spider|slurp|headless|lighthouse|facebookexternalhit|preview"),
+    ("tablet", r"ipad|tablet|kindle|silk/|playbook|android(?!.*mobile)"),
+    ("mobile", r"mobi|iphone|ipod|android|windows phone|blackberry|opera mini"),
+]
+OS_RULES = [
+    ("Windows Phone", r"windows phone"),
+    ("Windows", r"windows"),
+    ("iOS", r"iphone|ipad|ipod|cpu os"),
+    ("Android", r"android"),
+    ("Chrome OS", r"cros"),
+    ("macOS", r"macintosh|mac os x"),
+    ("Linux", r"linux|x11"),
+]
+BROWSER_RULES = [
+    ("Edge", r"edg(?:e|a|ios)?/"),
+    ("Opera", r"opr/|opera"),
+    ("Samsung Internet", r"samsungbrowser"),
+    ("Firefox", r"firefox|fxios"),
+    ("Chrome", r"chrome|crios|chromium"),
+    ("Safari", r"safari"),
+    ("IE", r"msie|trident/"),
+]
+
+UNKNOWN = "unknown"
+OTHER = "Other"
+
+# Stable value orders, used where the fields are stored as small integers
+DEVICE_TYPES = (UNKNOWN, "desktop") + tuple(name for name, _ in DEVICE_RULES)
+OS_FAMILIES = (UNKNOWN, OTHER) + tuple(name for name, _ in OS_RULES)
+BROWSER_FAMILIES = (UNKNOWN, OTHER) + tuple(name for name, _ in BROWSER_RULES)
+
+
+class DeviceInfo(NamedTuple):
+    device_type: str
+    os: str
+    browser: str
+
+
+UNKNOWN_DEVICE = DeviceInfo(UNKNOWN, UNKNOWN, UNKNOWN)
+
+
+def _compile(rules):
+    alternatives = '|'.join(f"(?P<r{index}>{pattern})" for index, (_, pattern) in enumerate(rules))
+    return re.compile(alternatives, re.IGNORECASE), [name for name, _ in rules]
+
+
+class UserAgentClassifier:
+    """
+    Classifies User-Agent strings into device class, OS and browser family.
+
+    Each field is one precompiled regex whose alternatives are ordered by
+    priority. A UA matches several families (Chrome UAs also say "Safari",
+    Edge UAs also say "Chrome"), so each alternative is tried over the
+    whole string before falling through to the next. Results are memoized
+    per raw UA string in a bounded LRU cache: a small set of browsers and
+    versions covers most traffic, so nearly every request is a cache hit.
+    """
+
+    def __init__(self, cache_size: int = 1024):
+        self._device = _compile(DEVICE_RULES)
+        self._os = _compile(OS_RULES)
+        self._browser = _compile(BROWSER_RULES)
+        self.classify = lru_cache(maxsize=cache_size)(self._parse)
+
+    @staticmethod
+    def _family(compiled, user_agent: str, default: str) -> str:
+        pattern, names = compiled
+        best = len(names)
+        for match in pattern.finditer(user_agent):
+            best = min(best, int(match.lastgroup[1:]))
+            if best == 0:
+                break
+        return names[best] if best < len(names) else default
+
+    def _parse(self, user_agent: Optional[str]) -> DeviceInfo:
+        if not user_agent:
+            return UNKNOWN_DEVICE
+        return DeviceInfo(
+            self._family(self._device, user_agent, "desktop"),
+            self._family(self._os, user_agent, OTHER),
+            self._family(self._browser, user_agent, OTHER),
+        )
+
+    def cache_info(self):
+        return self.classify.cache_info()
+
+
+# Shared by the tracking endpoints
+user_agent_classifier = UserAgentClassifier(cache_size=int(os.getenv('USER_AGENT_CACHE_SIZE', '1024')))
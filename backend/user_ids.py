@@ -0,0 +1,84 @@
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from typing import Optional
+
+# Shard prefixes are two hex digits, so stripe/partition counts should divide 256
+NUM_SHARDS = 256
+
+_ID_PATTERN = re.compile(r'^user_([0-9a-f]{2})_([0-9a-f]{32})$')
+
+
+class UserIdGenerator:
+    """
+    Generates collision-free visitor IDs such as ``user_3f_0192a4c1...``.
+
+    The 32 hex digits are a UUIDv7-style 128-bit value: a 48-bit millisecond
+    timestamp, a 12-bit counter that keeps IDs strictly increasing within a
+    process (even inside one millisecond or if the clock steps back), and 62
+    random bits from a per-process stream reseeded after ``fork``. The two
+    hex digits before it are the shard, taken from those random bits, so
+    storage can route on the ID itself without a lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+        self._rng = random.Random(os.urandom(16))
+        if hasattr(os, 'register_at_fork'):
+            # Forked workers must not replay the parent's random stream
+            os.register_at_fork(after_in_child=self._reseed)
+
+    def _reseed(self):
+        self._lock = threading.Lock()
+        self._rng = random.Random(os.urandom(16))
+
+    def new_id(self) -> str:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._counter = 0
+            else:
+                self._counter += 1
+                if self._counter > 0xFFF:
+                    # Counter exhausted: borrow the next millisecond to stay monotonic
+                    self._last_ms += 1
+                    self._counter = 0
+            ms, counter = self._last_ms, self._counter
+            rand = self._rng.getrandbits(62)
+
+        value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand
+        return f"user_{rand % NUM_SHARDS:02x}_{value:032x}"
+
+
+def shard_of(user_id: str) -> int:
+    """
+    Return the shard (0-255) a user ID routes to.
+
+    Generated IDs carry their shard; any other ID (legacy cookies, demo
+    users, IDs supplied in event payloads) falls back to a CRC32 of the ID,
+    which, unlike ``hash()``, is the same in every process.
+    """
+    if len(user_id) == 40 and user_id.startswith('user_') and user_id[7] == '_':
+        try:
+            return int(user_id[5:7], 16)
+        except ValueError:
+            pass
+    return zlib.crc32(user_id.encode('utf-8')) % NUM_SHARDS
+
+
+def id_timestamp(user_id: str) -> Optional[float]:
+    """Return the creation time (epoch seconds) embedded in a generated ID"""
+    match = _ID_PATTERN.match(user_id)
+    if not match:
+        return None
+    return (int(match.group(2), 16) >> 80) / 1000.0
+
+
+# Process-wide generator used by get_user_id
+user_id_generator = UserIdGenerator()
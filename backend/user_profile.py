@@ -0,0 +1,143 @@
+from collections.abc import MutableMapping
+from typing import Dict, Any, Iterator, Optional
+
+from page_history import PageViewHistory
+
+# Field order is the JSON shape returned by the user endpoints
+FIELDS = (
+    'visit_count',
+    'total_session_time',
+    'page_views',
+    'pricing_interest',
+    'content_interest',
+    'pricing_interest_updated_at',
+    'content_interest_updated_at',
+    'device_type',
+    'os',
+    'browser',
+    'created_at',
+    'avg_session_time',
+    'page_depth',
+    'bounce_rate',
+)
+_FIELD_SET = frozenset(FIELDS)
+
+# Event-time bookkeeping (see event_watermark.py); kept out of the mapping and JSON shape
+BUFFER_FIELDS = ('pending_events', 'last_event_at')
+
+# Set by the profile store on every write, including when a profile is loaded
+VERSION_FIELD = 'version'
+
+_SLOTS = FIELDS + BUFFER_FIELDS + (VERSION_FIELD,)
+
+
+class UserProfile(MutableMapping):
+    """
+    One visitor's behavioral profile, stored in ``__slots__``.
+
+    A dict per profile costs a hash table for the same dozen keys on every
+    user; slots keep just the values. The class still behaves as a mapping
+    over its fixed fields (``profile['visit_count']``, ``get``, ``dict()``),
+    so rules and endpoints written against dict profiles keep working, and
+    ``to_dict`` returns the JSON shape. Assigning an unknown key raises
+    KeyError, and keys cannot be deleted.
+    """
+
+    __slots__ = _SLOTS
+
+    def __init__(self,
+                 page_views: PageViewHistory,
+                 created_at: str,
+                 visit_count: int = 0,
+                 total_session_time: float = 0,
+                 pricing_interest: float = 0,
+                 content_interest: float = 0,
+                 pricing_interest_updated_at: Optional[float] = None,
+                 content_interest_updated_at: Optional[float] = None,
+                 device_type: str = 'unknown',
+                 os: str = 'unknown',
+                 browser: str = 'unknown',
+                 avg_session_time: float = 0.0,
+                 page_depth: int = 0,
+                 bounce_rate: float = 1.0):
+        self.visit_count = visit_count
+        self.total_session_time = total_session_time
+        self.page_views = page_views
+        self.pricing_interest = pricing_interest
+        self.content_interest = content_interest
+        self.pricing_interest_updated_at = pricing_interest_updated_at
+        self.content_interest_updated_at = content_interest_updated_at
+        self.device_type = device_type
+        self.os = os
+        self.browser = browser
+        self.created_at = created_at
+        self.avg_session_time = avg_session_time
+        self.page_depth = page_depth
+        self.bounce_rate = bounce_rate
+        self.pending_events = None
+        self.last_event_at = None
+        self.version = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'UserProfile':
+        """Build a profile from a mapping; ``page_views`` must already be a history"""
+        return cls(**{field: data[field] for field in FIELDS if field in data})
+
+    # Mapping interface
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        raise KeyError(f"profile fields cannot be removed: {key}")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(FIELDS)
+
+    def __len__(self) -> int:
+        return len(FIELDS)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _FIELD_SET
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in _FIELD_SET else default
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        # Unset optional fields hold None, which counts as missing here
+        value = self[key]
+        if value is None:
+            self[key] = value = default
+        return value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def copy(self) -> 'UserProfile':
+        """Copy the profile deeply enough that later updates cannot leak into it"""
+        copied = UserProfile.__new__(UserProfile)
+        for field in _SLOTS:
+            setattr(copied, field, getattr(self, field))
+        copied.page_views = self.page_views.copy()
+        if self.pending_events:
+            copied.pending_events = list(self.pending_events)
+        return copied
+
+    # Pickled as a flat tuple for snapshots and the tiered store's spill file
+
+    def __getstate__(self):
+        return tuple(getattr(self, field) for field in _SLOTS)
+
+    def __setstate__(self, state):
+        for field, value in zip(_SLOTS, state):
+            setattr(self, field, value)
+
+    def __repr__(self) -> str:
+        return f"UserProfile({self.to_dict()!r})"
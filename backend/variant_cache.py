@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Callable, Optional, Set, Tuple
+
+from rule_table import DecisionTable
+
+# Morph profile names of the profile fields rules read, where they differ
+MORPH_FIELD_NAMES = {"pricing_interest": "pricing_prominence", "content_interest": "content_depth"}
+
+# Coarse edges no rule implies, so regulars and heavy readers still get their own cohorts
+EXTRA_EDGES: Dict[str, Tuple[float, ...]] = {
+    "visit_count": (10,),
+    "content_depth": (0.5,),
+}
+
+# A bucket edge: (threshold, whether a value equal to it is already past the edge)
+Edge = Tuple[float, bool]
+
+# Per-user fields that must not end up in a shared prompt
+PERSONAL_FIELDS = ('user_id',)
+
+
+@lru_cache(maxsize=64)
+def cohort_buckets(rules: DecisionTable) -> Dict[str, Tuple[Edge, ...]]:
+    """
+    Bucket edges per Morph profile value, taken from the rules' numeric thresholds.
+
+    Every threshold is an edge, on the same side of it as its comparison,
+    so no cohort straddles a rule: ``>= 3`` puts 3 above the edge, ``> 0.7``
+    keeps 0.7 below it. Tables are immutable, so the edges are cached per table.
+    """
+    edges: Dict[str, Set[Edge]] = {name: {(t, True) for t in extra} for name, extra in EXTRA_EDGES.items()}
+    for rule in rules:
+        for c in rule.conditions:
+            if isinstance(c.threshold, str):
+                continue
+            name = MORPH_FIELD_NAMES.get(c.field, c.field)
+            if c.op in ('>=', '<', '==', '!='):
+                edges.setdefault(name, set()).add((c.threshold, True))
+            if c.op in ('>', '<=', '==', '!='):
+                edges.setdefault(name, set()).add((c.threshold, False))
+    # Equal thresholds: the inclusive edge is passed first (at the value itself)
+    return {name: tuple(sorted(found, key=lambda edge: (edge[0], not edge[1]))) for name, found in edges.items()}
+
+
+def _bucket(edges: Optional[Tuple[Edge, ...]], value: Any) -> Any:
+    """Replace a number by the threshold of the last edge it is past, or 0 before the first"""
+    if edges is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    bucket = 0
+    for threshold, inclusive in edges:
+        if value > threshold or (inclusive and value == threshold):
+            bucket = threshold
+        else:
+            break
+    return bucket
+
+
+def cohort_profile(morph_profile: Dict[str, Any], rules: DecisionTable) -> Dict[str, Any]:
+    """Quantize a Morph profile: personal fields dropped, numbers replaced by their bucket"""
+    buckets = cohort_buckets(rules)
+    cohort = {}
+    for name, value in morph_profile.items():
+        if name in PERSONAL_FIELDS:
+            continue
+        if isinstance(value, dict):
+            cohort[name] = {key: _bucket(buckets.get(key), item) for key, item in value.items()}
+        else:
+            cohort[name] = _bucket(buckets.get(name), value)
+    return cohort
+
+
+def cohort_key(cohort: Dict[str, Any], base_component: str, component_type: str) -> str:
+    """Content hash of everything the generated code depends on"""
+    material = {
+        "profile": cohort,
+        "component": hashlib.sha256(base_component.encode('utf-8')).hexdigest(),
+        "component_type": component_type,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class VariantCache:
+    """
+    Generated components shared by every user in the same cohort.
+
+    A cohort is a Morph profile quantized with ``cohort_profile``. The
+    cohort, not the individual profile, is what gets sent to Morph, so the
+    cached code is exactly what would be generated for any member. Code
+    is stored content-addressed by its SHA-256 and cohorts point at it, so
+    cohorts that produced identical code share one copy. With a
+    ``directory`` both survive restarts (``objects/<sha256>`` and
+    ``cohorts/<key>.json``). Concurrent misses on one cohort wait for a
+    single generation. At most ``max_cohorts`` are kept in memory, least
+    recently used first out.
+    """
+
+    def __init__(self, max_cohorts: int = 10000, directory: Optional[str] = None):
+        if max_cohorts < 1:
+            raise ValueError("max_cohorts must be at least 1")
+        self.max_cohorts = max_cohorts
+        self.directory = directory
+        if directory:
+            os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+            os.makedirs(os.path.join(directory, 'cohorts'), exist_ok=True)
+        self._lock = threading.Lock()
+        # cohort key -> (code digest, generation result without the code)
+        self._cohorts: 'OrderedDict[str, Tuple[str, Dict[str, Any]]]' = OrderedDict()
+        # code digest -> [code, number of cohorts using it]
+        self._objects: Dict[str, list] = {}
+        self._generating: Dict[str, threading.Event] = {}
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def get_or_generate(self,
+                        morph_profile: Dict[str, Any],
+                        rules: DecisionTable,
+                        base_component: str,
+                        component_type: str,
+                        generate: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return the cohort's generated variant, calling ``generate(cohort_profile)``
+        on a miss. Cohorts are bucketed on the thresholds of ``rules``. Only
+        successful, non-fallback results are cached.
+        """
+        cohort = cohort_profile(morph_profile, rules)
+        key = cohort_key(cohort, base_component, component_type)
+        while True:
+            with self._lock:
+                cached = self._lookup(key)
+                if cached is not None:
+                    self.hits += 1
+                    return self._result(key, cached, "hit")
+                pending = self._generating.get(key)
+                if pending is None:
+                    self._generating[key] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+
+        try:
+            result = generate(cohort)
+            if result.get("success") and not result.get("mock") and "generated_code" in result:
+                with self._lock:
+                    self._store(key, result)
+            else:
+                with self._lock:
+                    self.uncached += 1
+            return {**result, "cohort_key": key, "cache": "miss"}
+        finally:
+            with self._lock:
+                self._generating.pop(key).set()
+
+    def _result(self, key: str, cached: Tuple[str, Dict[str, Any]], outcome: str) -> Dict[str, Any]:
+        digest, metadata = cached
+        return {**metadata, "generated_code": self._objects[digest][0], "cohort_key": key, "cache": outcome}
+
+    def _lookup(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        cached = self._cohorts.get(key)
+        if cached is not None:
+            self._cohorts.move_to_end(key)
+            return cached
+        if not self.directory:
+            return None
+        try:
+            with open(os.path.join(self.directory, 'cohorts', f"{key}.json")) as f:
+                entry = json.load(f)
+            with open(os.path.join(self.directory, 'objects', entry["code"]), encoding='utf-8') as f:
+                code = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        self._remember(key, entry["code"], code, entry["result"])
+        return self._cohorts[key]
+
+    def _store(self, key: str, result: Dict[str, Any]) -> None:
+        code = result["generated_code"]
+        digest = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        metadata = {name: value for name, value in result.items() if name != "generated_code"}
+        if self.directory:
+            object_path = os.path.join(self.directory, 'objects', digest)
+            if not os.path.exists(object_path):
+                _write_atomic(object_path, code)
+            _write_atomic(os.path.join(self.directory, 'cohorts', f"{key}.json"),
+                          json.dumps({"code": digest, "result": metadata}))
+        self._remember(key, digest, code, metadata)
+
+    def _remember(self, key: str, digest: str, code: str, metadata: Dict[str, Any]) -> None:
+        self._forget(key)
+        self._cohorts[key] = (digest, metadata)
+        self._objects.setdefault(digest, [code, 0])[1] += 1
+        while len(self._cohorts) > self.max_cohorts:
+            self._forget(next(iter(self._cohorts)))
+
+    def _forget(self, key: str) -> None:
+        cached = self._cohorts.pop(key, None)
+        if cached is None:
+            return
+        entry = self._objects[cached[0]]
+        entry[1] -= 1
+        if not entry[1]:
+            del self._objects[cached[0]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cohorts": len(self._cohorts),
+                "distinct_variants": len(self._objects),
+                "max_cohorts": self.max_cohorts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncached": self.uncached,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+def _write_atomic(path: str, content: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
@@ -0,0 +1,191 @@
+import heapq
+import math
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from interest_decay import InterestDecay, interest_decay
+from profile_events import current_view, current_values
+from rule_table import DecisionTable, DEFAULT_VARIANT
+
+
+def decaying_conditions(rules: DecisionTable, decay: InterestDecay) -> List[Tuple[str, str, float, float]]:
+    """The conditions that can change without a write: (field, operator, threshold, half-life)"""
+    return [
+        (c.field, c.op, c.threshold, decay.half_lives[c.field])
+        for rule in rules for c in rule.conditions
+        if decay.half_lives.get(c.field) and not isinstance(c.threshold, str)
+    ]
+
+
+def decision_expires_at(decaying: List[Tuple[str, str, float, float]], view: Dict[str, Any], now: float) -> float:
+    """
+    Return when a decision made from ``view`` at ``now`` may next change by
+    decay alone, or infinity if it cannot.
+    """
+    expires_at = math.inf
+    for field, op, threshold, half_life in decaying:
+        value = view.get(field, 0) or 0
+        # A decaying score only falls, so an ordering test flips at most once, when the
+        # score reaches the threshold; equality tests on a decaying score are not tracked
+        if threshold > 0 and value > threshold and op in ('>', '>=', '<', '<='):
+            expires_at = min(expires_at, now + half_life * math.log2(value / threshold))
+    return expires_at
+
+
+class VariantTracker:
+    """
+    Keeps every user's current variant, and the count per variant, up to date.
+
+    Attached to a profile store as its observer, it re-decides a user after
+    each write to their profile and moves them between variant counters by
+    delta, so reading the distribution is O(1) in the number of users.
+
+    Decisions can also change with no write at all, because interest scores
+    decay. Decay is monotonic, so for each decision the tracker computes
+    when the next decayed condition will cross its threshold, and re-decides
+    that user once the time comes (``refresh``). The counts are therefore
+    exact as of the time they are read, not just as of the last write.
+    """
+
+    def __init__(self, rules: DecisionTable, decay: InterestDecay = interest_decay, clock=time.time):
+        self.rules = rules
+        self.decay = decay
+        self.clock = clock
+        self._rule_index = {rule.name: index for index, rule in enumerate(rules)}
+        self._decaying = decaying_conditions(rules, decay)
+        self._lock = threading.Lock()
+        self._assignments: Dict[str, Tuple[int, float]] = {}
+        self._counts = [0] * (len(rules) + 1)
+        self._expiries: List[Tuple[float, str]] = []
+        self.redecided = 0
+        self.listener = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Store observer interface, called with the user's stripe lock held
+
+    def profile_changed(self, user_id: str, profile: Dict[str, Any]) -> None:
+        self._record(user_id, profile, self.clock())
+
+    def profile_removed(self, user_id: str) -> None:
+        with self._lock:
+            previous = self._assignments.pop(user_id, None)
+            if previous is not None:
+                self._counts[previous[0] + 1] -= 1
+
+    def _record(self, user_id: str, profile: Dict[str, Any], now: float) -> None:
+        index, expires_at = self._decide(profile, now)
+        with self._lock:
+            previous = self._assignments.get(user_id)
+            if previous is not None:
+                self._counts[previous[0] + 1] -= 1
+            self._counts[index + 1] += 1
+            self._assignments[user_id] = (index, expires_at)
+            if expires_at != math.inf:
+                heapq.heappush(self._expiries, (expires_at, user_id))
+                if len(self._expiries) > 2 * len(self._assignments) + 1024:
+                    self._compact_expiries()
+        # Still under the user's stripe lock, so one user's changes are published in order
+        listener = self.listener
+        if listener is not None:
+            previous_variant = self._variant(previous[0]) if previous is not None else DEFAULT_VARIANT
+            if self._variant(index) != previous_variant:
+                listener.publish(user_id, self._event(user_id, index, now, previous_variant))
+
+    def _variant(self, index: int) -> str:
+        return DEFAULT_VARIANT if index < 0 else self.rules.rules[index].variant
+
+    def _event(self, user_id: str, index: int, now: float, previous_variant: Optional[str] = None) -> Dict[str, Any]:
+        rule = self.rules.rules[index] if index >= 0 else None
+        return {
+            "user_id": user_id,
+            "variant": self._variant(index),
+            "previous_variant": previous_variant,
+            "rule": rule.name if rule else None,
+            "reason": rule.reason if rule else None,
+            "decided_at": now
+        }
+
+    def decision(self, user_id: str) -> Dict[str, Any]:
+        """The user's currently tracked decision, shaped like a published event"""
+        with self._lock:
+            assignment = self._assignments.get(user_id)
+        return self._event(user_id, assignment[0] if assignment else -1, self.clock())
+
+    def _decide(self, profile: Dict[str, Any], now: float) -> Tuple[int, float]:
+        """Return (rule index or -1, time the decision may next change)"""
+        view = current_values(profile, self.rules.fields, now)
+        rule = self.rules.decide(view)
+        index = -1 if rule is None else self._rule_index[rule.name]
+        return index, decision_expires_at(self._decaying, view, now)
+
+    def _compact_expiries(self) -> None:
+        self._expiries = [(expires_at, user_id) for user_id, (_, expires_at) in self._assignments.items()
+                          if expires_at != math.inf]
+        heapq.heapify(self._expiries)
+
+    def refresh(self, store, now: Optional[float] = None) -> int:
+        """Re-decide users whose decision may have changed by decay alone; returns how many"""
+        now = self.clock() if now is None else now
+        due = []
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                expires_at, user_id = heapq.heappop(self._expiries)
+                assignment = self._assignments.get(user_id)
+                # Entries superseded by a later write are skipped
+                if assignment is not None and assignment[1] == expires_at:
+                    due.append(user_id)
+            self.redecided += len(due)
+        # The store calls back into profile_changed under its stripe lock, so ours must not be held
+        for user_id in due:
+            if store.read(user_id, lambda profile, user_id=user_id: self._record(user_id, profile, now), False) is False:
+                self.profile_removed(user_id)
+        return len(due)
+
+    def distribution(self) -> Tuple[int, Dict[str, int]]:
+        """Return (users, users per variant) as currently tracked"""
+        with self._lock:
+            counts = list(self._counts)
+            total = len(self._assignments)
+        distribution = dict.fromkeys(self.rules.variants, 0)
+        distribution[DEFAULT_VARIANT] += counts[0]
+        for rule, count in zip(self.rules, counts[1:]):
+            distribution[rule.variant] += count
+        return total, distribution
+
+    def verify(self, store, now: Optional[float] = None) -> Dict[str, Any]:
+        """Compare the tracked distribution with a full recompute over the store"""
+        now = self.clock() if now is None else now
+        self.refresh(store, now)
+        tracked_total, tracked = self.distribution()
+        decisions = self.rules.evaluate(current_view(profile, now) for _, profile in store.items())
+        expected = self.rules.variant_counts(decisions)
+        return {
+            "consistent": tracked_total == len(decisions) and tracked == expected,
+            "tracked": {"total_users": tracked_total, "variant_distribution": tracked},
+            "recomputed": {"total_users": len(decisions), "variant_distribution": expected}
+        }
+
+    def watch(self, store, interval_seconds: float) -> None:
+        """Call ``refresh`` every ``interval_seconds`` on a background thread"""
+        def loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.refresh(store)
+                except Exception as e:
+                    print(f"Error refreshing variant decisions: {e}")
+
+        self._thread = threading.Thread(target=loop, name="variant-refresh", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tracked_users": len(self._assignments),
+                "pending_expiries": len(self._expiries),
+                "redecided": self.redecided
+            }
+
+    def close(self) -> None:
+        self._stop.set()